@@ -1,33 +1,116 @@
-import json
-import os
 import dash
-from dash import dcc, html, Input, Output, State, no_update, clientside_callback
+import diskcache
+from dash import dcc, html, Input, Output, State, no_update, clientside_callback, ClientsideFunction, DiskcacheManager
+from flask import request
 import dash_bootstrap_components as dbc
-import pandas as pd
-import numpy as np
 import plotly.graph_objects as go
 
 import config
 from cache import cache
-from data_loader import get_state_names, load_geo
-from plotting import plot_charts, get_plotly_map_layout
+from cache_backends import is_shared_between_processes
+from data_loader import get_state_names, preload_geometries
+from views import (render_state_view, render_district_view, render_national_view, with_map_view, deck_view_html, bar_figure,
+                   device_class, cull_map_figure, map_panel_size, map_view_from_relayout, bounds_within, is_view_cached)
+from plotting import bar_page_count, get_visible_bounds
+from warmer import CacheWarmer
+from prefetch import Prefetcher
+from spatial_query import handle_query_request
+from layout_store import get_layout_store
+from scheduler import LatestWinsScheduler, JobSlots
+from memory_budget import memory_governor
 
 # --- Assume these functions are defined elsewhere ---
 # --- For this example to be runnable, we will create dummy versions ---
 
 
 # --- Dash App and Cache Initialization ---
+# Background callbacks run in their own processes, one per job, queued through diskcache.
+background_store = diskcache.Cache(config.BACKGROUND_CACHE_DIR) if config.BACKGROUND_RENDERS else None
+background_callback_manager = DiskcacheManager(background_store) if config.BACKGROUND_RENDERS else None
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP],
-                meta_tags=[{'name': 'viewport', 'content': 'width=device-width, initial-scale=1.0'}])
+                meta_tags=[{'name': 'viewport', 'content': 'width=device-width, initial-scale=1.0'}],
+                background_callback_manager=background_callback_manager)
 server = app.server
 
 cache.init_app(app.server, config=config.CACHE_CONFIG)
+# The background render process hands its view over through the memoize cache.
+with server.app_context():
+    background_renders = config.BACKGROUND_RENDERS and is_shared_between_processes(cache.cache)
+# Caps the render processes running at once (config.BACKGROUND_MAX_JOBS).
+background_slots = JobSlots(background_store) if background_renders else None
 
 
 
 state_list = get_state_names()
+if config.PRELOAD_GEOMETRY:
+    preload_geometries(state_list)
 
-config.PLOTLY_CUSTOM_MAP_LAYOUTS={}
+cache_warmer = CacheWarmer(server)
+# District views render in background processes when those are on; prefetching them here would undo that.
+prefetcher = Prefetcher(server, districts=not background_renders)
+render_scheduler = LatestWinsScheduler()
+
+
+def start_cache_warmer():
+    """Starts pre-rendering every state in the background if WARM_CACHE_ON_BOOT is set."""
+    if config.WARM_CACHE_ON_BOOT:
+        cache_warmer.start(state_list)
+
+
+@server.route('/api/v1/warmer')
+def warmer_status():
+    return cache_warmer.progress()
+
+
+@server.route('/api/v1/scheduler')
+def scheduler_status():
+    """Map updates served and dropped as superseded, see scheduler.py."""
+    return render_scheduler.stats()
+
+
+@server.route('/api/v1/memory')
+def memory_status():
+    """Bytes held by the in-process caches against the memory budget, see memory_budget.py."""
+    return memory_governor.usage()
+
+
+@server.route('/api/v1/query/<layer>', methods=['POST'])
+def spatial_query(layer):
+    """Batched point / bounding-box lookups, see spatial_query.handle_query_request."""
+    return handle_query_request(layer, request, state_list)
+
+
+# Under `gunicorn --preload` threads must not be started before the fork; the
+# warmer is started from the post_worker_init hook in gunicorn.conf.py instead.
+if not config.PRELOAD_GEOMETRY:
+    start_cache_warmer()
+
+MAP_GRAPH_STYLE = {'height': 'auto'}
+DECK_MAP_STYLE = {'width': '100%', 'height': '600px', 'border': 'none'}
+HIDDEN_STYLE = {'display': 'none'}
+RENDER_STATUS_STYLE = {'display': 'flex'}
+# deck-map srcDoc, map-graph style, deck-map style and map extent when the full Plotly map is shown.
+PLOTLY_MAP_PANEL = ('', MAP_GRAPH_STYLE, HIDDEN_STYLE, None)
+
+
+def map_outputs(view, center, zoom, viewport=None):
+    """
+    Returns the map-graph figure and the PLOTLY_MAP_PANEL outputs for a cached view.
+
+    Large layers are rendered with deck.gl (see renderers.py); those are shown in
+    the deck-map iframe and the Plotly graph is hidden. With config.VIEWPORT_CULLING
+    a Plotly map only carries the regions around the visible area (see
+    views.cull_map_figure), and the extent it covers is returned so that panning
+    inside it needs no new data; the extent is None when nothing was left out.
+    """
+    if view.get('map_deck') is not None:
+        return ({}, deck_view_html(view, center, zoom), HIDDEN_STYLE, DECK_MAP_STYLE, None)
+    map_fig = with_map_view(view['map_fig'], center, zoom)
+    if not config.VIEWPORT_CULLING or view.get('feature_bounds') is None:
+        return (map_fig,) + PLOTLY_MAP_PANEL
+    extent = get_visible_bounds(center, zoom, *map_panel_size(viewport), margin=config.VIEWPORT_CULL_MARGIN)
+    culled_fig = cull_map_figure(map_fig, view['feature_bounds'], extent)
+    return (culled_fig, '', MAP_GRAPH_STYLE, HIDDEN_STYLE, extent if culled_fig is not map_fig else None)
 
 
 
@@ -35,10 +118,21 @@ config.PLOTLY_CUSTOM_MAP_LAYOUTS={}
 
 # --- Dash UI Layout ---
 app.layout = dbc.Container(fluid=True, style={'backgroundColor': '#ffffff'}, children=[
-    dcc.Interval(id='interval-update-width', interval=500, n_intervals=0),
+    # Viewport size reported by assets/width_tracker.js, and the device class derived from it.
+    dcc.Store(id='viewport-store'),
+    # ID of this browser tab, set by assets/session.js.
+    dcc.Store(id='session-store', storage_type='session'),
+    dcc.Store(id='device-store'),
     dcc.Store(id='view-level-store', data='state'),
+    # {'state', 'district'} of the view shown; only changes when the user moves to another view.
+    dcc.Store(id='view-id-store'),
+    # Area covered by the regions sent with the Plotly map, None if it holds all of them.
+    dcc.Store(id='map-extent-store'),
+    # Sub-district view handed to the background renderer, and the same view once it is cached.
+    dcc.Store(id='render-request-store'),
+    dcc.Store(id='render-done-store'),
     dbc.Row([
-        dbc.Col(dcc.Dropdown(id='state-dropdown', options=[{'label': state.replace('_', ' ').title(), 'value': state} for state in state_list], value=state_list[0] if state_list else None, clearable=False)),
+        dbc.Col(dcc.Dropdown(id='state-dropdown', options=[{'label': state.replace('_', ' ').title(), 'value': state} for state in list(config.NATIONAL_VIEWS) + state_list], value=state_list[0] if state_list else None, clearable=False)),
         dbc.Col(dbc.Button("Next State ➡️", id="next-state-button", className="w-100"), width="auto"),
         dbc.Col(dcc.Dropdown(id='district-dropdown', clearable=False), width="auto"),
         dbc.Col(dbc.Button("Next District ➡️", id="next-district-button", className="w-100"), width="auto"),
@@ -50,6 +144,11 @@ app.layout = dbc.Container(fluid=True, style={'backgroundColor': '#ffffff'}, chi
             dbc.Col(dbc.Button("⬅️ Back to State View", id="back-button", color="primary", outline=True, style={'display': 'none'}), width="auto"),
             dbc.Col(html.H3(id="view-title", className="text-center"), width=True),
         ], align="center", className="mb-3"), # Note: reduced margin-bottom
+        # Shown while a sub-district view renders in the background.
+        dbc.Row(id='render-status', style=HIDDEN_STYLE, align="center", className="mb-3", children=[
+            dbc.Col(dbc.Progress(id='render-progress', value=100, striped=True, animated=True), width=True),
+            dbc.Col(dbc.Button("Cancel", id="render-cancel-button", color="secondary", size="sm", outline=True), width="auto"),
+        ]),
 
         # --- MODIFICATION START: Added a control panel for sliders ---
         dbc.Card(
@@ -67,29 +166,71 @@ app.layout = dbc.Container(fluid=True, style={'backgroundColor': '#ffffff'}, chi
                         html.Label("Map Zoom", className="fw-bold"),
                         dcc.Slider(id='zoom-slider', min=4, max=15, step=0.5, value=6.5, marks={i: str(i) for i in range(4, 16)}, tooltip={"placement": "bottom", "always_visible": True})
                     ], width=4),
-                ])
+                ]),
+                # Stores the current center and zoom as the default of this state or district.
+                dbc.Row([
+                    dbc.Col(dbc.Button("Save map layout", id="save-layout-button", color="secondary", size="sm", outline=True), width="auto"),
+                    dbc.Col(html.Small(id='save-layout-status', className="text-muted"), width="auto"),
+                ], align="center", className="mt-2"),
             ]),
             className="mb-4"
         ),
         # --- MODIFICATION END ---
 
         dbc.Row([
-            dbc.Col(dcc.Graph(id='map-graph', style={'height': 'auto'}, config=config.MAP_CONFIG), lg=6),
-            dbc.Col(html.Div(dcc.Graph(id='bar-graph'), style={'height': 'auto', 'overflowY': 'auto'}), lg=6),
+            dbc.Col([
+                dcc.Graph(id='map-graph', style=MAP_GRAPH_STYLE, config=config.MAP_CONFIG),
+                # Large layers are drawn with deck.gl in this frame instead.
+                html.Iframe(id='deck-map', style=HIDDEN_STYLE),
+            ], lg=6),
+            dbc.Col([
+                dbc.RadioItems(id='bar-mode', inline=True, value='auto', className="mb-2", options=[
+                    {'label': 'Auto', 'value': 'auto'},
+                    {'label': 'Top / Bottom', 'value': 'summary'},
+                    {'label': 'Pages', 'value': 'page'},
+                    {'label': 'All', 'value': 'all'},
+                ]),
+                dbc.Pagination(id='bar-page', min_value=1, max_value=1, active_page=1, fully_expanded=False, style={'display': 'none'}),
+                html.Div(dcc.Graph(id='bar-graph'), style={'height': 'auto', 'overflowY': 'auto'}),
+            ], lg=6),
         ]),
     ]), className="mb-4"),
 ])
 
-# # --- Callbacks ---
-# clientside_callback(
-#     """
-#     function(n_intervals) {
-#         return `Device Available Width: ${window.innerWidth}px`;
-#     }
-#     """,
-#     Output('device-width-display', 'children'),
-#     Input('interval-update-width', 'n_intervals')
-# )
+# --- Callbacks ---
+# Reports the viewport once on load; later (debounced) resizes are pushed by width_tracker.js.
+clientside_callback(
+    ClientsideFunction(namespace='viewport', function_name='report'),
+    Output('viewport-store', 'data'),
+    Input('viewport-store', 'id'),
+)
+
+
+clientside_callback(
+    ClientsideFunction(namespace='session', function_name='ensure_id'),
+    Output('session-store', 'data'),
+    Input('session-store', 'id'),
+    State('session-store', 'data'),
+)
+
+# Inputs whose requests come in bursts; they wait for config.RENDER_DEBOUNCE_SECONDS first.
+DEBOUNCED_INPUTS = {'zoom-slider.value', 'lon-slider.value', 'lat-slider.value', 'next-state-button.n_clicks',
+                    'next-district-button.n_clicks', 'map-graph.relayoutData'}
+
+# Triggers that redraw the view already shown rather than move to another one ('map-view' is a pan of the Plotly map).
+REDRAW_TRIGGERS = ['zoom-slider', 'lon-slider', 'lat-slider', 'device-store', 'map-view']
+
+
+@app.callback(
+    Output('device-store', 'data'),
+    Input('viewport-store', 'data'),
+    State('device-store', 'data'),
+)
+def update_device_class(viewport, current_device):
+    """Only a change of device class re-renders the views; other resizes stop here."""
+    device = device_class(viewport)
+    return no_update if device == current_device else device
+
 
 @app.callback(
     # --- MODIFICATION: Added outputs for new sliders ---
@@ -105,6 +246,12 @@ app.layout = dbc.Container(fluid=True, style={'backgroundColor': '#ffffff'}, chi
     Output('state-dropdown', 'value'),
     Output('lon-slider', 'value'),
     Output('lat-slider', 'value'),
+    Output('deck-map', 'srcDoc'),
+    Output('map-graph', 'style'),
+    Output('deck-map', 'style'),
+    Output('map-extent-store', 'data'),
+    Output('view-id-store', 'data'),
+    Output('zoom-slider', 'value'),
     # --- MODIFICATION: Added inputs for new sliders ---
     Input('state-dropdown', 'value'),
     Input('district-dropdown', 'value'),
@@ -115,99 +262,158 @@ app.layout = dbc.Container(fluid=True, style={'backgroundColor': '#ffffff'}, chi
     Input('zoom-slider', 'value'),
     Input('lon-slider', 'value'),
     Input('lat-slider', 'value'),
+    Input('device-store', 'data'),
+    Input('map-graph', 'relayoutData'),
+    Input('render-done-store', 'data'),
     State('view-level-store', 'data'),
     State('state-dropdown', 'options'),
-    State('district-dropdown', 'options')
+    State('district-dropdown', 'options'),
+    State('viewport-store', 'data'),
+    State('map-extent-store', 'data'),
+    State('view-id-store', 'data'),
+    State('session-store', 'data'),
 )
-def update_view(selected_state, selected_district, clickData, back_clicks,
-                next_state_clicks, next_district_clicks,
-                zoom_value, lon_value, lat_value,
-                current_view, state_options, district_options):
+def update_view(*args):
+    """Runs build_view_outputs() latest-wins per browser session (see scheduler.py)."""
+    *view_args, session_id = args
+    debounce = any(prop_id in DEBOUNCED_INPUTS for prop_id in dash.ctx.triggered_prop_ids)
+    with render_scheduler.turn(session_id if config.LATEST_WINS else None, debounce=debounce) as turn:
+        return build_view_outputs(*view_args, turn=turn, session_id=session_id)
+
+
+def build_view_outputs(selected_state, selected_district, clickData, back_clicks,
+                       next_state_clicks, next_district_clicks,
+                       zoom_value, lon_value, lat_value, device, relayout_data, render_done,
+                       current_view, state_options, district_options, viewport, map_extent, current_view_id, turn, session_id=None):
     triggered_id = dash.ctx.triggered_id
     empty_fig = go.FigureWidget().update_layout(paper_bgcolor='white', plot_bgcolor='white', annotations=[dict(text="No data to display", xref="paper", yref="paper", showarrow=False, font=dict(size=16))])
-    num_outputs = 12 # <-- Updated output count
-
-    # Save the compiled metadata to a file
+    loading_fig = go.FigureWidget().update_layout(paper_bgcolor='white', plot_bgcolor='white', annotations=[dict(text="Rendering...", xref="paper", yref="paper", showarrow=False, font=dict(size=16))])
+    num_outputs = 18 # <-- Updated output count
+
+    layout_store = get_layout_store()
+    device = device or config.DEFAULT_DEVICE
+    # Center the user panned the Plotly map to, when that is what triggered the update
+    map_center = None
+
+    # The bar chart belongs to update_bar_panel, which re-renders it when view-id-store
+    # changes; redrawing the same view (sliders, pans, device) leaves it and its page alone.
+    def view_id(state, district=None):
+        identity = {'state': state, 'district': district}
+        return no_update if identity == current_view_id else identity
+
+    # A view the user moves to opens at its saved zoom, which is also sent to the zoom
+    # slider; redrawing the same view (sliders, pans, device) keeps the slider's zoom.
+    def saved_zoom(saved_layout):
+        if saved_layout and saved_layout.get('mapbox_zoom') is not None and triggered_id not in REDRAW_TRIGGERS:
+            return saved_layout['mapbox_zoom']
+        return None
+
+    # --- Helper function for the all-India views ---
+    def show_national_view(name):
+        turn.check()
+        view = render_national_view(config.NATIONAL_VIEWS[name], device)
+        title = f"National View: {name.replace('_', ' ').title()}"
+        if view is None:
+            err_msg = dbc.Alert("Could not load the national geo-data.", "danger")
+            return (empty_fig, empty_fig, [], None, 'state', {'display': 'none'}, title, err_msg, None, name, no_update, no_update) + PLOTLY_MAP_PANEL + (None, no_update)
+
+        center_lon, center_lat = view['map_layout']["mapbox_center"]["lon"], view['map_layout']["mapbox_center"]["lat"]
+        zoom = config.NATIONAL_ZOOM
+        if triggered_id in ['lon-slider', 'lat-slider', 'zoom-slider']:
+            center_lon, center_lat, zoom = lon_value, lat_value, zoom_value
+        elif map_center is not None:
+            center_lon, center_lat, zoom = map_center["lon"], map_center["lat"], zoom_value
 
-    with open("plotlycustommaplayoutmd.json", 'w') as f:
-        json.dump(config.PLOTLY_CUSTOM_MAP_LAYOUTS, f, indent=4)
+        map_fig, *map_panel = map_outputs(view, {"lon": center_lon, "lat": center_lat}, zoom, viewport)
+        return (map_fig, no_update, [], None, 'state', {'display': 'none'}, title, None, None, name, center_lon, center_lat, *map_panel, view_id(name), no_update)
 
     # --- Helper function for state view ---
     def show_state_view(state):
-        gdf_districts = load_geo(f'STATES/{state}/{state}_DISTRICTS.geojson')
-        if gdf_districts is None or 'dtname' not in gdf_districts.columns:
+        if state in config.NATIONAL_VIEWS:
+            return show_national_view(state)
+        turn.check()
+        view = render_state_view(state, device)
+        if view is None:
             err_msg = dbc.Alert(f"Could not load district data for {state}.", "danger")
-            return (empty_fig, empty_fig, [], None, 'state', {'display': 'none'}, f"Data for {state}", err_msg, None, state, no_update, no_update)
+            return (empty_fig, empty_fig, [], None, 'state', {'display': 'none'}, f"Data for {state}", err_msg, None, state, no_update, no_update) + PLOTLY_MAP_PANEL + (None, no_update)
 
         # --- MODIFICATION: Logic to determine map center ---
-        map_layout = get_plotly_map_layout(gdf_districts)
+        # A saved layout wins over the one computed from the geometry
+        saved_layout = layout_store.get(state)
+        map_layout = saved_layout or view['map_layout']
         center_lon, center_lat = map_layout["mapbox_center"]["lon"], map_layout["mapbox_center"]["lat"]
         # If a slider triggered the update, use its values instead of the default
         if triggered_id in ['lon-slider', 'lat-slider', 'zoom-slider']:
             center_lon, center_lat = lon_value, lat_value
+        elif map_center is not None:
+            center_lon, center_lat = map_center["lon"], map_center["lat"]
 
-        districts = sorted(gdf_districts['dtname'].unique())
+        districts = view['districts']
         options = [{'label': d, 'value': d} for d in districts]
         value = districts[0] if districts else None
-        np.random.seed(42)
-        df_random = pd.DataFrame({"dtname": gdf_districts["dtname"], "Change": np.random.uniform(-50, 100, len(gdf_districts))})
-
-        map_fig, bar_fig = plot_charts(df_random, gdf_districts, "dtname", "RdYlGn", f"District Map of {state.replace('_', ' ').title()}", "District Data Comparison", zoom=zoom_value)
-        map_layout["mapbox_zoom"]=zoom_value
-        map_fig.update_layout(
-            mapbox_center={"lon": center_lon, "lat": center_lat},
-        )
-        config.PLOTLY_CUSTOM_MAP_LAYOUTS[state]={"districts":{}}
-        config.PLOTLY_CUSTOM_MAP_LAYOUTS[state]['mapbox_center']={"lon": center_lon, "lat": center_lat}
-        config.PLOTLY_CUSTOM_MAP_LAYOUTS[state]['mapbox_zoom']=zoom_value
-
-        for i in districts:
-            config.PLOTLY_CUSTOM_MAP_LAYOUTS[state]['districts'][i]={}
 
-        print(config.PLOTLY_CUSTOM_MAP_LAYOUTS)
+        zoom = saved_zoom(saved_layout)
+        map_fig, *map_panel = map_outputs(view, {"lon": center_lon, "lat": center_lat}, zoom_value if zoom is None else zoom, viewport)
 
+        # Warm the states the Next State button (or going back) leads to.
+        prefetcher.after_state_view(state, [opt['value'] for opt in state_options or [] if opt['value'] not in config.NATIONAL_VIEWS],
+                                    device, session_id)
 
         title = f"State View: {state.replace('_', ' ').title()}"
-        return (map_fig, bar_fig, options, value, 'state', {'display': 'none'}, title, None, None, state, center_lon, center_lat)
+        if view.get('summary'):
+            title += f" (area-weighted change: {view['summary']['Change']:.2f})"
+        return (map_fig, no_update, options, value, 'state', {'display': 'none'}, title, None, None, state, center_lon, center_lat, *map_panel, view_id(state), no_update if zoom is None else zoom)
 
     # --- Helper function for sub-district view ---
-    def show_subdistrict_view(state, district):
-        gdf_subs = load_geo(f'STATES/{state}/{state}_SUBDISTRICTS.geojson')
-        if gdf_subs is None:
+    def show_subdistrict_view(state, district, background=True):
+        if background and background_renders and not is_view_cached(render_district_view, state, district, device):
+            slot = background_slots.acquire()
+            if slot is not None:
+                # Render in a background process (see render_in_background); its result comes back through render-done-store.
+                dash.set_props('render-request-store', {'data': {'state': state, 'district': district, 'device': device, 'slot': slot}})
+                title = f"Sub-District View: {district.title()}"
+                return (loading_fig, loading_fig, no_update, district, 'district', {'display': 'block'}, title, None, None, no_update, no_update, no_update) + PLOTLY_MAP_PANEL + (view_id(state, district), no_update)
+            # Every background slot is taken: render it in this worker instead.
+
+        turn.check()
+        view = render_district_view(state, district, device)
+        if view is None:
             err_msg = dbc.Alert(f"Could not load sub-districts geo-data for {state}.", "danger")
-            return (empty_fig, empty_fig, no_update, no_update, 'district', {'display': 'block'}, f"Sub-District View: {district}", err_msg, None, no_update, no_update, no_update)
+            return (empty_fig, empty_fig, no_update, no_update, 'district', {'display': 'block'}, f"Sub-District View: {district}", err_msg, None, no_update, no_update, no_update) + PLOTLY_MAP_PANEL + (None, no_update)
 
-        gdf_filtered = gdf_subs[gdf_subs["dtname"].str.strip().str.lower() == district.strip().lower()]
-        if gdf_filtered.empty:
+        if view.get('empty'):
             err_msg = dbc.Alert(f"No sub-district data for {district}.", "warning")
-            return (empty_fig, empty_fig, no_update, no_update, 'district', {'display': 'block'}, f"Sub-District View: {district}", err_msg, None, no_update, no_update, no_update)
+            return (empty_fig, empty_fig, no_update, no_update, 'district', {'display': 'block'}, f"Sub-District View: {district}", err_msg, None, no_update, no_update, no_update) + PLOTLY_MAP_PANEL + (None, no_update)
 
         # --- MODIFICATION: Logic to determine map center ---
-        map_layout = get_plotly_map_layout(gdf_filtered)
-        map_layout["mapbox_zoom"]=zoom_value
+        saved_layout = layout_store.get(state, district)
+        map_layout = saved_layout or view['map_layout']
         center_lon, center_lat = map_layout["mapbox_center"]["lon"], map_layout["mapbox_center"]["lat"]
         # If a slider triggered the update, use its values instead of the default
         if triggered_id in ['lon-slider', 'lat-slider', 'zoom-slider']:
             center_lon, center_lat = lon_value, lat_value
+        elif map_center is not None:
+            center_lon, center_lat = map_center["lon"], map_center["lat"]
 
-        np.random.seed(42)
-        df_random = pd.DataFrame({"sdtname": gdf_filtered["sdtname"], "Change": np.random.uniform(0, 100, len(gdf_filtered))})
-        map_fig, bar_fig = plot_charts(df_random, gdf_filtered, "sdtname", "RdYlGn", f"Sub-District Map of {district.title()}", f"Sub-District Data for {district.title()}", zoom=zoom_value)
-
-        map_fig.update_layout(
-            mapbox_center={"lon": center_lon, "lat": center_lat},
-            uirevision=f"{state}-{district}",
-            autosize=True
-        )
+        zoom = saved_zoom(saved_layout)
+        map_fig, *map_panel = map_outputs(view, {"lon": center_lon, "lat": center_lat}, zoom_value if zoom is None else zoom, viewport)
         title = f"Sub-District View: {district.title()}"
-        config.PLOTLY_CUSTOM_MAP_LAYOUTS[state]["districts"][district]['mapbox_center']={"lon": center_lon, "lat": center_lat}
-        config.PLOTLY_CUSTOM_MAP_LAYOUTS[state]["districts"][district]['mapbox_center']['mapbox_zoom']=zoom_value
-        print(config.PLOTLY_CUSTOM_MAP_LAYOUTS)
-        print(district)
-        return (map_fig, bar_fig, no_update, district, 'district', {'display': 'block'}, title, None, None, no_update, center_lon, center_lat)
+        # Warm the districts the Next District button (or going back) leads to.
+        prefetcher.after_district_view(state, district, [opt['value'] for opt in district_options or []], device, session_id)
+        return (map_fig, no_update, no_update, district, 'district', {'display': 'block'}, title, None, None, no_update, center_lon, center_lat, *map_panel, view_id(state, district), no_update if zoom is None else zoom)
 
     # --- Main callback logic ---
 
+    # A pan or zoom of the Plotly map only needs new data once the view leaves the extent sent with it
+    if 'map-graph.relayoutData' in dash.ctx.triggered_prop_ids:
+        moved = map_view_from_relayout(relayout_data)
+        if moved is None or map_extent is None:
+            return [no_update] * num_outputs
+        map_center, zoom_value = moved
+        if bounds_within(get_visible_bounds(map_center, zoom_value, *map_panel_size(viewport)), map_extent):
+            return [no_update] * num_outputs
+        triggered_id = 'map-view'
+
     if triggered_id == 'next-state-button':
         state_values = [opt['value'] for opt in state_options]
         try:
@@ -227,8 +433,8 @@ def update_view(selected_state, selected_district, clickData, back_clicks,
             return show_subdistrict_view(selected_state, new_district)
         except (ValueError, IndexError): return [no_update] * num_outputs
 
-    # If a slider is moved, redraw the current view with new settings
-    if triggered_id in ['zoom-slider', 'lon-slider', 'lat-slider']:
+    # If a slider is moved, the map is panned or the device class changes, redraw the current view with new settings
+    if triggered_id in REDRAW_TRIGGERS:
         if current_view == 'state':
             return show_state_view(selected_state)
         elif current_view == 'district' and selected_district:
@@ -236,10 +442,17 @@ def update_view(selected_state, selected_district, clickData, back_clicks,
         else:
             return show_state_view(selected_state)
 
+    # A background render finished: show it if the user is still waiting for that view
+    if triggered_id == 'render-done-store':
+        if render_done and current_view == 'district' and (render_done['state'], render_done['district']) == (selected_state, selected_district):
+            # Never request the same render twice: if the view did not reach this process' cache, render it here.
+            return show_subdistrict_view(selected_state, selected_district, background=False)
+        return [no_update] * num_outputs
+
     if triggered_id in ['state-dropdown', 'back-button'] or not triggered_id:
         return show_state_view(selected_state)
 
-    if triggered_id == 'map-graph' and clickData and current_view == 'state':
+    if triggered_id == 'map-graph' and clickData and current_view == 'state' and selected_state not in config.NATIONAL_VIEWS:
         clicked_district = clickData['points'][0].get('customdata', '')
         if not clicked_district: clicked_district = clickData['points'][0].get('hovertext', '').split('<br>')[0]
         if clicked_district: return show_subdistrict_view(selected_state, clicked_district)
@@ -247,6 +460,98 @@ def update_view(selected_state, selected_district, clickData, back_clicks,
     if triggered_id == 'district-dropdown' and selected_district:
         return show_subdistrict_view(selected_state, selected_district)
     return [no_update] * num_outputs
+if background_renders:
+    @app.callback(
+        Output('render-done-store', 'data'),
+        Input('render-request-store', 'data'),
+        background=True,
+        progress=Output('render-progress', 'label'),
+        running=[(Output('render-status', 'style'), RENDER_STATUS_STYLE, HIDDEN_STYLE)],
+        cancel=[Input('render-cancel-button', 'n_clicks'), Input('state-dropdown', 'value'), Input('back-button', 'n_clicks')],
+        prevent_initial_call=True,
+    )
+    def render_in_background(set_progress, render_request):
+        """
+        Renders a sub-district view in a background process and reports it back once
+        it is in the shared cache, where update_view picks it up. Request workers stay
+        free meanwhile, and concurrent renders (up to config.BACKGROUND_MAX_JOBS) run on
+        separate cores.
+        """
+        state, district, device = render_request['state'], render_request['district'], render_request['device']
+        set_progress(f"Rendering the sub-districts of {district.title()}...")
+        try:
+            with server.app_context():
+                render_district_view(state, district, device)
+        finally:
+            background_slots.release(render_request.get('slot'))
+        return render_request
+
+
+@app.callback(
+    Output('save-layout-status', 'children'),
+    Input('save-layout-button', 'n_clicks'),
+    State('view-level-store', 'data'),
+    State('state-dropdown', 'value'),
+    State('district-dropdown', 'value'),
+    State('lon-slider', 'value'),
+    State('lat-slider', 'value'),
+    State('zoom-slider', 'value'),
+    prevent_initial_call=True
+)
+def save_map_layout(n_clicks, current_view, selected_state, selected_district, lon_value, lat_value, zoom_value):
+    """Saves the shown center and zoom as the default layout of the current state or district."""
+    if not selected_state or selected_state in config.NATIONAL_VIEWS:
+        return "National views have no saved layout."
+    district = selected_district if current_view == 'district' else None
+    get_layout_store().upsert(selected_state, district, center={"lon": lon_value, "lat": lat_value}, zoom=zoom_value)
+    name = (district or selected_state.replace('_', ' ')).title()
+    return f"Saved the layout of {name}."
+
+
+@app.callback(
+    Output('bar-graph', 'figure', allow_duplicate=True),
+    Output('bar-page', 'max_value'),
+    Output('bar-page', 'active_page'),
+    Output('bar-page', 'style'),
+    Input('bar-mode', 'value'),
+    Input('bar-page', 'active_page'),
+    Input('view-id-store', 'data'),
+    Input('device-store', 'data'),
+    Input('render-done-store', 'data'),
+    prevent_initial_call=True
+)
+def update_bar_panel(bar_mode, active_page, view_id, device, render_done):
+    """
+    Renders the bar chart of the view shown; the views come from the cache.
+
+    Runs when the user moves to another view (view-id-store), which starts again from
+    the first page, as does a new bar mode; a device change or page change keeps the page.
+    """
+    if not view_id:
+        return no_update, 1, 1, {'display': 'none'}
+    device = device or config.DEFAULT_DEVICE
+    selected_state, selected_district = view_id['state'], view_id['district']
+    if selected_district:
+        if background_renders and not is_view_cached(render_district_view, selected_state, selected_district, device):
+            # Still rendering in the background; render-done-store triggers this again once it is cached.
+            return no_update, no_update, no_update, no_update
+        view = render_district_view(selected_state, selected_district, device)
+    elif selected_state in config.NATIONAL_VIEWS:
+        view = render_national_view(config.NATIONAL_VIEWS[selected_state], device)
+    else:
+        view = render_state_view(selected_state, device)
+    if not view or view.get('empty'):
+        return no_update, 1, 1, {'display': 'none'}
+
+    num_pages = bar_page_count(len(view['bar_data']['records']['Change']))
+    # A new view (or one a background render just finished) or bar mode starts again from the
+    # first page; otherwise the page is kept, clamped to this view's pages.
+    new_view = dash.ctx.triggered_id in ('view-id-store', 'bar-mode', 'render-done-store')
+    page = 1 if new_view or not active_page else active_page
+    page = min(max(page, 1), num_pages)
+    page_style = {'display': 'flex'} if bar_mode == 'page' and num_pages > 1 else {'display': 'none'}
+    return bar_figure(view, bar_mode, page - 1), num_pages, page, page_style
+
 # --- Run the App ---
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,15 @@
+// Gives every browser tab an ID, kept in the sessionStorage-backed 'session-store', so the
+// server can tell which of a tab's map updates supersede the others (see scheduler.py).
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    session: {
+        ensure_id: function(storeId, currentId) {
+            if (currentId) {
+                return currentId;
+            }
+            if (window.crypto && window.crypto.randomUUID) {
+                return window.crypto.randomUUID();
+            }
+            return Date.now().toString(36) + Math.random().toString(36).slice(2);
+        }
+    }
+});
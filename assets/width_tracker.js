@@ -2,6 +2,14 @@
 
 // We wrap everything in a function to ensure we don't pollute the global namespace.
 (function() {
+    // Resizes are reported to the server only once the window has stopped changing for this long.
+    const RESIZE_DEBOUNCE_MS = 300;
+    let resizeTimer = null;
+
+    function viewportSize() {
+        return {width: window.innerWidth, height: window.innerHeight};
+    }
+
     // This function finds our target div and updates its text with the window's current width.
     function updateWidthDisplay() {
         const widthDisplayElement = document.getElementById('device-width-display');
@@ -10,9 +18,27 @@
         }
     }
 
-    // We need to wait for the window to fully load to ensure the 'device-width-display' element exists.
-    window.addEventListener('load', updateWidthDisplay);
+    // Pushes the new size into the 'viewport-store', which the server turns into a device class.
+    function reportViewport() {
+        updateWidthDisplay();
+        if (window.dash_clientside && window.dash_clientside.set_props) {
+            window.dash_clientside.set_props('viewport-store', {data: viewportSize()});
+        }
+    }
+
+    // The first report comes from the clientside callback in PlotlyMap.py, once the layout exists.
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        viewport: {
+            report: function() {
+                updateWidthDisplay();
+                return viewportSize();
+            }
+        }
+    });
 
-    // We also want to update the width whenever the user resizes their browser window.
-    window.addEventListener('resize', updateWidthDisplay);
-})();
\ No newline at end of file
+    // Later resizes are debounced so dragging a window edge sends one update, not hundreds.
+    window.addEventListener('resize', function() {
+        clearTimeout(resizeTimer);
+        resizeTimer = setTimeout(reportViewport, RESIZE_DEBOUNCE_MS);
+    });
+})();
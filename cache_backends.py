@@ -0,0 +1,259 @@
+# cache_backends.py
+import fnmatch
+import pickle
+import threading
+import zlib
+from time import monotonic
+
+from cachelib.serializers import BaseRedisSerializer
+from flask_caching.backends.rediscache import RedisCache
+from flask_caching.backends.filesystemcache import FileSystemCache
+from flask_caching.backends.simplecache import SimpleCache
+
+from memory_budget import BudgetedDict
+
+# URL scheme that selects the in-process Redis stand-in instead of a real server.
+IN_PROCESS_URL = 'memory://'
+
+
+class CompressedPickleSerializer(BaseRedisSerializer):
+    """
+    Binary codec for shared cache entries: pickle protocol 5, zlib compressed.
+
+    GeoDataFrames pickle to large, highly repetitive byte strings, so compression
+    cuts both Redis memory and network transfer. Integers stay plain ASCII so
+    Redis' INCR keeps working, and entries written by the default '!'-prefixed
+    serializer can still be read.
+    """
+
+    def __init__(self, level=1):
+        self.level = level
+
+    def dumps(self, value, protocol=5):
+        if type(value) is int:
+            return str(value).encode('ascii')
+        return b'z' + zlib.compress(pickle.dumps(value, protocol), self.level)
+
+    def loads(self, value):
+        if value is not None and value.startswith(b'z'):
+            try:
+                return pickle.loads(zlib.decompress(value[1:]))
+            except (pickle.PickleError, zlib.error):
+                return None
+        return super().loads(value)
+
+
+class BudgetedSimpleCache(SimpleCache):
+    """
+    Per-process memory cache whose entries count against config.MEMORY_BUDGET_MB.
+
+    Selected with CACHE_TYPE='cache_backends.BudgetedSimpleCache'. Entries are
+    measured by their pickled size, which is what SimpleCache keeps in memory,
+    and may be evicted before their timeout (see memory_budget.py).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache = BudgetedDict('flask-cache', sizeof=lambda item: len(item[1]), lock=self._lock)
+
+
+class InProcessRedis:
+    """
+    A thread-safe, dict-backed stand-in for the subset of the redis-py client API
+    that the Redis cache backend uses.
+
+    Lets the shared-cache code path run (and be exercised) on a single machine
+    without a Redis server. Stored values count against config.MEMORY_BUDGET_MB.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = BudgetedDict('in-process-redis', lock=self._lock)
+        self._expiry = {}
+
+    def _alive(self, name):
+        deadline = self._expiry.get(name)
+        if deadline is not None and deadline <= monotonic():
+            self._data.pop(name, None)
+            self._expiry.pop(name, None)
+        return name in self._data
+
+    def ping(self):
+        return True
+
+    def get(self, name):
+        with self._lock:
+            return self._data.get(name) if self._alive(name) else None
+
+    def mget(self, names):
+        return [self.get(name) for name in names]
+
+    def set(self, name, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._alive(name):
+                return None
+            self._data[name] = value if isinstance(value, bytes) else str(value).encode()
+            if ex:
+                self._expiry[name] = monotonic() + ex
+            else:
+                self._expiry.pop(name, None)
+            return True
+
+    def setnx(self, name, value):
+        return bool(self.set(name, value, nx=True))
+
+    def expire(self, name, time):
+        with self._lock:
+            if not self._alive(name):
+                return False
+            self._expiry[name] = monotonic() + time
+            return True
+
+    def delete(self, *names):
+        with self._lock:
+            removed = 0
+            for name in names:
+                if self._alive(name):
+                    del self._data[name]
+                    self._expiry.pop(name, None)
+                    removed += 1
+            return removed
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._alive(name))
+
+    def keys(self, pattern='*'):
+        with self._lock:
+            return [name for name in list(self._data) if self._alive(name) and fnmatch.fnmatchcase(name, pattern)]
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+            self._expiry.clear()
+            return True
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value = int(self.get(name) or 0) + amount
+            self._data[name] = str(value).encode()
+            return value
+
+    def pipeline(self, transaction=False):
+        return _InProcessPipeline(self)
+
+
+class _InProcessPipeline:
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def set(self, *args, **kwargs):
+        self._commands.append((args, kwargs))
+        return self
+
+    def execute(self):
+        return [self._client.set(*args, **kwargs) for args, kwargs in self._commands]
+
+
+class FailoverClient:
+    """
+    Wraps a Redis client and serves calls from a local in-process store while the
+    server is unreachable, so a Redis outage degrades to a per-node cache instead
+    of failing requests.
+    """
+
+    def __init__(self, primary, fallback, retry_after=30):
+        self._primary = primary
+        self._fallback = fallback
+        self._retry_after = retry_after
+        self._down_until = 0.0
+
+    def __getattr__(self, name):
+        primary_method = getattr(self._primary, name)
+        fallback_method = getattr(self._fallback, name)
+
+        def call(*args, **kwargs):
+            if monotonic() < self._down_until:
+                return fallback_method(*args, **kwargs)
+            try:
+                return primary_method(*args, **kwargs)
+            except (ConnectionError, TimeoutError, OSError) + _redis_errors() as e:
+                print(f"Shared cache unreachable ({e}); using the local cache for {self._retry_after}s.")
+                self._down_until = monotonic() + self._retry_after
+                return fallback_method(*args, **kwargs)
+
+        return call
+
+    def is_up(self):
+        """Tells whether calls currently go to the primary server."""
+        return monotonic() >= self._down_until
+
+
+def _redis_errors():
+    try:
+        from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+    except ImportError:
+        return ()
+    return (RedisConnectionError, RedisTimeoutError)
+
+
+# One stand-in per process, shared by every cache configured with IN_PROCESS_URL.
+_in_process_server = InProcessRedis()
+
+
+class NamespacedRedisCache(RedisCache):
+    """
+    Shared Redis-protocol cache backend for multi-node deployments.
+
+    Selected with CACHE_TYPE='cache_backends.NamespacedRedisCache'. Keys are
+    prefixed with CACHE_KEY_PREFIX and CACHE_DATASET_VERSION, so bumping the
+    dataset version invalidates every node at once. CACHE_REDIS_URL='memory://'
+    uses the in-process stand-in. If the server cannot be reached at startup the
+    app falls back to a local cache (on disk when CACHE_DIR is set, in memory
+    otherwise); later outages are absorbed by FailoverClient.
+    """
+
+    serializer = CompressedPickleSerializer()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        prefix = f"{config.get('CACHE_KEY_PREFIX') or ''}{config.get('CACHE_DATASET_VERSION', '')}:"
+        default_timeout = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+        redis_url = config.get('CACHE_REDIS_URL', IN_PROCESS_URL)
+
+        if redis_url == IN_PROCESS_URL:
+            return cls(host=_in_process_server, key_prefix=prefix, default_timeout=default_timeout)
+
+        try:
+            from redis import from_url as redis_from_url
+            client = redis_from_url(redis_url, **(config.get('CACHE_OPTIONS') or {}))
+            client.ping()
+        except Exception as e:
+            print(f"Could not connect to shared cache at {redis_url}: {e}. Falling back to a local cache.")
+            if config.get('CACHE_DIR'):
+                return FileSystemCache(config['CACHE_DIR'], threshold=config['CACHE_THRESHOLD'], default_timeout=default_timeout)
+            return BudgetedSimpleCache(threshold=config['CACHE_THRESHOLD'], default_timeout=default_timeout)
+
+        print(f"Using shared cache at {redis_url} with key prefix '{prefix}'.")
+        return cls(host=FailoverClient(client, InProcessRedis()), key_prefix=prefix, default_timeout=default_timeout)
+
+
+def is_shared_between_processes(backend) -> bool:
+    """
+    Tells whether entries one process sets in a cache backend are visible to the others.
+
+    True for the disk cache and for a reachable Redis server; False for per-process
+    memory caches, the in-process Redis stand-in and a shared cache that has fallen
+    back to its local store.
+    """
+    if isinstance(backend, FileSystemCache):
+        return True
+    if isinstance(backend, RedisCache):
+        client = backend._write_client
+        if isinstance(client, InProcessRedis):
+            return False
+        if isinstance(client, FailoverClient):
+            return client.is_up()
+        return True
+    return False
@@ -0,0 +1,120 @@
+# compact.py
+import os
+import sys
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import config
+from geo_handles import estimate_gdf_nbytes
+from ingest import DERIVED_COLUMNS, LABEL_COLUMNS, prepare_layer
+
+# Derived columns that are only displayed or used as weights; float32 keeps areas to
+# 7 significant digits and label points to about a metre. Bounding boxes stay
+# float64 so viewport and subset filtering stay exact.
+FLOAT32_COLUMNS = ['area'] + LABEL_COLUMNS
+COORDINATE_BYTES = {'float64': 16, 'float32': 8, 'quantized': 8}
+
+
+def compact_layer(gdf, name_columns=None, metric_columns=None):
+    """
+    Returns a layer reduced to the columns the app reads, in compact dtypes.
+
+    Only the name, metric and ingest.DERIVED_COLUMNS columns and the geometry are
+    kept. Name columns become categoricals, which store each distinct name once
+    and keep their dictionary encoding in the geometry buffers' Arrow file, and
+    FLOAT32_COLUMNS are downcast. A layer that is already compact is returned as is.
+
+    Args:
+        gdf (gpd.GeoDataFrame): A prepared layer (see ingest.prepare_layer).
+        name_columns (list[str], optional): Defaults to config.GEO_KEY_COLUMNS.
+        metric_columns (list[str], optional): Defaults to config.GEO_METRIC_COLUMNS.
+
+    Returns:
+        gpd.GeoDataFrame: The compact layer.
+    """
+    name_columns = config.GEO_KEY_COLUMNS if name_columns is None else name_columns
+    metric_columns = config.GEO_METRIC_COLUMNS if metric_columns is None else metric_columns
+    keep = set(name_columns) | set(metric_columns) | set(DERIVED_COLUMNS) | {gdf.geometry.name}
+    names = [column for column in name_columns if column in gdf.columns]
+    floats = [column for column in FLOAT32_COLUMNS if column in gdf.columns]
+    if (set(gdf.columns) <= keep
+            and all(isinstance(gdf[column].dtype, pd.CategoricalDtype) for column in names)
+            and all(gdf[column].dtype == np.float32 for column in floats)):
+        return gdf
+
+    gdf = gdf[[column for column in gdf.columns if column in keep]].copy()
+    for column in names:
+        gdf[column] = gdf[column].astype('category')
+    for column in floats:
+        gdf[column] = gdf[column].astype(np.float32)
+    return gdf
+
+
+def layer_memory_report(relative_file_paths, coordinate_storage=None):
+    """
+    Measures layers as read in full and in their compact form.
+
+    'before' is the layer as read from its source file with every attribute column;
+    'after' is the prepared, compact layer the app keeps (see compact_layer). Both
+    sizes include the GEOS vertex storage (see geo_handles.estimate_gdf_nbytes),
+    which compaction does not change. The coordinate buffer columns compare float64
+    buffers with `coordinate_storage` (default config.GEO_COORDINATE_STORAGE).
+
+    Args:
+        relative_file_paths (list[str]): Layers relative to config.BASE_DIR, already downloaded.
+        coordinate_storage (str, optional): 'float64', 'float32' or 'quantized'.
+
+    Returns:
+        list[dict]: One row per layer: 'layer', 'features', 'columns_before',
+                    'columns_after', 'bytes_before', 'bytes_after',
+                    'buffer_bytes_before' and 'buffer_bytes_after'.
+    """
+    coordinate_storage = coordinate_storage or config.GEO_COORDINATE_STORAGE
+    rows = []
+    for relative_file_path in relative_file_paths:
+        full = gpd.read_file(os.path.join(config.BASE_DIR, relative_file_path), engine='pyogrio')
+        compact = compact_layer(prepare_layer(full))
+        num_coordinates = int(shapely.get_num_coordinates(compact.geometry.values).sum())
+        rows.append({
+            'layer': relative_file_path,
+            'features': len(compact),
+            'columns_before': len(full.columns) - 1,
+            'columns_after': len(compact.columns) - 1,
+            'bytes_before': estimate_gdf_nbytes(full),
+            'bytes_after': estimate_gdf_nbytes(compact),
+            'buffer_bytes_before': num_coordinates * COORDINATE_BYTES['float64'],
+            'buffer_bytes_after': num_coordinates * COORDINATE_BYTES[coordinate_storage],
+        })
+    return rows
+
+
+def print_memory_report(rows):
+    print(f"{'layer':<60}{'features':>9}{'columns':>10}{'MB before':>11}{'MB after':>10}{'buffer MB':>15}")
+    for row in rows + [_report_total(rows)]:
+        columns = f"{row['columns_before']}->{row['columns_after']}" if row['columns_before'] is not None else ''
+        buffers = f"{_mb(row['buffer_bytes_before'])}->{_mb(row['buffer_bytes_after'])}"
+        print(f"{row['layer']:<60}{row['features']:>9}{columns:>10}{_mb(row['bytes_before']):>11}"
+              f"{_mb(row['bytes_after']):>10}{buffers:>15}")
+
+
+def _report_total(rows):
+    total = {key: sum(row[key] for row in rows) for key in
+             ('features', 'bytes_before', 'bytes_after', 'buffer_bytes_before', 'buffer_bytes_after')}
+    return dict(total, layer='total', columns_before=None, columns_after=None)
+
+
+def _mb(nbytes):
+    return round(nbytes / (1024 * 1024), 2)
+
+
+# --- Report Script ---
+if __name__ == "__main__":
+    # python compact.py [STATE...]   bytes per downloaded layer, before and after compaction
+    states_dir = os.path.join(config.BASE_DIR, 'STATES')
+    states = sys.argv[1:] or sorted(entry.name for entry in os.scandir(states_dir) if entry.is_dir())
+    layers = [f'STATES/{state}/{state}_{layer}.geojson' for state in states for layer in config.PRELOAD_LAYERS
+              if os.path.exists(os.path.join(states_dir, state, f'{state}_{layer}.geojson'))]
+    print_memory_report(layer_memory_report(layers))
@@ -10,478 +10,196 @@ GITHUB_API_BASE_URL = "https://api.github.com/repos/SamNotLazy/KDLProject/conten
 # --- Local Data Configuration ---
 # Base directory for the project's data.
 BASE_DIR = 'Data/INDIAN-SHAPEFILES-master'
+# Directory holding the memory-mappable geometry buffers (see geo_buffers.py).
+GEO_BUFFER_DIR = 'Data/geo-buffers'
+# Attribute columns read from the source GeoJSON layers (plus the geometry); the rest
+# are skipped during the read. Metric columns stored in the layers can be added as a
+# comma-separated GEO_METRIC_COLUMNS list.
+GEO_KEY_COLUMNS = ['dtname', 'sdtname']
+GEO_METRIC_COLUMNS = [column for column in os.environ.get('GEO_METRIC_COLUMNS', '').split(',') if column]
+# Keep loaded layers compact: only the columns above plus the ingest-derived ones, name
+# columns as categoricals and display-only derived columns as float32 (see compact.py).
+COMPACT_LAYERS = os.environ.get('COMPACT_LAYERS', '1') == '1'
+# Coordinate storage of the geometry buffers: 'float64' (exact), 'float32' (about 1 m at
+# India's longitudes) or 'quantized' (int32 steps of GEO_COORDINATE_QUANTUM degrees from
+# the layer's south-west corner). The compact forms halve the buffer files and the page
+# cache they occupy; they are decoded to float64, and repaired, on load.
+GEO_COORDINATE_STORAGE = os.environ.get('GEO_COORDINATE_STORAGE', 'float64')
+GEO_COORDINATE_QUANTUM = 1e-6
 
 # --- Map Display Configuration ---
+# SQLite store of the saved map center/zoom per state and district (see layout_store.py).
+# It is created on first use from the layouts in MAP_LAYOUT_SEED and only written by
+# the "Save map layout" button and the import script, so it is not tracked.
+MAP_LAYOUT_DB = 'maplayouts.sqlite'
+MAP_LAYOUT_SEED = 'maplayouts.json'
 MAP_CONFIG = {'scrollZoom': True, 'displayModeBar': True, 'modeBarButtonsToRemove': ['select2d', 'lasso2d']}
 
-# --- Cache Configuration ---
-CACHE_CONFIG = {
-    'CACHE_TYPE': 'filesystem',
-    'CACHE_DIR': 'cache-directory'
+# --- Map Renderer Configuration ---
+# Layers with more features than this are drawn with deck.gl instead of Plotly (see renderers.py).
+DECKGL_FEATURE_THRESHOLD = int(os.environ.get('DECKGL_FEATURE_THRESHOLD', '3000'))
+# Decimal places kept in deck.gl polygon coordinates (4 is roughly 10 m).
+DECKGL_COORDINATE_DECIMALS = 4
+
+# --- National View Configuration ---
+# Entries listed before the states in the state dropdown, mapped to the layer they show (see national.py).
+NATIONAL_VIEWS = {'ALL_INDIA_DISTRICTS': 'DISTRICTS', 'ALL_INDIA_SUBDISTRICTS': 'SUBDISTRICTS'}
+# Vertex budget of a national layer; geometry is simplified until it fits.
+NATIONAL_MAX_COORDINATES = 250000
+# Simplification tolerance in degrees (0.001 is roughly 100 m), doubled up to the maximum.
+NATIONAL_SIMPLIFY_TOLERANCE = 0.001
+NATIONAL_MAX_SIMPLIFY_TOLERANCE = 0.1
+NATIONAL_ZOOM = 4
+
+# --- Rollup Configuration ---
+# Build the state views from the sub-district layer: district geometry dissolved from
+# sub-districts and district metrics rolled up from sub-district metrics (see rollup.py).
+ROLLUP_VIEWS = os.environ.get('ROLLUP_VIEWS', '1') == '1'
+# Equal-area CRS used for region areas, the default rollup weight.
+AREA_CRS = 'EPSG:6933'
+# Conformal CRS for India in which label points are placed (WGS 84 / India NSF LCC).
+LABEL_CRS = 'EPSG:7755'
+# geopandas dissolve method; 'coverage' is faster but assumes no overlapping regions.
+ROLLUP_DISSOLVE_METHOD = 'unary'
+
+# --- Spatial Query API Configuration ---
+# Most points or boxes accepted by one /api/v1/query request (see spatial_query.py).
+QUERY_MAX_ITEMS = 100000
+
+# --- Export Configuration ---
+# Output of the offline exporter (see export.py).
+EXPORT_DIR = 'exports'
+# Exporter processes; 0 means one per CPU.
+EXPORT_MAX_WORKERS = int(os.environ.get('EXPORT_MAX_WORKERS', '0'))
+# Zoom of exported maps, the UI's default.
+EXPORT_MAP_ZOOM = 6.5
+
+# --- Bar Panel Configuration ---
+# Layers with more regions than this show a top/bottom summary by default (see plotting.build_bar_figure).
+BAR_MAX_REGIONS = 40
+# Regions shown at each end of the summary; the rest are aggregated into one "Others" bar.
+BAR_TOP_N = 15
+BAR_PAGE_SIZE = 40
+# Above this many bars the chart is drawn with WebGL markers instead of SVG bars.
+BAR_WEBGL_THRESHOLD = 100
+BAR_ROW_HEIGHT = 25
+BAR_MAX_HEIGHT = 1500
+
+# --- Device Profiles ---
+# Viewport widths (px) below which a client counts as a phone or a tablet; anything wider is a desktop.
+DEVICE_BREAKPOINTS = {'phone': 576, 'tablet': 992}
+# Payload sizing per device class (see views.device_plot_options):
+#   simplify_tolerance - geometry simplification in degrees, None for full detail
+#   max_labels         - most region labels drawn on the map (largest regions first), None for all
+#   bar_mode/bar_top_n - default bar chart mode and regions shown at each end of its summary
+DEVICE_PROFILES = {
+    'phone': {'simplify_tolerance': 0.005, 'max_labels': 0, 'bar_mode': 'summary', 'bar_top_n': 5},
+    'tablet': {'simplify_tolerance': 0.001, 'max_labels': 40, 'bar_mode': 'auto', 'bar_top_n': 10},
+    'desktop': {'simplify_tolerance': None, 'max_labels': None, 'bar_mode': 'auto', 'bar_top_n': BAR_TOP_N},
 }
+DEFAULT_DEVICE = 'desktop'
 
-PLOTLY_CUSTOM_MAP_LAYOUTS={
-    "ANDAMAN & NICOBAR": {
-        "mapbox_center": {
-            "lat": 10.213683897850284,
-            "lon": 93.0733647662899
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 89.26811720708137,
-            "south": 6.408436338641755,
-            "east": 96.87861232549842,
-            "north": 14.018931457058814
-        }
-    },
-    "ANDHRA PRADESH": {
-        "mapbox_center": {
-            "lat": 15.895937511014829,
-            "lon": 80.76266863810739
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 76.36038751673513,
-            "south": 11.493656389642577,
-            "east": 85.16494975947964,
-            "north": 20.29821863238708
-        }
-    },
-    "ARUNACHAL PRADESH": {
-        "mapbox_center": {
-            "lat": 28.05627870812826,
-            "lon": 94.47897847944078
-        },
-        "mapbox_zoom": 5.5,
-        "mapbox_bounds": {
-            "west": 91.25320671897833,
-            "south": 24.830506947665818,
-            "east": 97.70475023990323,
-            "north": 31.282050468590704
-        }
-    },
-    "ASSAM": {
-        "mapbox_center": {
-            "lat": 26.05390371756694,
-            "lon": 92.85819162698331
-        },
-        "mapbox_zoom": 5.5,
-        "mapbox_bounds": {
-            "west": 89.38264334354311,
-            "south": 22.578355434126728,
-            "east": 96.33373991042352,
-            "north": 29.52945200100715
-        }
-    },
-    "BIHAR": {
-        "mapbox_center": {
-            "lat": 25.90390673336631,
-            "lon": 85.81037949445235
-        },
-        "mapbox_zoom": 6,
-        "mapbox_bounds": {
-            "west": 83.07122379883157,
-            "south": 23.164751037745525,
-            "east": 88.54953519007313,
-            "north": 28.643062428987093
-        }
-    },
-    "CHANDIGARH": {
-        "mapbox_center": {
-            "lat": 30.730840331824915,
-            "lon": 76.77728773590867
-        },
-        "mapbox_zoom": 10.5,
-        "mapbox_bounds": {
-            "west": 76.6979380345037,
-            "south": 30.65149063041994,
-            "east": 76.85663743731365,
-            "north": 30.81019003322989
-        }
-    },
-    "CHHATTISGARH": {
-        "mapbox_center": {
-            "lat": 20.94432551150004,
-            "lon": 82.32030588950005
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 78.84214015615004,
-            "south": 17.46615977815003,
-            "east": 85.79847162285006,
-            "north": 24.42249124485005
-        }
-    },
-    "DADRA & NAGAR HAVELI": {
-        "districts": {}
-    },
-    "DAMAN & DIU": {
-        "mapbox_center": {
-            "lat": 20.56484639800806,
-            "lon": 71.89011867438012
-        },
-        "mapbox_zoom": 7,
-        "mapbox_bounds": {
-            "west": 70.77464596322122,
-            "south": 19.449373686849164,
-            "east": 73.00559138553902,
-            "north": 21.68031910916696
-        }
-    },
-    "DELHI": {
-        "mapbox_center": {
-            "lat": 28.644249610845087,
-            "lon": 77.09325179754202
-        },
-        "mapbox_zoom": 8.5,
-        "mapbox_bounds": {
-            "west": 76.81351427486662,
-            "south": 28.364512088169676,
-            "east": 77.37298932021743,
-            "north": 28.923987133520498
-        }
-    },
-    "GOA": {
-        "mapbox_center": {
-            "lat": 15.350710066776884,
-            "lon": 74.00599581971676
-        },
-        "mapbox_zoom": 8,
-        "mapbox_bounds": {
-            "west": 73.51092065941307,
-            "south": 14.855634906473204,
-            "east": 74.50107098002044,
-            "north": 15.845785227080563
-        }
-    },
-    "GUJARAT": {
-        "mapbox_center": {
-            "lat": 22.41579081660557,
-            "lon": 71.28502304898697
-        },
-        "mapbox_zoom": 5.5,
-        "mapbox_bounds": {
-            "west": 67.77432250297247,
-            "south": 18.905090270591064,
-            "east": 74.79572359500148,
-            "north": 25.926491362620073
-        }
-    },
-    "HARYANA": {
-        "mapbox_center": {
-            "lat": 29.290599162042746,
-            "lon": 76.03898859292548
-        },
-        "mapbox_zoom": 6,
-        "mapbox_bounds": {
-            "west": 74.237188871026,
-            "south": 27.48879944014327,
-            "east": 77.84078831482495,
-            "north": 31.09239888394222
-        }
-    },
-    "HIMACHAL PRADESH": {
-        "mapbox_center": {
-            "lat": 31.817324728174313,
-            "lon": 77.301577980448
-        },
-        "mapbox_zoom": 6,
-        "mapbox_bounds": {
-            "west": 75.42350712483976,
-            "south": 29.939253872566066,
-            "east": 79.17964883605624,
-            "north": 33.695395583782556
-        }
-    },
-    "JAMMU & KASHMIR": {
-        "mapbox_center": {
-            "lat": 33.69714475179461,
-            "lon": 75.08489888641364
-        },
-        "mapbox_zoom": 6,
-        "mapbox_bounds": {
-            "west": 73.22059309969924,
-            "south": 31.832838965080217,
-            "east": 76.94920467312804,
-            "north": 35.56145053850901
-        }
-    },
-    "JHARKHAND": {
-        "mapbox_center": {
-            "lat": 23.659898869964586,
-            "lon": 85.64596669917654
-        },
-        "mapbox_zoom": 6,
-        "mapbox_bounds": {
-            "west": 83.09801393696235,
-            "south": 21.111946107750388,
-            "east": 88.19391946139073,
-            "north": 26.207851632178784
-        }
-    },
-    "KARNATAKA": {
-        "mapbox_center": {
-            "lat": 15.02671157114138,
-            "lon": 76.33668383985705
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 72.56134430800479,
-            "south": 11.251372039289127,
-            "east": 80.1120233717093,
-            "north": 18.802051102993634
-        }
-    },
-    "KERALA": {
-        "mapbox_center": {
-            "lat": 10.544048997177274,
-            "lon": 76.13998834436055
-        },
-        "mapbox_zoom": 5.5,
-        "mapbox_bounds": {
-            "west": 73.66327199521876,
-            "south": 8.067332648035498,
-            "east": 78.61670469350233,
-            "north": 13.02076534631905
-        }
-    },
-    "LADAKH": {
-        "mapbox_center": {
-            "lat": 34.70762106350245,
-            "lon": 76.42788585872768
-        },
-        "mapbox_zoom": 5.5,
-        "mapbox_bounds": {
-            "west": 72.13888541857429,
-            "south": 30.418620623349064,
-            "east": 80.71688629888106,
-            "north": 38.99662150365584
-        }
-    },
-    "LAKSHADWEEP": {
-        "mapbox_center": {
-            "lat": 9.983975537988918,
-            "lon": 72.93328975091376
-        },
-        "mapbox_zoom": 6,
-        "mapbox_bounds": {
-            "west": 71.04132056889397,
-            "south": 8.092006355969124,
-            "east": 74.82525893293355,
-            "north": 11.875944720008713
-        }
-    },
-    "MADHYA PRADESH": {
-        "mapbox_center": {
-            "lat": 23.969570225381066,
-            "lon": 78.42001148892685
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 73.59066399852776,
-            "south": 19.140222734981975,
-            "east": 83.24935897932593,
-            "north": 28.798917715780156
-        }
-    },
-    "MAHARASHTRA": {
-        "mapbox_center": {
-            "lat": 18.820028081431783,
-            "lon": 76.77648264643727
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 72.24242095783944,
-            "south": 14.285966392833952,
-            "east": 81.3105443350351,
-            "north": 23.354089770029614
-        }
-    },
-    "MANIPUR": {
-        "mapbox_center": {
-            "lat": 24.762341884374862,
-            "lon": 93.8575860596851
-        },
-        "mapbox_zoom": 6.5,
-        "mapbox_bounds": {
-            "west": 92.83518461636167,
-            "south": 23.739940441051438,
-            "east": 94.87998750300854,
-            "north": 25.784743327698287
-        }
-    },
-    "MEGHALAYA": {
-        "mapbox_center": {
-            "lat": 25.57432776697629,
-            "lon": 91.30842112210038
-        },
-        "mapbox_zoom": 6.5,
-        "mapbox_bounds": {
-            "west": 89.66458031766456,
-            "south": 23.93048696254046,
-            "east": 92.95226192653621,
-            "north": 27.218168571412118
-        }
-    },
-    "MIZORAM": {
-        "mapbox_center": {
-            "lat": 23.231213167500044,
-            "lon": 92.84658941400008
-        },
-        "mapbox_zoom": 6.5,
-        "mapbox_bounds": {
-            "west": 91.4275465761501,
-            "south": 21.812170329650066,
-            "east": 94.26563225185005,
-            "north": 24.650256005350023
-        }
-    },
-    "NAGALAND": {
-        "mapbox_center": {
-            "lat": 26.117305547880434,
-            "lon": 94.2845397702286
-        },
-        "mapbox_zoom": 6.5,
-        "mapbox_bounds": {
-            "west": 93.23079771594777,
-            "south": 25.063563493599606,
-            "east": 95.33828182450944,
-            "north": 27.171047602161263
-        }
-    },
-    "ORISSA": {
-        "districts": {}
-    },
-    "PUDUCHERRY": {
-        "mapbox_center": {
-            "lat": 13.794099774034748,
-            "lon": 78.92021112874917
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 75.18727900047797,
-            "south": 10.061167645763554,
-            "east": 82.65314325702037,
-            "north": 17.527031902305943
-        }
-    },
-    "PUNJAB": {
-        "mapbox_center": {
-            "lat": 31.027415897975676,
-            "lon": 75.4096331242582
-        },
-        "mapbox_zoom": 6,
-        "mapbox_bounds": {
-            "west": 73.7268698408915,
-            "south": 29.34465261460896,
-            "east": 77.09239640762492,
-            "north": 32.71017918134239
-        }
-    },
-    "RAJASTHAN": {
-        "mapbox_center": {
-            "lat": 26.629673915003995,
-            "lon": 73.87824022005802
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 69.04482551787264,
-            "south": 21.79625921281861,
-            "east": 78.7116549222434,
-            "north": 31.463088617189378
-        }
-    },
-    "SIKKIM": {
-        "mapbox_center": {
-            "lat": 27.604182125326616,
-            "lon": 88.46680899294111
-        },
-        "mapbox_zoom": 7.5,
-        "mapbox_bounds": {
-            "west": 87.88960268135622,
-            "south": 27.026975813741725,
-            "east": 89.044015304526,
-            "north": 28.181388436911508
-        }
-    },
-    "TAMIL NADU": {
-        "mapbox_center": {
-            "lat": 10.82116630670658,
-            "lon": 78.28976492701142
-        },
-        "mapbox_zoom": 5.5,
-        "mapbox_bounds": {
-            "west": 75.27195684693052,
-            "south": 7.803358226625688,
-            "east": 81.30757300709232,
-            "north": 13.838974386787472
-        }
-    },
-    "TELANGANA": {
-        "mapbox_center": {
-            "lat": 17.876415400847236,
-            "lon": 79.27927319564478
-        },
-        "mapbox_zoom": 5.5,
-        "mapbox_bounds": {
-            "west": 77.0315765366234,
-            "south": 15.628718741825866,
-            "east": 81.52696985466615,
-            "north": 20.124112059868608
-        }
-    },
-    "TRIPURA": {
-        "mapbox_center": {
-            "lat": 23.733414020606503,
-            "lon": 91.74082183159868
-        },
-        "mapbox_zoom": 7,
-        "mapbox_bounds": {
-            "west": 90.86716851674225,
-            "south": 22.85976070575007,
-            "east": 92.6144751464551,
-            "north": 24.607067335462936
-        }
-    },
-    "UTTAR PRADESH": {
-        "mapbox_center": {
-            "lat": 27.138230096399496,
-            "lon": 80.85933548883872
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 76.70640858910541,
-            "south": 22.985303196666187,
-            "east": 85.01226238857204,
-            "north": 31.291156996132806
-        }
-    },
-    "UTTARAKHAND": {
-        "mapbox_center": {
-            "lat": 30.089510836782647,
-            "lon": 79.30879380903048
-        },
-        "mapbox_zoom": 6,
-        "mapbox_bounds": {
-            "west": 77.39865090701275,
-            "south": 28.17936793476492,
-            "east": 81.2189367110482,
-            "north": 31.999653738800376
-        }
+# --- Viewport Culling ---
+# Plotly maps only carry the regions whose bounding box meets the visible map area,
+# widened by VIEWPORT_CULL_MARGIN of its size on every side; panning past that
+# area fetches the map again (see views.cull_map_figure).
+VIEWPORT_CULLING = os.environ.get('VIEWPORT_CULLING', '1') == '1'
+VIEWPORT_CULL_MARGIN = 0.5
+# Size of the Plotly map panel, used to turn center and zoom into a visible area: the
+# graph's height, and the share of the viewport width it takes from the 'lg' breakpoint up.
+MAP_PANEL_HEIGHT = 450
+MAP_PANEL_WIDTH_FRACTION = 0.5
+MAP_PANEL_SPLIT_BREAKPOINT = 992
+# Assumed until the browser reports its viewport.
+DEFAULT_VIEWPORT = {'width': 1280, 'height': 800}
+# Mapbox GL draws the world 512 px wide at zoom 0.
+MAPBOX_TILE_SIZE = 512
+
+# --- Cache Configuration ---
+# CACHE_BACKEND selects where memoized layers live:
+#   'filesystem' - per-node disk cache (default)
+#   'memory'     - per-process memory cache, within MEMORY_BUDGET_MB
+#   'redis'      - shared Redis-protocol cache for multi-node deployments (see
+#                  cache_backends.py); REDIS_URL='memory://' uses an in-process stand-in.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'filesystem')
+# Shared cache keys are namespaced by this version; bump it when the source data changes.
+DATASET_VERSION = os.environ.get('DATASET_VERSION', '2019')
+
+CACHE_CONFIGS = {
+    'filesystem': {
+        'CACHE_TYPE': 'filesystem',
+        'CACHE_DIR': 'cache-directory'
+    },
+    'memory': {
+        'CACHE_TYPE': 'cache_backends.BudgetedSimpleCache',
+    },
+    'redis': {
+        'CACHE_TYPE': 'cache_backends.NamespacedRedisCache',
+        'CACHE_REDIS_URL': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+        'CACHE_KEY_PREFIX': 'kdl:',
+        'CACHE_DATASET_VERSION': DATASET_VERSION,
+        # Local disk fallback used when the shared cache is unreachable at startup.
+        'CACHE_DIR': 'cache-directory',
     },
-    "WEST BENGAL": {
-        "mapbox_center": {
-            "lat": 24.35238645951029,
-            "lon": 87.8469307509705
-        },
-        "mapbox_zoom": 5,
-        "mapbox_bounds": {
-            "west": 84.69134855812031,
-            "south": 21.196804266660095,
-            "east": 91.00251294382069,
-            "north": 27.507968652360482
-        }
-    }
 }
+CACHE_CONFIG = CACHE_CONFIGS[CACHE_BACKEND]
+
+# --- Memory Budget ---
+# Bytes the in-process caches may hold together: the 'memory' cache backend, the
+# in-process shared-cache stand-in, the spatial query indexes and the Streamlit layer
+# handles. Past it, the entries that are cheapest to rebuild per byte are evicted
+# first (see memory_budget.py). Preloaded layers count against it but are never
+# evicted. 0 disables the budget.
+MEMORY_BUDGET_MB = int(os.environ.get('MEMORY_BUDGET_MB', '1024'))
+
+# --- Background Render Configuration ---
+# Render sub-district views that are not cached yet in a separate process, through a
+# Dash background callback, so a slow render does not hold up a request worker. The
+# render process hands the view over through the cache, so they only run when the
+# configured cache is shared between processes (see cache_backends.is_shared_between_processes).
+BACKGROUND_RENDERS = os.environ.get('BACKGROUND_RENDERS', '1') == '1'
+# diskcache directory holding the job queue and results of the background callbacks.
+BACKGROUND_CACHE_DIR = os.path.join('cache-directory', 'background-callbacks')
+# Each background render is a process of its own; at most this many run at once across
+# all workers. Past it, views render in the request worker as with BACKGROUND_RENDERS off.
+BACKGROUND_MAX_JOBS = int(os.environ.get('BACKGROUND_MAX_JOBS', str(os.cpu_count() or 1)))
+# A render slot that was never released (its job was cancelled or killed) frees up after this.
+BACKGROUND_JOB_TIMEOUT_SECONDS = float(os.environ.get('BACKGROUND_JOB_TIMEOUT_SECONDS', '300'))
+
+# --- Render Scheduling ---
+# Latest-wins scheduling of map updates per browser session: renders superseded by a
+# newer request of the same session are dropped (see scheduler.py).
+LATEST_WINS = os.environ.get('LATEST_WINS', '1') == '1'
+# Slider moves, map pans and Next clicks wait this long for a newer request first.
+RENDER_DEBOUNCE_SECONDS = float(os.environ.get('RENDER_DEBOUNCE_SECONDS', '0.15'))
+# Threads per gunicorn worker; a newer request can only overtake an older one when
+# the worker serves requests concurrently.
+WEB_THREADS = int(os.environ.get('WEB_THREADS', '4'))
+
+# --- Geometry Preload Configuration ---
+# When enabled, every state's geometry layers are loaded once in the gunicorn master
+# (see gunicorn.conf.py) and shared copy-on-write with the forked workers.
+PRELOAD_GEOMETRY = os.environ.get('PRELOAD_GEOMETRY', '0') == '1'
+# Layer suffixes to preload for each state, e.g. STATES/<state>/<state>_DISTRICTS.geojson
+PRELOAD_LAYERS = ('DISTRICTS', 'SUBDISTRICTS')
 
+# --- Cache Warmer Configuration ---
+# Opt-in: pre-render every state view in the background after startup (see warmer.py).
+WARM_CACHE_ON_BOOT = os.environ.get('WARM_CACHE_ON_BOOT', '0') == '1'
+WARMER_MAX_WORKERS = int(os.environ.get('WARMER_MAX_WORKERS', '1'))
+# Pause after each warmed view so live requests keep most of the CPU.
+WARMER_THROTTLE_SECONDS = float(os.environ.get('WARMER_THROTTLE_SECONDS', '0.5'))
+# Also warm every district's sub-district view once all state views are done.
+WARMER_INCLUDE_DISTRICTS = os.environ.get('WARMER_INCLUDE_DISTRICTS', '0') == '1'
+# States warmed first; the rest follow in catalog order.
+WARMER_PRIORITY_STATES = ['KARNATAKA', 'MAHARASHTRA', 'UTTAR PRADESH', 'TAMIL NADU', 'DELHI']
+# Lock file that makes only one process per machine run the warmer.
+WARMER_LOCK_FILE = os.path.join('cache-directory', '.warmer.lock')
 
+# --- Prefetch Configuration ---
+# Render the next (and previous) state/district in the background whenever a view
+# is served, so Next State / Next District hit a warm cache (see prefetch.py).
+# Districts are not prefetched while they render in the background (BACKGROUND_RENDERS).
+PREFETCH_ENABLED = os.environ.get('PREFETCH_ENABLED', '1') == '1'
+PREFETCH_PREVIOUS = True
+PREFETCH_MAX_WORKERS = 1
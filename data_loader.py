@@ -1,9 +1,17 @@
 # data_loader.py
+import gc
+import json
 import os
 import requests
 import geopandas as gpd
+import numpy as np
 from cache import cache
 import config
+from compact import compact_layer
+from geo_buffers import has_buffers, load_geo_from_buffers, source_fingerprint, write_geo_buffers
+from geo_handles import estimate_gdf_nbytes
+from memory_budget import memory_governor
+from ingest import prepare_layer
 
 def get_state_names():
     """
@@ -50,8 +58,171 @@ def get_state_names():
     return sorted(all_state_names)
 
 
-@cache.memoize(timeout=3600)  # Cache for 1 hour
+# Geometry layers loaded once by preload_geometries(), keyed by relative file path.
+# Under `gunicorn --preload` these live in the master and are shared with the forked
+# workers page-for-page, so callers must treat the returned frames as read-only.
+_PRELOADED_LAYERS = {}
+
+
 def load_geo(relative_file_path: str):
+    """
+    Returns the GeoDataFrame for a layer, preferring the preloaded shared copy.
+
+    Args:
+        relative_file_path (str): Path of the layer relative to config.BASE_DIR.
+
+    Returns:
+        gpd.GeoDataFrame | None: The layer, or None if it could not be loaded.
+    """
+    preloaded = _PRELOADED_LAYERS.get(relative_file_path)
+    if preloaded is not None:
+        return preloaded
+    if has_buffers(relative_file_path):
+        # Mapping the buffers is cheaper than unpickling a copy from the flask cache.
+        return _load_buffers(relative_file_path)
+    fingerprint = json.dumps(source_fingerprint([relative_file_path]), sort_keys=True)
+    return _load_geo_cached(relative_file_path, fingerprint)
+
+
+def load_geo_subset(relative_file_path: str, match=None, bbox=None):
+    """
+    Returns the rows of a layer whose name columns match and that intersect a box.
+
+    Layers already in memory or in geometry buffers are filtered in place. Otherwise
+    the filters are pushed down into the GeoJSON read, so only the matching features
+    are parsed; such partial reads are not cached.
+
+    Args:
+        relative_file_path (str): Path of the layer relative to config.BASE_DIR.
+        match (dict, optional): {column: name} pairs, compared case- and
+                                whitespace-insensitively.
+        bbox (tuple, optional): (minx, miny, maxx, maxy) in the layer's CRS; rows
+                                whose bounding box intersects it are kept.
+
+    Returns:
+        gpd.GeoDataFrame | None: The matching rows, or None if the layer could not be loaded.
+    """
+    match = match or {}
+    local_path = os.path.join(config.BASE_DIR, relative_file_path)
+    if relative_file_path in _PRELOADED_LAYERS or has_buffers(relative_file_path) or not os.path.exists(local_path):
+        gdf = load_geo(relative_file_path)
+    else:
+        # OGR SQL has no LOWER/TRIM: ILIKE with wildcards selects a superset, matched exactly below.
+        where = ' AND '.join(f"{column} ILIKE {_sql_contains(name)}" for column, name in match.items())
+        print(f"Loading the matching rows of '{relative_file_path}'...")
+        try:
+            gdf = _compact(prepare_layer(read_geo_arrow(local_path, where=where or None, bbox=bbox)))
+        except Exception as e:
+            print(f"Error reading local file {local_path}: {e}")
+            return None
+
+    if gdf is None:
+        return None
+    mask = np.ones(len(gdf), dtype=bool)
+    for column, name in match.items():
+        if column not in gdf.columns:
+            return gdf.iloc[:0]
+        mask &= (gdf[column].astype(str).str.strip().str.lower() == str(name).strip().lower()).to_numpy()
+    if bbox is not None:
+        minx, miny, maxx, maxy = bbox
+        mask &= ((gdf['maxx'] >= minx) & (gdf['minx'] <= maxx) & (gdf['maxy'] >= miny) & (gdf['miny'] <= maxy)).to_numpy()
+    return gdf[mask]
+
+
+def _sql_contains(name) -> str:
+    # Quotes are doubled; '%' and '_' in names only widen the prefilter.
+    escaped = str(name).strip().replace("'", "''")
+    return f"'%{escaped}%'"
+
+
+def read_geo_arrow(local_path: str, columns=None, where=None, bbox=None):
+    """
+    Reads a vector file through pyogrio's Arrow interface.
+
+    Features are decoded in bulk into Arrow columns rather than one Python object at
+    a time, and only the requested columns and features are read at all.
+
+    Args:
+        local_path (str): The file to read.
+        columns (list[str], optional): Attribute columns to read; columns missing
+                                       from the file are skipped. Defaults to
+                                       config.GEO_KEY_COLUMNS + config.GEO_METRIC_COLUMNS.
+        where (str, optional): OGR SQL attribute filter.
+        bbox (tuple, optional): (minx, miny, maxx, maxy) spatial filter in the file's CRS.
+
+    Returns:
+        gpd.GeoDataFrame: The features read.
+    """
+    if columns is None:
+        columns = config.GEO_KEY_COLUMNS + config.GEO_METRIC_COLUMNS
+    return gpd.read_file(local_path, engine='pyogrio', use_arrow=True, columns=columns, where=where, bbox=bbox)
+
+
+def preload_geometries(state_names):
+    """
+    Loads every configured layer of every state into the shared preload table.
+
+    Intended to run once in the gunicorn master before workers are forked. After
+    loading, the garbage collector is frozen so that collections in the workers do
+    not write to the headers of the shared objects and un-share their pages. The
+    layers are pinned in the memory budget: they count against it, but are never evicted.
+
+    Args:
+        state_names (list[str]): States to preload, as returned by get_state_names().
+
+    Returns:
+        int: The number of layers that were loaded.
+    """
+    for state in state_names:
+        for layer in config.PRELOAD_LAYERS:
+            relative_file_path = f'STATES/{state}/{state}_{layer}.geojson'
+            if relative_file_path in _PRELOADED_LAYERS:
+                continue
+            gdf = _read_geo(relative_file_path)
+            if gdf is not None:
+                _PRELOADED_LAYERS[relative_file_path] = gdf
+                memory_governor.pin('preloaded-layers', relative_file_path, estimate_gdf_nbytes(gdf))
+
+    gc.collect()
+    gc.freeze()
+    print(f"Preloaded {len(_PRELOADED_LAYERS)} geometry layers for {len(state_names)} states. {memory_governor.describe()}")
+    return len(_PRELOADED_LAYERS)
+
+
+@cache.memoize(timeout=3600)  # Cache for 1 hour
+def _load_geo_cached(relative_file_path: str, fingerprint: str):
+    # The source fingerprint (which includes INGEST_VERSION) only takes part in the cache key.
+    return _read_geo(relative_file_path)
+
+
+def _read_geo(relative_file_path: str):
+    if has_buffers(relative_file_path):
+        return _load_buffers(relative_file_path)
+
+    gdf = _read_geojson(relative_file_path)
+    if gdf is None and has_buffers(relative_file_path, current_only=False):
+        # The source could not be read: prepare the outdated buffers again instead.
+        print(f"Rebuilding geometry buffers for '{relative_file_path}' from the outdated ones.")
+        gdf = load_geo_from_buffers(relative_file_path)
+    if gdf is not None:
+        gdf = _compact(prepare_layer(gdf))
+        try:
+            write_geo_buffers(gdf, relative_file_path, sources=[relative_file_path])
+        except Exception as e:
+            print(f"Could not write geometry buffers for '{relative_file_path}': {e}")
+    return gdf
+
+
+def _load_buffers(relative_file_path: str):
+    # No-op for buffers written compact.
+    return _compact(load_geo_from_buffers(relative_file_path))
+
+
+def _compact(gdf):
+    return compact_layer(gdf) if config.COMPACT_LAYERS else gdf
+
+
+def _read_geojson(relative_file_path: str):
 
     local_path = os.path.join(config.BASE_DIR, relative_file_path)
     github_url = config.GITHUB_RAW_BASE_URL + relative_file_path.replace("\\", "/")
@@ -59,7 +230,7 @@ def load_geo(relative_file_path: str):
     if os.path.exists(local_path):
         print(f"Loading '{relative_file_path}' from local cache...")
         try:
-            return gpd.read_file(local_path)
+            return read_geo_arrow(local_path)
         except Exception as e:
             print(f"Error reading local file {local_path}: {e}")
             return None
@@ -75,7 +246,7 @@ def load_geo(relative_file_path: str):
                 f.write(chunk)
         print(f"Successfully downloaded and saved to '{local_path}'")
 
-        return gpd.read_file(local_path)
+        return read_geo_arrow(local_path)
 
     except requests.exceptions.RequestException as e:
         print(f"Error downloading file from GitHub: {e}")
@@ -0,0 +1,216 @@
+# export.py
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import plotly.io as pio
+from flask import Flask
+from plotly.utils import PlotlyJSONEncoder
+
+import config
+from cache import cache
+from data_loader import get_state_names
+from ingest import INGEST_VERSION
+from renderers import deck_spec_to_html
+from views import COLOR_SCALE, render_state_view, render_district_view, with_map_view
+
+MANIFEST_FILE = 'manifest.json'
+# Bump when the exported files change shape, to force a full refresh.
+EXPORT_FORMAT_VERSION = 1
+# config settings the export path reads, from loading the layers to writing the files;
+# changing any of them changes every view's input hash (see input_hash).
+EXPORT_SETTINGS = (
+    'DATASET_VERSION', 'AREA_CRS', 'LABEL_CRS', 'GEO_KEY_COLUMNS', 'GEO_METRIC_COLUMNS', 'COMPACT_LAYERS',
+    'GEO_COORDINATE_STORAGE', 'GEO_COORDINATE_QUANTUM', 'ROLLUP_VIEWS', 'ROLLUP_DISSOLVE_METHOD',
+    'DEFAULT_DEVICE', 'DEVICE_PROFILES', 'VIEWPORT_CULLING', 'VIEWPORT_CULL_MARGIN', 'MAPBOX_TILE_SIZE',
+    'DECKGL_FEATURE_THRESHOLD', 'DECKGL_COORDINATE_DECIMALS', 'BAR_TOP_N', 'BAR_MAX_REGIONS', 'BAR_PAGE_SIZE',
+    'BAR_ROW_HEIGHT', 'BAR_MAX_HEIGHT', 'BAR_WEBGL_THRESHOLD', 'EXPORT_MAP_ZOOM',
+)
+_FILE_NAME_UNSAFE = re.compile(r'[^\w\- ]')
+
+# Flask app of each pool process; the memoized view builders need an app context.
+_worker_app = None
+
+
+def _init_worker():
+    global _worker_app
+    _worker_app = Flask(__name__)
+    cache.init_app(_worker_app, config=config.CACHE_CONFIG)
+
+
+def export_all(state_names, out_dir, max_workers=None, force=False):
+    """
+    Exports every state view and every district view as figure JSON and standalone HTML.
+
+    Views are rendered on a process pool, states first and then the districts they
+    list. A view is skipped when its input hash (see input_hash) matches the one
+    recorded in the manifest of the previous export and its files are still there.
+
+    Args:
+        state_names (list[str]): States to export.
+        out_dir (str): Output directory; views are written to <state>/state.* and
+                       <state>/districts/<district>.*.
+        max_workers (int, optional): Pool size. Defaults to config.EXPORT_MAX_WORKERS,
+                                     or one process per CPU.
+        force (bool, optional): Re-export every view regardless of the manifest.
+
+    Returns:
+        dict: Counts of 'exported', 'skipped', 'empty' and 'failed' views.
+    """
+    max_workers = max_workers or config.EXPORT_MAX_WORKERS or os.cpu_count()
+    manifest = {} if force else _read_manifest(out_dir)
+    stats = {'exported': 0, 'skipped': 0, 'empty': 0, 'failed': 0}
+    started = time.perf_counter()
+    print(f"Exporting {len(state_names)} states to '{out_dir}' with {max_workers} process(es).")
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+        state_jobs = [(state, None) for state in state_names]
+        districts = {}
+        for (state, _), view_districts in _run_jobs(pool, state_jobs, out_dir, manifest, stats, max_workers):
+            districts[state] = view_districts or []
+        _write_manifest(out_dir, manifest)
+
+        district_jobs = [(state, district) for state in state_names for district in districts.get(state, [])]
+        list(_run_jobs(pool, district_jobs, out_dir, manifest, stats, max_workers))
+        _write_manifest(out_dir, manifest)
+
+    elapsed = time.perf_counter() - started
+    rendered = stats['exported'] + stats['empty'] + stats['failed']
+    print(f"Export finished in {elapsed:.1f}s: {stats['exported']} exported, {stats['skipped']} unchanged, "
+          f"{stats['empty']} empty, {stats['failed']} failed ({rendered / elapsed:.1f} rendered views/s).")
+    return stats
+
+
+def _run_jobs(pool, jobs, out_dir, manifest, stats, max_workers):
+    """Exports the changed views among `jobs` and yields (job, districts) for every job."""
+    pending = []
+    for state, district in jobs:
+        view_id = _view_id(state, district)
+        digest = input_hash(state, district)
+        entry = manifest.get(view_id)
+        if digest and entry and entry['hash'] == digest and os.path.exists(os.path.join(out_dir, view_id + '.html')):
+            stats['skipped'] += 1
+            yield (state, district), entry.get('districts')
+        else:
+            pending.append((state, district, view_id, digest))
+
+    chunksize = max(1, len(pending) // (max_workers * 4))
+    results = pool.map(_export_view, [(state, district, view_id, out_dir) for state, district, view_id, _ in pending],
+                       chunksize=chunksize)
+    for (state, district, view_id, digest), (status, districts) in zip(pending, results):
+        stats[status] += 1
+        if status != 'failed':
+            manifest[view_id] = {'hash': digest, 'districts': districts}
+        yield (state, district), districts
+
+
+def _export_view(job):
+    """Renders one view in a pool process and writes its files. Returns (status, districts)."""
+    state, district, view_id, out_dir = job
+    try:
+        with _worker_app.app_context():
+            view = render_state_view(state) if district is None else render_district_view(state, district)
+        if view is None or view.get('empty'):
+            return 'empty', None
+        title = f"State View: {state.replace('_', ' ').title()}" if district is None else f"Sub-District View: {district.title()}"
+        write_view_files(view, os.path.join(out_dir, view_id), title)
+        return 'exported', view.get('districts')
+    except Exception as e:
+        print(f"Export of {view_id} failed: {e}")
+        return 'failed', None
+
+
+def write_view_files(view, path_stem, title):
+    """
+    Writes a rendered view as <path_stem>.json (map and bar figures, or the deck.gl
+    spec of large maps) and <path_stem>.html (a standalone page loading plotly.js
+    from its CDN).
+    """
+    os.makedirs(os.path.dirname(path_stem), exist_ok=True)
+    center = view['map_layout']['mapbox_center']
+    map_fig = with_map_view(view['map_fig'], center, config.EXPORT_MAP_ZOOM) if view.get('map_fig') else None
+
+    with open(path_stem + '.json', 'w') as f:
+        json.dump({'title': title, 'map': map_fig, 'map_deck': view.get('map_deck'), 'bar': view['bar_fig']}, f,
+                  cls=PlotlyJSONEncoder)
+
+    if map_fig is not None:
+        map_html = pio.to_html(map_fig, full_html=False, include_plotlyjs='cdn')
+        bar_html = pio.to_html(view['bar_fig'], full_html=False, include_plotlyjs=False)
+    else:
+        deck_html = deck_spec_to_html(view['map_deck'], center=center, zoom=config.EXPORT_MAP_ZOOM)
+        map_html = f'<iframe srcdoc="{html.escape(deck_html)}" style="width:100%;height:600px;border:none"></iframe>'
+        bar_html = pio.to_html(view['bar_fig'], full_html=False, include_plotlyjs='cdn')
+
+    with open(path_stem + '.html', 'w', encoding='utf-8') as f:
+        f.write(f'<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>{html.escape(title)}</title></head>\n'
+                f'<body>\n<h3 style="text-align:center">{html.escape(title)}</h3>\n{map_html}\n{bar_html}\n</body>\n</html>\n')
+
+
+def input_hash(state, district=None):
+    """
+    Returns a content hash of everything a view is rendered from: its source layer
+    files, EXPORT_SETTINGS and the colour scale. None if a source layer is not
+    available locally, in which case the view is always exported.
+    """
+    settings = {name: getattr(config, name) for name in EXPORT_SETTINGS}
+    digest = hashlib.sha256(json.dumps([
+        EXPORT_FORMAT_VERSION, INGEST_VERSION, settings, COLOR_SCALE, state, district,
+    ], sort_keys=True).encode())
+    layers = ('DISTRICTS', 'SUBDISTRICTS') if district is None else ('SUBDISTRICTS',)
+    for layer in layers:
+        path = os.path.join(config.BASE_DIR, 'STATES', state, f'{state}_{layer}.geojson')
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        digest.update(_file_digest(path, stat.st_mtime_ns, stat.st_size).encode())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _file_digest(path, mtime_ns, size):
+    # Keyed by mtime and size so each layer file is read once per run.
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _view_id(state, district=None):
+    if district is None:
+        return f'{state}/state'
+    return f"{state}/districts/{_FILE_NAME_UNSAFE.sub('_', district)}"
+
+
+def _read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(out_dir, manifest):
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = os.path.join(out_dir, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST_FILE))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export every state and district view as figure JSON and HTML.")
+    parser.add_argument('out_dir', nargs='?', default=config.EXPORT_DIR)
+    parser.add_argument('--workers', type=int, default=None, help="Number of processes (default: one per CPU).")
+    parser.add_argument('--states', nargs='*', help="Only export these states.")
+    parser.add_argument('--force', action='store_true', help="Re-export unchanged views too.")
+    args = parser.parse_args()
+
+    export_all(args.states or get_state_names(), args.out_dir, max_workers=args.workers, force=args.force)
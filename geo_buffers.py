@@ -0,0 +1,289 @@
+# geo_buffers.py
+import json
+import os
+import threading
+
+import geopandas as gpd
+import numpy as np
+import pyarrow.feather as feather
+import shapely
+
+import config
+from geo_handles import estimate_gdf_nbytes
+from ingest import INGEST_VERSION, repair_geometries
+from memory_budget import BudgetedDict
+
+# Layout of a buffer directory (one per layer, see buffer_path()):
+#   coords.npy      (n, 2) array of every vertex, geoarrow "interleaved" order: float64,
+#                   float32 or int32 steps from an origin (see COORDINATE_STORAGES)
+#   offsets_<i>.npy int32 offset arrays, innermost (ring -> vertex) first, as produced
+#                   by shapely.to_ragged_array
+#   attributes.arrow uncompressed Arrow IPC file with the non-geometry columns
+#   meta.json       geometry type, CRS, number of offset levels, coordinate storage and
+#                   the fingerprint of the sources the layer was built from
+COORDS_FILE = 'coords.npy'
+COORDINATE_STORAGES = ('float64', 'float32', 'quantized')
+ATTRIBUTES_FILE = 'attributes.arrow'
+META_FILE = 'meta.json'
+
+# Layers rebuilt by load_geo_from_buffers(), keyed by (relative file path, meta.json
+# contents) so rewritten buffers are loaded afresh. Shared by every caller in the
+# process, so the frames must be treated as read-only.
+_LOADED_LOCK = threading.Lock()
+_LOADED_LAYERS = BudgetedDict('geo-buffers', sizeof=estimate_gdf_nbytes, lock=_LOADED_LOCK)
+_LOAD_LOCKS = {}
+
+
+class GeoBuffers:
+    """
+    Flat, memory-mapped geometry buffers of a layer in the geoarrow ragged layout.
+
+    Attributes:
+        geometry_type (shapely.GeometryType): Type shared by every geometry.
+        coords (np.ndarray): (n, 2) float64 array of vertex coordinates; memory-mapped
+                             when stored as float64, decoded into memory otherwise.
+        offsets (tuple[np.memmap]): Ragged offset arrays, innermost level first.
+        crs (str | None): CRS of the coordinates.
+        lossy (bool): Whether the coordinates were stored rounded (float32 or quantized).
+    """
+
+    def __init__(self, geometry_type, coords, offsets, crs, lossy=False):
+        self.geometry_type = geometry_type
+        self.coords = coords
+        self.offsets = offsets
+        self.crs = crs
+        self.lossy = lossy
+
+    def __len__(self):
+        return len(self.offsets[-1]) - 1
+
+    def geometries(self):
+        """Builds the shapely geometries straight from the mapped arrays."""
+        return shapely.from_ragged_array(self.geometry_type, self.coords, self.offsets)
+
+    def total_bounds(self):
+        """Returns (minx, miny, maxx, maxy) computed from the coordinates alone."""
+        if not len(self.coords):
+            return None, None, None, None
+        mins = self.coords.min(axis=0)
+        maxs = self.coords.max(axis=0)
+        return mins[0], mins[1], maxs[0], maxs[1]
+
+    def coordinate_ranges(self):
+        """
+        Returns the [start, stop) vertex range of every geometry.
+
+        Lets a renderer slice `coords` per feature without building shapely objects.
+        """
+        ranges = np.arange(len(self) + 1)
+        for level in reversed(self.offsets):
+            ranges = np.asarray(level)[ranges]
+        return np.column_stack((ranges[:-1], ranges[1:]))
+
+
+def buffer_path(relative_file_path: str) -> str:
+    """Returns the buffer directory for a layer path relative to config.BASE_DIR."""
+    return os.path.join(config.GEO_BUFFER_DIR, relative_file_path + '.geoarrow')
+
+
+def has_buffers(relative_file_path: str, current_only: bool = True) -> bool:
+    """
+    Tells whether a layer has buffers, by default only ones built from its current sources.
+
+    Buffers are current when they were written for config.DATASET_VERSION and the
+    current ingest.INGEST_VERSION, and none
+    of the source files they were built from has changed size or modification time
+    since (see source_fingerprint). Sources that are no longer on disk are not held
+    against them, so deployments that ship only the buffers keep using them.
+    """
+    try:
+        meta = _read_meta(relative_file_path)
+    except FileNotFoundError:
+        return False
+    return not current_only or _is_current(meta.get('fingerprint'))
+
+
+def source_fingerprint(relative_file_paths) -> dict:
+    """
+    Identifies the inputs a layer is built from.
+
+    Args:
+        relative_file_paths (list[str]): Source files relative to config.BASE_DIR.
+
+    Returns:
+        dict: 'dataset_version' (config.DATASET_VERSION), 'ingest_version'
+              (ingest.INGEST_VERSION) and 'sources', mapping each source present on
+              disk to its "<size>:<mtime in ns>".
+    """
+    sources = {}
+    for path in relative_file_paths:
+        try:
+            stat = os.stat(os.path.join(config.BASE_DIR, path))
+        except OSError:
+            continue
+        sources[path] = f'{stat.st_size}:{stat.st_mtime_ns}'
+    return {'dataset_version': config.DATASET_VERSION, 'ingest_version': INGEST_VERSION, 'sources': sources}
+
+
+def _is_current(fingerprint) -> bool:
+    if (not fingerprint or fingerprint.get('dataset_version') != config.DATASET_VERSION
+            or fingerprint.get('ingest_version') != INGEST_VERSION):
+        return False
+    stored = fingerprint.get('sources', {})
+    present = source_fingerprint(stored)['sources']
+    return all(stored[path] == stamp for path, stamp in present.items())
+
+
+def _read_meta(relative_file_path: str) -> dict:
+    with open(os.path.join(buffer_path(relative_file_path), META_FILE)) as f:
+        return json.load(f)
+
+
+def write_geo_buffers(gdf: gpd.GeoDataFrame, relative_file_path: str, coordinate_storage: str = None, sources=()):
+    """
+    Writes a GeoDataFrame as flat coordinate/offset buffers plus an Arrow attribute file.
+
+    Mixed Polygon/MultiPolygon layers are stored as MultiPolygon, as shapely does.
+    'float32' and 'quantized' coordinates take half the space of 'float64' but are
+    lossy (about 1 m and config.GEO_COORDINATE_QUANTUM degrees respectively).
+    meta.json is written last so a partially written directory is never picked up.
+    Each file is written aside and then renamed over the old one, so processes that
+    still map an earlier version of the layer keep reading intact files.
+
+    Args:
+        gdf (gpd.GeoDataFrame): The layer to store.
+        relative_file_path (str): Path of the source layer relative to config.BASE_DIR.
+        coordinate_storage (str, optional): One of COORDINATE_STORAGES. Defaults to
+                                            config.GEO_COORDINATE_STORAGE.
+        sources (list[str], optional): Files the layer was built from, relative to
+                                       config.BASE_DIR; their fingerprint is stored so
+                                       has_buffers() can tell when they change.
+    """
+    coordinate_storage = coordinate_storage or config.GEO_COORDINATE_STORAGE
+    out_dir = buffer_path(relative_file_path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    geometry_type, coords, offsets = shapely.to_ragged_array(gdf.geometry.values)
+    stored_coords, coordinate_meta = _encode_coordinates(coords, coordinate_storage)
+    _write_replacing(os.path.join(out_dir, COORDS_FILE), lambda f: np.save(f, stored_coords))
+    for level, offset in enumerate(offsets):
+        _write_replacing(os.path.join(out_dir, f'offsets_{level}.npy'), lambda f: np.save(f, offset))
+
+    attributes = gdf.drop(columns=gdf.geometry.name).reset_index(drop=True)
+    _write_replacing(os.path.join(out_dir, ATTRIBUTES_FILE),
+                     lambda f: feather.write_feather(attributes, f, compression='uncompressed'))
+
+    meta = {
+        'geometry_type': int(geometry_type),
+        'offset_levels': len(offsets),
+        'crs': gdf.crs.to_string() if gdf.crs is not None else None,
+        'coordinate_storage': coordinate_storage,
+        **coordinate_meta,
+        'fingerprint': source_fingerprint(sources),
+    }
+    _write_replacing(os.path.join(out_dir, META_FILE), lambda f: f.write(json.dumps(meta).encode()))
+
+
+def _encode_coordinates(coords, coordinate_storage):
+    if coordinate_storage == 'float64':
+        return np.ascontiguousarray(coords, dtype=np.float64), {}
+    if coordinate_storage == 'float32':
+        return np.ascontiguousarray(coords, dtype=np.float32), {}
+    if coordinate_storage == 'quantized':
+        origin = coords.min(axis=0) if len(coords) else np.zeros(2)
+        steps = np.rint((coords - origin) / config.GEO_COORDINATE_QUANTUM)
+        if len(steps) and steps.max() > np.iinfo(np.int32).max:
+            raise ValueError(f"Layer spans more than {np.iinfo(np.int32).max} steps of {config.GEO_COORDINATE_QUANTUM}.")
+        return steps.astype(np.int32), {'coordinate_origin': origin.tolist(), 'coordinate_quantum': config.GEO_COORDINATE_QUANTUM}
+    raise ValueError(f"Unknown coordinate storage '{coordinate_storage}'; expected one of {COORDINATE_STORAGES}.")
+
+
+def _decode_coordinates(stored_coords, meta):
+    if meta.get('coordinate_storage', 'float64') == 'float64':
+        return stored_coords
+    if meta['coordinate_storage'] == 'quantized':
+        return stored_coords * meta['coordinate_quantum'] + np.asarray(meta['coordinate_origin'])
+    return stored_coords.astype(np.float64)
+
+
+def _write_replacing(path, write):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def read_geo_buffers(relative_file_path: str) -> GeoBuffers:
+    """
+    Memory-maps the coordinate and offset arrays of a layer.
+
+    Opening float64 buffers is O(1) in the layer size: pages are read lazily and
+    shared between processes through the OS page cache. Compact (float32 or
+    quantized) coordinates are decoded into a float64 copy.
+    """
+    return _read_buffers(relative_file_path, _read_meta(relative_file_path))
+
+
+def _read_buffers(relative_file_path, meta):
+    in_dir = buffer_path(relative_file_path)
+    coords = _decode_coordinates(np.load(os.path.join(in_dir, COORDS_FILE), mmap_mode='r'), meta)
+    offsets = tuple(
+        np.load(os.path.join(in_dir, f'offsets_{level}.npy'), mmap_mode='r')
+        for level in range(meta['offset_levels'])
+    )
+    return GeoBuffers(shapely.GeometryType(meta['geometry_type']), coords, offsets, meta['crs'],
+                      lossy=meta.get('coordinate_storage', 'float64') != 'float64')
+
+
+def load_geo_from_buffers(relative_file_path: str) -> gpd.GeoDataFrame:
+    """
+    Rebuilds a layer's GeoDataFrame from its buffers.
+
+    Geometries are constructed directly from the mapped arrays (GEOS keeps its own
+    vertex storage, but no intermediate Python or GeoJSON objects are created) and
+    the attribute table is read through a memory-mapped Arrow file. Geometries
+    decoded from lossy coordinates are repaired, as rounding can make thin parts
+    self-intersect. The result is kept in _LOADED_LAYERS until the buffers are
+    rewritten or the memory budget evicts it, so callers must not modify it.
+    """
+    meta = _read_meta(relative_file_path)
+    key = (relative_file_path, json.dumps(meta, sort_keys=True))
+    gdf = _LOADED_LAYERS.get(key)
+    if gdf is not None:
+        return gdf
+    with _LOADED_LOCK:
+        load_lock = _LOAD_LOCKS.setdefault(relative_file_path, threading.Lock())
+    # Only one thread rebuilds a given layer; the others wait for its frame.
+    with load_lock:
+        gdf = _LOADED_LAYERS.get(key)
+        if gdf is None:
+            buffers = _read_buffers(relative_file_path, meta)
+            table = feather.read_table(os.path.join(buffer_path(relative_file_path), ATTRIBUTES_FILE), memory_map=True)
+            geometries = buffers.geometries()
+            if buffers.lossy:
+                geometries, _ = repair_geometries(geometries)
+            gdf = gpd.GeoDataFrame(table.to_pandas(), geometry=geometries, crs=buffers.crs)
+            with _LOADED_LOCK:
+                for stale in [stored for stored in _LOADED_LAYERS if stored[0] == relative_file_path]:
+                    _LOADED_LAYERS.pop(stale, None)
+            _LOADED_LAYERS[key] = gdf
+    return gdf
+
+
+# --- Conversion Script ---
+if __name__ == "__main__":
+    # Converts every GeoJSON layer already downloaded under config.BASE_DIR.
+    from data_loader import read_geo_arrow
+    from ingest import prepare_layer
+
+    converted = 0
+    for root, _, files in os.walk(config.BASE_DIR):
+        for name in files:
+            if not name.endswith('.geojson'):
+                continue
+            relative_file_path = os.path.relpath(os.path.join(root, name), config.BASE_DIR)
+            write_geo_buffers(prepare_layer(read_geo_arrow(os.path.join(root, name))), relative_file_path,
+                              sources=[relative_file_path])
+            converted += 1
+            print(f"Converted '{relative_file_path}'")
+    print(f"Wrote geometry buffers for {converted} layers to '{config.GEO_BUFFER_DIR}'.")
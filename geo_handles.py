@@ -0,0 +1,109 @@
+# geo_handles.py
+import threading
+import time
+
+import shapely
+
+from memory_budget import BudgetedDict
+
+# Rough per-geometry overhead of a GEOS polygon on top of its vertices.
+GEOMETRY_OVERHEAD_BYTES = 200
+
+
+def estimate_gdf_nbytes(gdf) -> int:
+    """
+    Estimates the resident size of a GeoDataFrame in bytes.
+
+    pandas' memory_usage() only counts the pointers of the geometry column, so the
+    GEOS vertex storage (16 bytes per 2D coordinate) is added on top.
+
+    Args:
+        gdf (gpd.GeoDataFrame): The frame to measure.
+
+    Returns:
+        int: The estimated size in bytes.
+    """
+    if gdf is None:
+        return 0
+    attribute_bytes = int(gdf.memory_usage(deep=True, index=True).sum())
+    geometries = gdf.geometry.values
+    vertex_bytes = int(shapely.get_num_coordinates(geometries).sum()) * 16
+    return attribute_bytes + vertex_bytes + len(geometries) * GEOMETRY_OVERHEAD_BYTES
+
+
+class GeoHandle:
+    """
+    A shared, read-only reference to one loaded geometry layer.
+
+    Attributes:
+        path (str): The layer path the handle was loaded from.
+        nbytes (int): Estimated resident size of the layer.
+        loaded_at (float): time.time() at which the layer was loaded.
+    """
+
+    def __init__(self, path, gdf):
+        self.path = path
+        self._gdf = gdf
+        self.nbytes = estimate_gdf_nbytes(gdf)
+        self.loaded_at = time.time()
+
+    def frame(self):
+        """
+        Returns a shallow view of the layer.
+
+        The view shares the underlying arrays, so it costs nothing to create, but
+        adding or replacing columns on it never reaches the shared frame.
+        """
+        return self._gdf.copy(deep=False)
+
+
+class GeoHandleRegistry:
+    """
+    Process-wide table of loaded layers, meant to be held by st.cache_resource.
+
+    Unlike st.cache_data, a hit hands out the same loaded layer to every rerun and
+    session instead of unpickling a fresh copy. Failed loads are not remembered.
+    Loaded layers count against config.MEMORY_BUDGET_MB and are reloaded on next
+    use if the budget evicts them.
+    """
+
+    def __init__(self, loader):
+        """
+        Args:
+            loader (callable): Called with a layer path, returns a GeoDataFrame or None.
+        """
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._handles = BudgetedDict('geo-handles', sizeof=lambda handle: handle.nbytes, lock=self._lock)
+        self._path_locks = {}
+
+    def get(self, path):
+        """Returns the GeoHandle for `path`, loading it on first use, or None on failure."""
+        handle = self._handles.get(path)
+        if handle is not None:
+            return handle
+
+        with self._lock:
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+        # Only one session loads a given layer; the others wait for its handle.
+        with path_lock:
+            handle = self._handles.get(path)
+            if handle is None:
+                gdf = self._loader(path)
+                if gdf is None:
+                    return None
+                handle = GeoHandle(path, gdf)
+                self._handles[path] = handle
+        return handle
+
+    def invalidate(self, path=None):
+        """Drops one layer, or every layer when `path` is None, so it is reloaded on next use."""
+        with self._lock:
+            if path is None:
+                self._handles.clear()
+            else:
+                self._handles.pop(path, None)
+
+    def memory_usage(self):
+        """Returns a {path: estimated bytes} mapping for every loaded layer."""
+        return {path: handle.nbytes for path, handle in list(self._handles.items())}
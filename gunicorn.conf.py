@@ -0,0 +1,20 @@
+# gunicorn.conf.py
+# Imported under another name: gunicorn reads every module-level name here as a setting,
+# and 'config' is one.
+import config as app_config
+
+# With PRELOAD_GEOMETRY=1 the app (and every state's geometry, see
+# data_loader.preload_geometries) is imported once in the master before forking,
+# so the workers share those pages instead of each loading their own copy.
+# Bind address and worker count keep gunicorn's defaults ($PORT, $WEB_CONCURRENCY).
+preload_app = app_config.PRELOAD_GEOMETRY
+# Serve requests on threads so a newer map update can supersede an older one (see scheduler.py).
+threads = app_config.WEB_THREADS
+
+
+def post_worker_init(worker):
+    # With preload_app the app module was imported in the master, before the fork,
+    # where no threads may be started; start the background warmer in the worker.
+    if preload_app:
+        import PlotlyMap
+        PlotlyMap.start_cache_warmer()
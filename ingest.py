@@ -0,0 +1,91 @@
+# ingest.py
+import numpy as np
+import shapely
+
+import config
+
+# Bump when prepare_layer() changes: cached layers and geometry buffers (which record
+# the version they were prepared with, see geo_buffers.has_buffers) are then rebuilt.
+INGEST_VERSION = 1
+# Columns added by prepare_layer(): area in square metres (config.AREA_CRS), bounding
+# box and label point in the layer's CRS.
+BBOX_COLUMNS = ['minx', 'miny', 'maxx', 'maxy']
+LABEL_COLUMNS = ['label_lon', 'label_lat']
+DERIVED_COLUMNS = ['area'] + BBOX_COLUMNS + LABEL_COLUMNS
+DEFAULT_CRS = 'EPSG:4326'
+
+
+def prepare_layer(gdf):
+    """
+    Validates a freshly read layer and adds its derived geometry columns.
+
+    Invalid polygons are repaired with make_valid and reduced to their polygonal
+    parts; rows whose geometry is missing or empty afterwards are dropped. Every
+    region then gets its area, bounding box and a representative point, placed in
+    config.LABEL_CRS so it lies inside the region and clear of its border. These run
+    once per layer here, so render paths can read columns instead of running
+    per-feature geometry operations.
+
+    Args:
+        gdf (gpd.GeoDataFrame): The layer as read from its source file.
+
+    Returns:
+        gpd.GeoDataFrame: A prepared copy with the DERIVED_COLUMNS set.
+    """
+    if gdf.crs is None:
+        gdf = gdf.set_crs(DEFAULT_CRS)
+    geometries, repaired = repair_geometries(gdf.geometry.values)
+    keep = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+    if repaired or not keep.all():
+        print(f"Repaired {repaired} invalid and dropped {int((~keep).sum())} empty geometries of {len(gdf)}.")
+
+    gdf = gdf.set_geometry(geometries, crs=gdf.crs)[keep].copy()
+    gdf['area'] = gdf.geometry.to_crs(config.AREA_CRS).area
+    gdf[BBOX_COLUMNS] = shapely.bounds(gdf.geometry.values)
+    label_points = gdf.geometry.to_crs(config.LABEL_CRS).representative_point().to_crs(gdf.crs)
+    gdf['label_lon'] = label_points.x
+    gdf['label_lat'] = label_points.y
+    return gdf
+
+
+def repair_geometries(geometries):
+    """
+    Makes invalid geometries valid, keeping only their polygonal parts.
+
+    Returns:
+        tuple[np.ndarray, int]: The geometries and the number that were repaired.
+    """
+    geometries = np.array(geometries, dtype=object)
+    invalid = ~shapely.is_valid(geometries) & ~shapely.is_missing(geometries)
+    if invalid.any():
+        repaired = shapely.make_valid(geometries[invalid], method='structure', keep_collapsed=False)
+        geometries[invalid] = [_polygonal_part(geometry) for geometry in repaired]
+    return geometries, int(invalid.sum())
+
+
+def _polygonal_part(geometry):
+    # make_valid may turn a self-touching polygon into a collection with stray lines.
+    if shapely.get_type_id(geometry) != shapely.GeometryType.GEOMETRYCOLLECTION:
+        return geometry
+    parts = shapely.get_parts(geometry)
+    polygons = parts[np.isin(shapely.get_type_id(parts), [shapely.GeometryType.POLYGON, shapely.GeometryType.MULTIPOLYGON])]
+    return shapely.union_all(polygons) if len(polygons) else shapely.Polygon()
+
+
+def has_derived_columns(gdf) -> bool:
+    return set(DERIVED_COLUMNS) <= set(gdf.columns)
+
+
+def label_points(gdf):
+    """Returns the (lon, lat) label arrays of a layer, computing them only if it was not prepared."""
+    if set(LABEL_COLUMNS) <= set(gdf.columns):
+        return gdf['label_lon'].to_numpy(), gdf['label_lat'].to_numpy()
+    points = shapely.point_on_surface(gdf.geometry.values)
+    return shapely.get_x(points), shapely.get_y(points)
+
+
+def region_areas(gdf):
+    """Returns the areas of a layer's regions, in CRS units if it was not prepared."""
+    if 'area' in gdf.columns:
+        return gdf['area'].to_numpy()
+    return shapely.area(gdf.geometry.values)
@@ -0,0 +1,184 @@
+# layout_store.py
+import json
+import os
+import sqlite3
+import sys
+import threading
+
+import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS map_layouts (
+    state_id      TEXT NOT NULL,
+    district_id   TEXT NOT NULL DEFAULT '',  -- '' for the state itself
+    state_name    TEXT NOT NULL,
+    district_name TEXT,
+    center_lon    REAL,
+    center_lat    REAL,
+    zoom          REAL,
+    bounds        TEXT,                      -- JSON {"west", "south", "east", "north"}
+    PRIMARY KEY (state_id, district_id)
+) WITHOUT ROWID;
+"""
+
+UPSERT = """
+INSERT INTO map_layouts (state_id, district_id, state_name, district_name, center_lon, center_lat, zoom, bounds)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (state_id, district_id) DO UPDATE SET
+    state_name = excluded.state_name,
+    district_name = excluded.district_name,
+    center_lon = COALESCE(excluded.center_lon, center_lon),
+    center_lat = COALESCE(excluded.center_lat, center_lat),
+    zoom = COALESCE(excluded.zoom, zoom),
+    bounds = COALESCE(excluded.bounds, bounds)
+"""
+
+
+def canonical_id(name) -> str:
+    """Returns the lookup key of a state or district name: whitespace collapsed, upper case."""
+    return ' '.join(str(name).split()).upper()
+
+
+class LayoutStore:
+    """
+    Saved map center, zoom and bounds per state and district, in a SQLite table keyed
+    by canonical state/district IDs.
+
+    Lookups are single primary-key reads and writes are per-row upserts, so nothing
+    loads or rewrites the whole layout set. Names match case- and
+    whitespace-insensitively (see canonical_id). Serving views only reads the store;
+    layouts are written by an explicit save or by import_layouts().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(SCHEMA)
+
+    def get(self, state, district=None):
+        """
+        Returns the saved layout of a state (or of one of its districts).
+
+        Returns:
+            dict | None: 'mapbox_center' ({'lon', 'lat'}), 'mapbox_zoom' and
+                         'mapbox_bounds' (or None), or None if no center is saved.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT center_lon, center_lat, zoom, bounds FROM map_layouts WHERE state_id = ? AND district_id = ?',
+                (canonical_id(state), canonical_id(district) if district else '')).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return {
+            'mapbox_center': {'lon': row[0], 'lat': row[1]},
+            'mapbox_zoom': row[2],
+            'mapbox_bounds': json.loads(row[3]) if row[3] else None,
+        }
+
+    def upsert(self, state, district=None, center=None, zoom=None, bounds=None):
+        """Saves a layout; fields passed as None keep their saved value."""
+        self.upsert_many([(state, district, center, zoom, bounds)])
+
+    def upsert_many(self, layouts):
+        """Saves (state, district, center, zoom, bounds) tuples in one transaction."""
+        rows = [
+            (canonical_id(state), canonical_id(district) if district else '', state, district,
+             center['lon'] if center else None, center['lat'] if center else None, zoom,
+             json.dumps(bounds) if bounds else None)
+            for state, district, center, zoom, bounds in layouts
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(UPSERT, rows)
+
+    def import_layouts(self, layouts):
+        """
+        Upserts a nested {state: {'mapbox_center', 'mapbox_zoom', 'mapbox_bounds',
+        'districts': {district: {...}}}} dict, the format of the old layout JSON files.
+        District zooms may be stored inside 'mapbox_center', as the app used to write them.
+
+        Returns:
+            int: The number of layouts imported.
+        """
+        rows = []
+        for state, state_layout in layouts.items():
+            rows.append((state, None) + _layout_fields(state_layout))
+            for district, district_layout in state_layout.get('districts', {}).items():
+                rows.append((state, district) + _layout_fields(district_layout))
+        self.upsert_many(rows)
+        return len(rows)
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM map_layouts LIMIT 1').fetchone() is None
+
+    def export_layouts(self):
+        """Returns every saved layout as the nested dict accepted by import_layouts()."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT state_name, district_name, center_lon, center_lat, zoom, bounds FROM map_layouts '
+                'ORDER BY state_id, district_id').fetchall()
+        layouts = {}
+        for state, district, lon, lat, zoom, bounds in rows:
+            layout = {}
+            if lon is not None:
+                layout['mapbox_center'] = {'lon': lon, 'lat': lat}
+            if zoom is not None:
+                layout['mapbox_zoom'] = zoom
+            if bounds:
+                layout['mapbox_bounds'] = json.loads(bounds)
+            state_layout = layouts.setdefault(state, {'districts': {}})
+            if district:
+                state_layout['districts'][district] = layout
+            else:
+                state_layout.update(layout)
+        return layouts
+
+
+def _layout_fields(layout):
+    center = layout.get('mapbox_center') or None
+    zoom = layout.get('mapbox_zoom', center.get('mapbox_zoom') if center else None)
+    if center is not None:
+        center = {'lon': center['lon'], 'lat': center['lat']} if 'lon' in center else None
+    return center, zoom, layout.get('mapbox_bounds')
+
+
+# One connection per process; under gunicorn --preload workers must not share the master's.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_layout_store(path=None):
+    """
+    Returns this process' LayoutStore for `path` (default config.MAP_LAYOUT_DB).
+
+    An empty store is first filled from config.MAP_LAYOUT_SEED, when that file exists.
+    """
+    key = (path or config.MAP_LAYOUT_DB, os.getpid())
+    with _stores_lock:
+        if key not in _stores:
+            store = LayoutStore(key[0])
+            if store.is_empty() and os.path.exists(config.MAP_LAYOUT_SEED):
+                with open(config.MAP_LAYOUT_SEED) as f:
+                    print(f"Seeded '{store.path}' with {store.import_layouts(json.load(f))} layouts from '{config.MAP_LAYOUT_SEED}'.")
+            _stores[key] = store
+        return _stores[key]
+
+
+if __name__ == "__main__":
+    # python layout_store.py import <layouts.json>...   merge layout JSON files into the store
+    # python layout_store.py export <layouts.json>      dump the store as nested JSON
+    command, paths = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 2 else (None, [])
+    store = get_layout_store()
+    if command == 'import':
+        for json_path in paths:
+            with open(json_path) as f:
+                print(f"Imported {store.import_layouts(json.load(f))} layouts from '{json_path}'.")
+    elif command == 'export':
+        with open(paths[0], 'w') as f:
+            json.dump(store.export_layouts(), f, indent=4)
+        print(f"Exported the layouts in '{store.path}' to '{paths[0]}'.")
+    else:
+        print("Usage: python layout_store.py import <layouts.json>... | export <layouts.json>")
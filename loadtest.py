@@ -0,0 +1,333 @@
+# loadtest.py
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+import config
+
+UPDATE_ENDPOINT = '/_dash-update-component'
+# Outputs identifying the callbacks a session drives.
+VIEW_CALLBACK_OUTPUT = 'map-graph.figure'
+BACKGROUND_CALLBACK_OUTPUT = 'render-done-store.data'
+BACKGROUND_POLL_SECONDS = 0.2
+BACKGROUND_TIMEOUT_SECONDS = 120
+
+
+class DashSession:
+    """
+    One simulated browser tab talking to the Dash callback endpoint.
+
+    Keeps the component properties the way the Dash renderer does: starting from
+    the served layout, every callback response (and side update) is applied, and
+    the next request is built from the current values of the callback's inputs and
+    states, as listed by /_dash-dependencies.
+    """
+
+    def __init__(self, base_url, layout_props, dependencies, timeout=120):
+        self.base_url = base_url.rstrip('/')
+        self.props = {key: value for key, value in layout_props.items()}
+        self.dependencies = dependencies
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.props[('session-store', 'data')] = uuid.uuid4().hex
+
+    def trigger(self, component_id, prop, value):
+        """
+        Sets a property as the user would and runs the view callback it triggers.
+
+        A sub-district view handed to the background renderer is followed through
+        to the finished view, so the interaction covers what the user waits for.
+
+        Returns:
+            tuple[int, int]: HTTP status of the last request and total response bytes.
+        """
+        self.props[(component_id, prop)] = value
+        status, num_bytes, side_updates = self.call(self.dependencies[VIEW_CALLBACK_OUTPUT], f'{component_id}.{prop}')
+        render_request = side_updates.get('render-request-store', {}).get('data')
+        if render_request is not None and BACKGROUND_CALLBACK_OUTPUT in self.dependencies:
+            status, background_bytes = self.run_background(self.dependencies[BACKGROUND_CALLBACK_OUTPUT],
+                                                           'render-request-store.data')
+            num_bytes += background_bytes
+            if status == 200:
+                status, view_bytes, _ = self.call(self.dependencies[VIEW_CALLBACK_OUTPUT], 'render-done-store.data')
+                num_bytes += view_bytes
+        return status, num_bytes
+
+    def call(self, dependency, changed_prop_id, query=''):
+        """POSTs one callback request and applies its response. Returns (status, bytes, side updates)."""
+        response = self.http.post(self.base_url + UPDATE_ENDPOINT + query, json=self._body(dependency, changed_prop_id),
+                                  timeout=self.timeout)
+        side_updates = {}
+        if response.status_code == 200 and response.content:
+            payload = response.json()
+            self._apply(payload.get('response', {}))
+            side_updates = payload.get('sideUpdate', {})
+            self._apply(side_updates)
+        return response.status_code, len(response.content), side_updates
+
+    def run_background(self, dependency, changed_prop_id):
+        """Starts a background callback job and polls it until it returns. Returns (status, bytes)."""
+        body = self._body(dependency, changed_prop_id)
+        response = self.http.post(self.base_url + UPDATE_ENDPOINT, json=body, timeout=self.timeout)
+        num_bytes = len(response.content)
+        if response.status_code != 200:
+            return response.status_code, num_bytes
+        job = response.json()
+        query = f"?cacheKey={job['cacheKey']}&job={job['job']}"
+        deadline = time.monotonic() + BACKGROUND_TIMEOUT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(BACKGROUND_POLL_SECONDS)
+            response = self.http.post(self.base_url + UPDATE_ENDPOINT + query, json=body, timeout=self.timeout)
+            num_bytes += len(response.content)
+            if response.status_code != 200:
+                return response.status_code, num_bytes
+            payload = response.json() if response.content else {}
+            if 'response' in payload:
+                self._apply(payload['response'])
+                return 200, num_bytes
+        return 504, num_bytes
+
+    def _body(self, dependency, changed_prop_id):
+        def values(items):
+            return [dict(item, value=self.props.get((item['id'], item['property']))) for item in items]
+
+        outputs = dependency['outputs']
+        return {
+            'output': dependency['output'],
+            # Like dash-renderer: a list for multi-output callbacks, the output itself otherwise.
+            'outputs': outputs if _is_multi_output(dependency['output']) else outputs[0],
+            'inputs': values(dependency['inputs']),
+            'state': values(dependency['state']),
+            'changedPropIds': [changed_prop_id],
+        }
+
+    def _apply(self, updates):
+        for component_id, props in updates.items():
+            for prop, value in props.items():
+                self.props[(component_id, prop)] = value
+
+
+def run_session(session, rng, drill_districts=3, slider_moves=3, think_seconds=0.0):
+    """
+    Plays one navigation script: open a state, drill into a few districts moving the
+    sliders and pressing Next District in each, go back, then press Next State.
+
+    Yields:
+        tuple[str, float, int, int]: (interaction, seconds, status, bytes) per step.
+    """
+    def step(name, component_id, prop, value):
+        started = time.perf_counter()
+        status, num_bytes = session.trigger(component_id, prop, value)
+        result = (name, time.perf_counter() - started, status, num_bytes)
+        if think_seconds:
+            time.sleep(rng.uniform(0.5, 1.5) * think_seconds)
+        return result
+
+    states = [option['value'] for option in session.props.get(('state-dropdown', 'options')) or []
+              if option['value'] not in config.NATIONAL_VIEWS]
+    if not states:
+        return
+    yield step('open_state', 'state-dropdown', 'value', rng.choice(states))
+
+    districts = [option['value'] for option in session.props.get(('district-dropdown', 'options')) or []]
+    for district in rng.sample(districts, min(drill_districts, len(districts))):
+        yield step('drill_district', 'district-dropdown', 'value', district)
+        for _ in range(slider_moves):
+            slider = rng.choice(['zoom-slider', 'lon-slider', 'lat-slider'])
+            current = session.props.get((slider, 'value')) or 0
+            offset = rng.uniform(-1, 1) * (1.5 if slider == 'zoom-slider' else 0.5)
+            value = min(15, max(4, current + offset)) if slider == 'zoom-slider' else current + offset
+            yield step('move_slider', slider, 'value', round(value, 2))
+        clicks = session.props.get(('next-district-button', 'n_clicks')) or 0
+        yield step('next_district', 'next-district-button', 'n_clicks', clicks + 1)
+
+    yield step('back', 'back-button', 'n_clicks', (session.props.get(('back-button', 'n_clicks')) or 0) + 1)
+    yield step('next_state', 'next-state-button', 'n_clicks', (session.props.get(('next-state-button', 'n_clicks')) or 0) + 1)
+
+
+def fetch_app_spec(base_url):
+    """Returns the initial component properties and the callbacks by output, as served by the app."""
+    base_url = base_url.rstrip('/')
+    layout = requests.get(base_url + '/_dash-layout', timeout=60).json()
+    layout_props = {}
+    _collect_props(layout, layout_props)
+
+    dependencies = {}
+    for dependency in requests.get(base_url + '/_dash-dependencies', timeout=60).json():
+        outputs = _parse_outputs(dependency['output'])
+        for output in outputs:
+            dependencies.setdefault(f"{output['id']}.{output['property']}", dict(dependency, outputs=outputs))
+    return layout_props, dependencies
+
+
+def _collect_props(node, layout_props):
+    if isinstance(node, list):
+        for child in node:
+            _collect_props(child, layout_props)
+    elif isinstance(node, dict) and 'props' in node:
+        props = node['props']
+        if isinstance(props.get('id'), str):
+            for prop, value in props.items():
+                if prop not in ('id', 'children'):
+                    layout_props[(props['id'], prop)] = value
+        _collect_props(props.get('children'), layout_props)
+
+
+def _is_multi_output(output):
+    # '..a.figure...b.data..' for multi-output callbacks, 'a.figure' otherwise.
+    return output.startswith('..')
+
+
+def _parse_outputs(output):
+    parts = output[2:-2].split('...') if _is_multi_output(output) else [output]
+    return [dict(zip(('id', 'property'), part.split('.', 1))) for part in parts]
+
+
+def run_load(base_url, users, duration, think_seconds=0.0, seed=0, **script_options):
+    """
+    Runs `users` concurrent sessions, each replaying navigation scripts until `duration` seconds pass.
+
+    Returns:
+        dict: The report, see summarize().
+    """
+    layout_props, dependencies = fetch_app_spec(base_url)
+    if VIEW_CALLBACK_OUTPUT not in dependencies:
+        raise RuntimeError(f"No callback with output '{VIEW_CALLBACK_OUTPUT}' at {base_url}.")
+
+    samples = []
+    samples_lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def user(user_index):
+        rng = random.Random(seed + user_index)
+        while time.monotonic() < deadline:
+            session = DashSession(base_url, layout_props, dependencies)
+            try:
+                for sample in run_session(session, rng, think_seconds=think_seconds, **script_options):
+                    with samples_lock:
+                        samples.append(sample)
+                    if time.monotonic() >= deadline:
+                        return
+            except requests.RequestException as e:
+                with samples_lock:
+                    samples.append(('error', 0.0, 0, 0))
+                print(f"User {user_index}: {e}")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def summarize(samples, elapsed):
+    """
+    Aggregates (interaction, seconds, status, bytes) samples.
+
+    Returns:
+        dict: 'elapsed_s', 'throughput_per_s' and, per interaction and for 'all',
+              'count', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_bytes' and 'total_bytes'.
+    """
+    groups = defaultdict(list)
+    for sample in samples:
+        groups[sample[0]].append(sample)
+        groups['all'].append(sample)
+
+    report = {'elapsed_s': round(elapsed, 2), 'throughput_per_s': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+              'interactions': {}}
+    for name, group in groups.items():
+        ok = [sample for sample in group if sample[2] in (200, 204)]
+        latencies = np.array([sample[1] for sample in ok]) * 1000
+        sizes = np.array([sample[3] for sample in ok])
+        report['interactions'][name] = {
+            'count': len(group),
+            'errors': len(group) - len(ok),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1) if len(ok) else None,
+            'p95_ms': round(float(np.percentile(latencies, 95)), 1) if len(ok) else None,
+            'p99_ms': round(float(np.percentile(latencies, 99)), 1) if len(ok) else None,
+            'mean_bytes': int(sizes.mean()) if len(ok) else None,
+            'total_bytes': int(sizes.sum()),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\n{report['elapsed_s']}s, {report['throughput_per_s']} interactions/s")
+    print(f"{'interaction':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean bytes':>12}")
+    for name, row in sorted(report['interactions'].items(), key=lambda item: item[0] == 'all'):
+        print(f"{name:<16}{row['count']:>7}{row['errors']:>8}{_cell(row['p50_ms']):>10}{_cell(row['p95_ms']):>10}"
+              f"{_cell(row['p99_ms']):>10}{_cell(row['mean_bytes']):>12}")
+
+
+def _cell(value):
+    return '-' if value is None else value
+
+
+def start_server(port, workers, threads, env=None):
+    """Starts PlotlyMap:server under gunicorn on localhost and waits until it answers."""
+    command = [sys.executable, '-m', 'gunicorn', 'PlotlyMap:server', '--config', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads), '--timeout', '300']
+    process = subprocess.Popen(command, env=dict(os.environ, **(env or {})))
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}.")
+        try:
+            if requests.get(base_url + '/_dash-layout', timeout=5).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    process.terminate()
+    raise RuntimeError("The server did not come up within 300s.")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay navigation sessions against the Dash callback endpoint.")
+    parser.add_argument('--url', help="Load an already running server instead of starting one.")
+    parser.add_argument('--users', type=int, default=8, help="Concurrent sessions.")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to run.")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers of the started server.")
+    parser.add_argument('--threads', type=int, default=config.WEB_THREADS, help="Threads per gunicorn worker.")
+    parser.add_argument('--think', type=float, default=0.0, help="Mean pause between interactions, in seconds.")
+    parser.add_argument('--districts', type=int, default=3, help="Districts opened per state.")
+    parser.add_argument('--slider-moves', type=int, default=3, help="Slider moves per district.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Also write the report to this file.")
+    args = parser.parse_args()
+
+    server_process = None
+    if args.url:
+        url = args.url
+    else:
+        server_process, url = start_server(_free_port(), args.workers, args.threads)
+    try:
+        print(f"Loading {url} with {args.users} sessions for {args.duration:g}s...")
+        load_report = run_load(url, args.users, args.duration, think_seconds=args.think, seed=args.seed,
+                               drill_districts=args.districts, slider_moves=args.slider_moves)
+        print_report(load_report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(load_report, f, indent=2)
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
@@ -0,0 +1,245 @@
+# memory_budget.py
+import threading
+import time
+
+import config
+
+# Entries whose rebuild time was not observed count as this expensive.
+MIN_COST_SECONDS = 0.001
+# Per-thread cache misses remembered while waiting for the matching insert.
+MAX_PENDING_MISSES = 64
+
+
+class _Entry:
+    __slots__ = ('owner', 'key', 'nbytes', 'cost', 'priority')
+
+    def __init__(self, owner, key, nbytes, cost, priority):
+        self.owner = owner
+        self.key = key
+        self.nbytes = nbytes
+        self.cost = cost
+        self.priority = priority
+
+
+class MemoryGovernor:
+    """
+    One byte budget shared by every in-process cache, enforced with cost-aware eviction.
+
+    Caches keep their entries in BudgetedDicts, which report each insert, hit and
+    removal here. When the cached bytes exceed the budget, entries are evicted in
+    GreedyDual-Size order: an entry's priority is the time it took to build divided
+    by its size, plus an inflation value that rises to the priority of each evicted
+    entry, so large, cheap-to-rebuild entries go first and entries that are not hit
+    again age out. Pinned bytes (layers shared with the gunicorn master) count
+    against the budget but are never evicted.
+    """
+
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = config.MEMORY_BUDGET_MB * 1024 * 1024 if budget_bytes is None else budget_bytes
+        self._entries = {}
+        self._pinned = {}
+        self._used_bytes = 0
+        self._inflation = 0.0
+        self._evictions = 0
+        self._evicted_bytes = 0
+        self._lock = threading.Lock()
+
+    def admit(self, owner, key, nbytes, cost=0.0):
+        """Records (or replaces) an entry of `owner` and evicts entries if the budget is exceeded."""
+        with self._lock:
+            self._remove(owner, key)
+            priority = self._inflation + max(cost, MIN_COST_SECONDS) / max(nbytes, 1)
+            self._entries[(id(owner), key)] = _Entry(owner, key, nbytes, cost, priority)
+            self._used_bytes += nbytes
+        self.enforce()
+
+    def touch(self, owner, key):
+        """Renews the priority of an entry that was just read."""
+        with self._lock:
+            entry = self._entries.get((id(owner), key))
+            if entry is not None:
+                entry.priority = self._inflation + max(entry.cost, MIN_COST_SECONDS) / max(entry.nbytes, 1)
+
+    def discard(self, owner, key):
+        """Forgets an entry its cache has removed."""
+        with self._lock:
+            self._remove(owner, key)
+
+    def pin(self, pool, key, nbytes):
+        """Counts bytes that must stay resident, such as preloaded layers, against the budget."""
+        with self._lock:
+            self._pinned[(pool, key)] = nbytes
+
+    def enforce(self):
+        """
+        Evicts entries, lowest priority first, until the cached bytes fit the budget.
+
+        Entries whose cache is busy in another thread are skipped; they are considered
+        again on the next insert.
+
+        Returns:
+            int: The number of bytes freed.
+        """
+        with self._lock:
+            if self.budget_bytes <= 0 or self._total_bytes() <= self.budget_bytes:
+                return 0
+            candidates = sorted(self._entries.values(), key=lambda entry: entry.priority)
+
+        freed, evicted = 0, 0
+        for entry in candidates:
+            with self._lock:
+                if self._total_bytes() <= self.budget_bytes:
+                    break
+                if self._entries.get((id(entry.owner), entry.key)) is not entry:
+                    continue
+            # The owner removes the entry through discard(), so its lock is not held here.
+            if entry.owner.evict(entry.key):
+                with self._lock:
+                    self._inflation = max(self._inflation, entry.priority)
+                    self._evictions += 1
+                    self._evicted_bytes += entry.nbytes
+                freed += entry.nbytes
+                evicted += 1
+
+        if evicted:
+            print(f"Memory budget: evicted {evicted} cache entries ({_mb(freed)} MB). {self.describe()}")
+        return freed
+
+    def usage(self):
+        """
+        Returns the budget, the bytes in use and per-pool totals.
+
+        Returns:
+            dict: 'budget_bytes', 'used_bytes' (cached plus pinned), 'pinned_bytes',
+                  'evictions', 'evicted_bytes' and 'pools', mapping each pool name to
+                  its 'entries' and 'bytes'.
+        """
+        with self._lock:
+            pools = {}
+            for entry in self._entries.values():
+                pool = pools.setdefault(entry.owner.pool, {'entries': 0, 'bytes': 0})
+                pool['entries'] += 1
+                pool['bytes'] += entry.nbytes
+            for (pool_name, _), nbytes in self._pinned.items():
+                pool = pools.setdefault(pool_name, {'entries': 0, 'bytes': 0})
+                pool['entries'] += 1
+                pool['bytes'] += nbytes
+            return {
+                'budget_bytes': self.budget_bytes,
+                'used_bytes': self._total_bytes(),
+                'pinned_bytes': sum(self._pinned.values()),
+                'evictions': self._evictions,
+                'evicted_bytes': self._evicted_bytes,
+                'pools': pools,
+            }
+
+    def describe(self):
+        """Returns a one-line summary of usage for the logs."""
+        usage = self.usage()
+        pools = ', '.join(f"{name} {_mb(pool['bytes'])} MB" for name, pool in sorted(usage['pools'].items()))
+        budget = f"{_mb(usage['budget_bytes'])} MB" if usage['budget_bytes'] > 0 else 'no limit'
+        return f"In use: {_mb(usage['used_bytes'])} MB of {budget} ({pools or 'empty'})."
+
+    def _remove(self, owner, key):
+        entry = self._entries.pop((id(owner), key), None)
+        if entry is not None:
+            self._used_bytes -= entry.nbytes
+
+    def _total_bytes(self):
+        return self._used_bytes + sum(self._pinned.values())
+
+
+def _mb(nbytes):
+    return round(nbytes / (1024 * 1024), 1)
+
+
+class BudgetedDict(dict):
+    """
+    A dict whose entries count against the memory budget of a MemoryGovernor.
+
+    Meant to replace the storage dict of an in-process cache. Inserts report the
+    entry's size, and the time since the same thread last missed the key as its
+    rebuild cost; reads renew its priority. The governor evicts entries while
+    holding `lock`, which must be the lock the owning cache guards the dict with.
+    """
+
+    def __init__(self, pool, sizeof=len, lock=None, governor=None):
+        """
+        Args:
+            pool (str): Name the entries are reported under.
+            sizeof (callable, optional): Returns the size of a value in bytes.
+            lock (optional): Lock of the owning cache. Defaults to a private lock.
+            governor (MemoryGovernor, optional): Defaults to the process-wide memory_governor.
+        """
+        super().__init__()
+        self.pool = pool
+        self._sizeof = sizeof
+        self._lock = lock if lock is not None else threading.RLock()
+        self._governor = governor if governor is not None else memory_governor
+        self._local = threading.local()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        missed_at = self._pending_misses().pop(key, None)
+        cost = time.perf_counter() - missed_at if missed_at is not None else 0.0
+        self._governor.admit(self, key, self._sizeof(value), cost)
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self._governor.touch(self, key)
+        return value
+
+    def __missing__(self, key):
+        self._note_miss(key)
+        raise KeyError(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._governor.discard(self, key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        self._note_miss(key)
+        return default
+
+    def pop(self, key, *default):
+        value = super().pop(key, *default)
+        self._governor.discard(self, key)
+        return value
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._governor.discard(self, key)
+        return key, value
+
+    def clear(self):
+        for key in list(self):
+            self._governor.discard(self, key)
+        super().clear()
+
+    def evict(self, key):
+        """Removes `key` for the governor; returns False if the owning cache is busy."""
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if key in self:
+                self.pop(key)
+            return True
+        finally:
+            self._lock.release()
+
+    def _note_miss(self, key):
+        misses = self._pending_misses()
+        if len(misses) >= MAX_PENDING_MISSES:
+            misses.clear()
+        misses[key] = time.perf_counter()
+
+    def _pending_misses(self):
+        if not hasattr(self._local, 'misses'):
+            self._local.misses = {}
+        return self._local.misses
+
+
+# One governor per process; workers forked from a preloading master inherit its pinned layers.
+memory_governor = MemoryGovernor()
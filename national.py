@@ -0,0 +1,164 @@
+# national.py
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+import config
+from data_loader import get_state_names, load_geo
+from geo_buffers import has_buffers, load_geo_from_buffers, write_geo_buffers
+from ingest import DERIVED_COLUMNS
+
+# Name column of each per-state layer.
+LAYER_KEYS = {'DISTRICTS': 'dtname', 'SUBDISTRICTS': 'sdtname'}
+
+# States the national layers are built from, fetched once per process by default_state_names().
+_default_state_names = None
+
+
+def national_layer_path(layer: str) -> str:
+    """Returns the geometry buffer path of the precomputed national layer."""
+    return f'INDIA/INDIA_{layer}_SIMPLIFIED'
+
+
+def default_state_names():
+    """Returns get_state_names(), asking the GitHub API only until it gives a non-empty list."""
+    global _default_state_names
+    if not _default_state_names:
+        _default_state_names = get_state_names()
+    return _default_state_names
+
+
+def state_layer_paths(state_names, layer: str):
+    """Returns the paths of a layer of every state, relative to config.BASE_DIR."""
+    return [f'STATES/{state}/{state}_{layer}.geojson' for state in state_names]
+
+
+def load_national_layer(layer: str, state_names=None):
+    """
+    Returns the simplified all-India layer, building and storing it on first use.
+
+    The layer has one row per region with the name column of the layer, 'state' and
+    'region' ("<name>, <State>", unique across states). It is stored as geometry
+    buffers (see geo_buffers.py), so after the first build it is memory-mapped
+    instead of being assembled from every state again, until a state's layer changes.
+
+    Args:
+        layer (str): 'DISTRICTS' or 'SUBDISTRICTS'.
+        state_names (list[str], optional): States to include when building.
+                                           Defaults to default_state_names().
+
+    Returns:
+        gpd.GeoDataFrame | None: The layer, or None if no state could be loaded.
+    """
+    relative_file_path = national_layer_path(layer)
+    if has_buffers(relative_file_path):
+        return load_geo_from_buffers(relative_file_path)
+
+    state_names = state_names or default_state_names()
+    gdf = build_national_layer(state_names, layer)
+    if gdf is not None:
+        write_geo_buffers(gdf, relative_file_path, sources=state_layer_paths(state_names, layer))
+    return gdf
+
+
+def build_national_layer(state_names, layer: str, max_coordinates=None):
+    """
+    Concatenates a layer of every state and simplifies it to a coordinate budget.
+
+    Args:
+        state_names (list[str]): States to include.
+        layer (str): 'DISTRICTS' or 'SUBDISTRICTS'.
+        max_coordinates (int, optional): See simplify_to_budget().
+                                         Defaults to config.NATIONAL_MAX_COORDINATES.
+
+    Returns:
+        gpd.GeoDataFrame | None: The simplified layer, or None if no state could be loaded.
+    """
+    # The derived columns are measured at full resolution, before simplifying.
+    national = concat_state_layers(state_names, layer, columns=DERIVED_COLUMNS)
+    if national is None:
+        return None
+    return simplify_to_budget(national, max_coordinates or config.NATIONAL_MAX_COORDINATES)
+
+
+def concat_state_layers(state_names, layer: str, columns=()):
+    """
+    Concatenates a layer of every state at full resolution.
+
+    Args:
+        state_names (list[str]): States to include.
+        layer (str): 'DISTRICTS' or 'SUBDISTRICTS'.
+        columns (tuple, optional): Extra attribute columns to keep when present.
+
+    Returns:
+        gpd.GeoDataFrame | None: The layer's name column, `columns`, 'state' and
+                                 'region' ("<name>, <State>", unique across states),
+                                 or None if no state could be loaded.
+    """
+    geo_key = LAYER_KEYS[layer]
+    parts = []
+    for state in state_names:
+        gdf = load_geo(f'STATES/{state}/{state}_{layer}.geojson')
+        if gdf is None or geo_key not in gdf.columns:
+            print(f"Skipping {state}: no {layer.lower()} layer with a '{geo_key}' column.")
+            continue
+        part = gdf[[geo_key] + [c for c in columns if c in gdf.columns and c != geo_key] + [gdf.geometry.name]].copy()
+        if parts and part.crs != parts[0].crs:
+            part = part.to_crs(parts[0].crs)
+        part['state'] = state
+        parts.append(part)
+
+    if not parts:
+        return None
+
+    national = gpd.GeoDataFrame(pd.concat(parts, ignore_index=True), crs=parts[0].crs)
+    national['region'] = national[geo_key].astype(str) + ', ' + national['state'].str.replace('_', ' ').str.title()
+    if config.COMPACT_LAYERS:
+        # The states' name categories differ, so concatenating fell back to object strings.
+        national[[geo_key, 'state']] = national[[geo_key, 'state']].astype('category')
+    return national
+
+
+def simplify_to_budget(gdf, max_coordinates, tolerance=None):
+    """
+    Simplifies every geometry with the smallest tolerance that fits the budget.
+
+    Starts at config.NATIONAL_SIMPLIFY_TOLERANCE (in CRS units) and doubles it until
+    the layer has at most `max_coordinates` vertices, which bounds the size of the
+    map payload. Regions are simplified independently, so neighbouring borders may
+    show hairline gaps at close zoom.
+
+    Args:
+        gdf (gpd.GeoDataFrame): The layer to simplify.
+        max_coordinates (int): Vertex budget of the whole layer.
+        tolerance (float, optional): Starting tolerance.
+
+    Returns:
+        gpd.GeoDataFrame: A copy of the layer with simplified geometry.
+    """
+    tolerance = tolerance or config.NATIONAL_SIMPLIFY_TOLERANCE
+    geometries = gdf.geometry.values
+    original = int(shapely.get_num_coordinates(geometries).sum())
+
+    while True:
+        simplified = shapely.simplify(geometries, tolerance, preserve_topology=True)
+        num_coordinates = int(shapely.get_num_coordinates(simplified).sum())
+        if num_coordinates <= max_coordinates or tolerance >= config.NATIONAL_MAX_SIMPLIFY_TOLERANCE:
+            break
+        tolerance *= 2
+
+    print(f"Simplified {len(gdf)} regions from {original} to {num_coordinates} coordinates (tolerance {tolerance:g}).")
+    return gdf.set_geometry(gpd.GeoSeries(simplified, index=gdf.index, crs=gdf.crs))
+
+
+if __name__ == "__main__":
+    # Precomputes the simplified national layers so the first national view is fast.
+    states = get_state_names()
+    for national_layer in LAYER_KEYS:
+        national_gdf = build_national_layer(states, national_layer)
+        if national_gdf is None:
+            print(f"No {national_layer.lower()} could be loaded.")
+            continue
+        write_geo_buffers(national_gdf, national_layer_path(national_layer),
+                          sources=state_layer_paths(states, national_layer))
+        print(f"Wrote {len(national_gdf)} {national_layer.lower()} to '{national_layer_path(national_layer)}'.")
@@ -1,73 +1,124 @@
 # plotting.py
+import math
+
 import geopandas as gpd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
+import pandas as pd
 import geopandas as gpd
 import numpy as np
 from shapely.geometry import Polygon
 
+import config
+from ingest import BBOX_COLUMNS
+from renderers import select_renderer
+
 # The calculate_zoom function is no longer needed, as mapbox_bounds handles this automatically.
 
-def plot_charts(change_df, gdf, geo_key, color_scale, map_title, bar_title,zoom=0):
+def plot_charts(change_df, gdf, geo_key, color_scale, map_title, bar_title,zoom=0, bar_mode='auto', bar_page=0, renderer=None,
+                simplify_tolerance=None, max_labels=None, bar_top_n=None):
     """
-    Creates and returns a Plotly choropleth map and a bar chart.
+    Creates and returns a choropleth map and a Plotly bar chart.
+
+    The map is drawn by `renderer` (see renderers.py), which by default is picked
+    by the number of features: a Plotly figure for small layers, a pydeck Deck
+    for large ones. `simplify_tolerance` (degrees), `max_labels` and `bar_top_n`
+    shrink the payload for small screens (see config.DEVICE_PROFILES).
     """
     # Merge shapefile with change data
     plot_df = gdf.merge(change_df, left_on=geo_key, right_on=geo_key, how="left")
     plot_df = plot_df[plot_df["Change"].notnull()]
 
     if plot_df.empty:
-        return go.FigureWidget(), go.FigureWidget()
-
-
-    # --- Choropleth Map ---
-    map_fig = px.choropleth_mapbox(
-        plot_df,
-        geojson=plot_df.geometry,
-        locations=plot_df.index,
-        color="Change",
-        hover_name=geo_key,
-        mapbox_style="white-bg", # A good token-free style
-        opacity=0.7,
-        color_continuous_scale=color_scale,
-        # center=map_layout["mapbox_center"],
-        zoom=zoom
-
-        # REMOVED zoom and center to allow mapbox_bounds to take control
-    )
-    map_fig.add_trace(go.Scattermapbox(
-        lon=plot_df.geometry.centroid.x,
-        lat=plot_df.geometry.centroid.y,
-        mode='text',
-        text=plot_df.apply(lambda row: f"{row[geo_key]}<br>{row['Change']:.2f}", axis=1),
-        textfont=dict(size=9, color='black'),
-        hoverinfo='none'
-    ))
-    map_fig.update_layout(
-        margin={"r": 0, "t": 40, "l": 0, "b": 0},
-        title_text=map_title,
-        title_x=0.5,
-        paper_bgcolor='white',
-        font_color='black',
-        # ADDED mapbox_bounds to automatically fit the map to the data
-        # mapbox_bounds=map_layout["mapbox_bounds"],
-    )
+        return go.Figure(), go.Figure()
+
+    if simplify_tolerance:
+        plot_df = plot_df.set_geometry(plot_df.geometry.simplify(simplify_tolerance, preserve_topology=True))
+
+    renderer = renderer or select_renderer(len(plot_df))
+    map_fig = renderer.render(plot_df, geo_key, color_scale, map_title, zoom=zoom, max_labels=max_labels)
 
     # --- Bar Chart ---
-    bar_df_sorted = plot_df.sort_values("Change", ascending=True)
+    bar_fig = build_bar_figure(plot_df[[geo_key, "Change"]], geo_key, color_scale, bar_title, mode=bar_mode, page=bar_page,
+                               top_n=bar_top_n)
+    return map_fig, bar_fig
+
+
+def build_bar_figure(bar_df, geo_key, color_scale, bar_title, mode='auto', page=0, top_n=None):
+    """
+    Creates the horizontal bar chart of a layer, scaled to its number of regions.
+
+    Modes:
+        'all':     one bar per region. Above config.BAR_WEBGL_THRESHOLD regions the
+                   bars are drawn as a WebGL (Scattergl) lollipop chart of fixed
+                   height instead of one SVG bar and label per region.
+        'summary': the `top_n` lowest and highest regions plus one
+                   aggregated "Others" bar holding the mean of the rest.
+        'page':    page `page` (0-based) of config.BAR_PAGE_SIZE regions.
+        'auto':    'all' up to config.BAR_MAX_REGIONS regions, 'summary' above.
+
+    Args:
+        bar_df (pd.DataFrame): One row per region with `geo_key` and 'Change' columns.
+        geo_key (str): Name column of the regions.
+        color_scale (str): Plotly continuous color scale.
+        bar_title (str): Chart title.
+        mode (str, optional): One of the modes above. Defaults to 'auto'.
+        page (int, optional): Page index for the 'page' mode. Defaults to 0.
+        top_n (int, optional): Regions at each end of the summary. Defaults to config.BAR_TOP_N.
+
+    Returns:
+        go.Figure: The bar chart.
+    """
+    top_n = top_n or config.BAR_TOP_N
+    bar_df_sorted = bar_df.sort_values("Change", ascending=True)
+    num_regions = len(bar_df_sorted)
+    if mode == 'auto':
+        mode = 'all' if num_regions <= config.BAR_MAX_REGIONS else 'summary'
+
+    if mode == 'summary' and num_regions > 2 * top_n + 1:
+        bottom = bar_df_sorted.iloc[:top_n]
+        top = bar_df_sorted.iloc[-top_n:]
+        rest = bar_df_sorted.iloc[top_n:-top_n]
+        others = pd.DataFrame({geo_key: [f"Others ({len(rest)} regions, mean)"], "Change": [rest["Change"].mean()]})
+        bar_df_sorted = pd.concat([bottom, others, top], ignore_index=True)
+    elif mode == 'page':
+        page = min(max(page, 0), bar_page_count(num_regions) - 1)
+        bar_df_sorted = bar_df_sorted.iloc[page * config.BAR_PAGE_SIZE:(page + 1) * config.BAR_PAGE_SIZE]
+
     num_bars = len(bar_df_sorted)
-    bar_fig = px.bar(
-        bar_df_sorted,
-        x="Change", y=geo_key, orientation='h',
-        title=bar_title,
-        color="Change",
-        color_continuous_scale=color_scale,
-        height=num_bars * 25,
-        text="Change",
-    )
-    bar_fig.update_traces(texttemplate="%{text:.2f}", textposition="auto")
-    bar_fig.update_coloraxes(showscale=False)
+    height = min(num_bars * config.BAR_ROW_HEIGHT, config.BAR_MAX_HEIGHT)
+
+    if num_bars > config.BAR_WEBGL_THRESHOLD:
+        # Too many regions for one SVG bar and text label each: draw markers on GL
+        # with stems as a single line trace, and leave names and values to hover.
+        values = bar_df_sorted["Change"].to_numpy()
+        names = bar_df_sorted[geo_key].to_numpy()
+        stems_x = np.column_stack((np.zeros(num_bars), values, np.full(num_bars, np.nan))).ravel()
+        stems_y = np.repeat(names, 3)
+        bar_fig = go.Figure([
+            go.Scattergl(x=stems_x, y=stems_y, mode='lines', line=dict(color='lightgrey', width=1), hoverinfo='skip'),
+            go.Scattergl(
+                x=values, y=names, mode='markers',
+                marker=dict(color=values, colorscale=color_scale, size=6),
+                hovertemplate="%{y}: %{x:.2f}<extra></extra>",
+            ),
+        ])
+        bar_fig.update_layout(title=bar_title, height=config.BAR_MAX_HEIGHT, showlegend=False)
+        bar_fig.update_yaxes(showticklabels=False)
+    else:
+        bar_fig = px.bar(
+            bar_df_sorted,
+            x="Change", y=geo_key, orientation='h',
+            title=bar_title,
+            color="Change",
+            color_continuous_scale=color_scale,
+            height=height,
+            text="Change",
+        )
+        bar_fig.update_traces(texttemplate="%{text:.2f}", textposition="auto")
+        bar_fig.update_coloraxes(showscale=False)
+
     bar_fig.update_layout(
         margin=dict(l=20, r=20, t=40, b=20),
         yaxis=dict(tickfont=dict(size=9), title=""),
@@ -77,7 +128,12 @@ def plot_charts(change_df, gdf, geo_key, color_scale, map_title, bar_title,zoom=
         plot_bgcolor='white',
         font_color='black',
     )
-    return map_fig, bar_fig
+    return bar_fig
+
+
+def bar_page_count(num_regions):
+    """Returns the number of bar chart pages for a layer (at least 1)."""
+    return max(1, math.ceil(num_regions / config.BAR_PAGE_SIZE))
 
 
 
@@ -94,6 +150,9 @@ def get_rectangular_bounds(gdf):
     """
     if gdf.empty:
         return None, None, None, None
+    if set(BBOX_COLUMNS) <= set(gdf.columns):
+        # Prepared layers carry each region's bounding box (see ingest.py).
+        return (gdf['minx'].min(), gdf['miny'].min(), gdf['maxx'].max(), gdf['maxy'].max())
     # total_bounds returns an array: [minx, miny, maxx, maxy]
     bounds = gdf.total_bounds
     return tuple(bounds)
@@ -203,6 +262,36 @@ def get_plotly_map_layout(gdf):
     }
 
 
+def get_visible_bounds(center, zoom, width, height, margin=0.0):
+    """
+    Calculates the lon/lat box shown by a Web Mercator map of the given pixel size.
+
+    Args:
+        center (dict): {'lon': ..., 'lat': ...} of the map.
+        zoom (float): Mapbox zoom level.
+        width (float): Map width in pixels.
+        height (float): Map height in pixels.
+        margin (float, optional): Fraction of the box's size added on every side.
+
+    Returns:
+        tuple: (min_lon, min_lat, max_lon, max_lat), with latitudes clamped to the
+               Web Mercator limits.
+    """
+    world_size = config.MAPBOX_TILE_SIZE * 2 ** zoom
+    half_width = width * (0.5 + margin) / world_size * 2 * math.pi
+    half_height = height * (0.5 + margin) / world_size * 2 * math.pi
+
+    center_x = math.radians(center['lon'])
+    center_lat = max(-85.0511, min(85.0511, center['lat']))
+    center_y = math.log(math.tan(math.pi / 4 + math.radians(center_lat) / 2))
+
+    def to_lat(y):
+        return math.degrees(2 * math.atan(math.exp(y)) - math.pi / 2)
+
+    return (math.degrees(center_x - half_width), max(-85.0511, to_lat(center_y - half_height)),
+            math.degrees(center_x + half_width), min(85.0511, to_lat(center_y + half_height)))
+
+
 # --- Example Usage ---
 if __name__ == "__main__":
     # This block allows you to test the script directly
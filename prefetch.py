@@ -0,0 +1,84 @@
+# prefetch.py
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from views import render_state_view, render_district_view
+
+
+def neighbours(values, current, include_previous=True):
+    """
+    Returns the items after (and optionally before) `current` in a circular list,
+    mirroring the wrap-around of the Next State / Next District buttons.
+    """
+    if current not in values or len(values) < 2:
+        return []
+    index = values.index(current)
+    result = [values[(index + 1) % len(values)]]
+    previous = values[(index - 1) % len(values)]
+    if include_previous and previous not in result:
+        result.append(previous)
+    return result
+
+
+class Prefetcher:
+    """
+    Speculatively renders the views a user is likely to open next.
+
+    Every time a view is served, the views next to it in catalog order are queued
+    on a small thread pool and rendered through the memoized view builders. When a
+    session is served a new view, the jobs queued for its previous one are
+    cancelled, so a user who jumps elsewhere does not leave a backlog of stale
+    renders. Pending jobs are kept per browser session, as in scheduler.py, so one
+    user's navigation never cancels another's prefetches.
+    """
+
+    def __init__(self, flask_app, max_workers=None, enabled=None, districts=True, max_sessions=10000):
+        """
+        Args:
+            flask_app: App whose context the renders run in.
+            max_workers (int, optional): Defaults to config.PREFETCH_MAX_WORKERS.
+            enabled (bool, optional): Defaults to config.PREFETCH_ENABLED.
+            districts (bool, optional): Also prefetch district views; off when they
+                                        render in background processes instead.
+            max_sessions (int, optional): Sessions whose pending jobs are tracked.
+        """
+        self.flask_app = flask_app
+        self.enabled = config.PREFETCH_ENABLED if enabled is None else enabled
+        self.districts = districts
+        self.max_sessions = max_sessions
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or config.PREFETCH_MAX_WORKERS,
+                                        thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+
+    def after_state_view(self, state, state_names, device=config.DEFAULT_DEVICE, session_id=None):
+        """Queues the states next to `state`, sized for the user's device class."""
+        self._schedule(session_id, [(render_state_view, (s, device))
+                                    for s in neighbours(state_names, state, config.PREFETCH_PREVIOUS)])
+
+    def after_district_view(self, state, district, district_names, device=config.DEFAULT_DEVICE, session_id=None):
+        """Queues the districts of `state` next to `district`, sized for the user's device class."""
+        if not self.districts:
+            return
+        self._schedule(session_id, [(render_district_view, (state, d, device))
+                                    for d in neighbours(district_names, district, config.PREFETCH_PREVIOUS)])
+
+    def _schedule(self, session_id, jobs):
+        if not self.enabled:
+            return
+        with self._lock:
+            # Jobs that have not started yet were queued for a view this session has left.
+            for future in self._pending.pop(session_id, []):
+                future.cancel()
+            self._pending[session_id] = [self._pool.submit(self._render, render, args) for render, args in jobs]
+            while len(self._pending) > self.max_sessions:
+                self._pending.popitem(last=False)
+
+    def _render(self, render, args):
+        try:
+            with self.flask_app.app_context():
+                render(*args)
+        except Exception as e:
+            print(f"Prefetch of {render.__name__}{args} failed: {e}")
@@ -0,0 +1,172 @@
+# renderers.py
+import abc
+import json
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import pydeck as pdk
+import shapely
+from plotly.colors import get_colorscale, unlabel_rgb
+from pydeck.bindings.json_tools import default_serialize
+from pydeck.io.html import render_json_to_html
+
+import config
+from ingest import label_points, region_areas
+
+
+class MapRenderer(abc.ABC):
+    """
+    Interface of the choropleth map backends used by plotting.plot_charts.
+
+    A renderer turns a merged layer (geometry, `geo_key` and 'Change' columns) into
+    a map object. `max_labels` caps the number of region labels drawn on the map
+    (None for all). Use select_renderer() to pick one by feature count.
+    """
+
+    name = None
+
+    @abc.abstractmethod
+    def render(self, plot_df, geo_key, color_scale, map_title, zoom=0, max_labels=None):
+        """Returns the map object of the layer."""
+
+
+class PlotlyMapboxRenderer(MapRenderer):
+    """Plotly choropleth_mapbox with a text label per region; best for small layers."""
+
+    name = 'plotly'
+
+    def render(self, plot_df, geo_key, color_scale, map_title, zoom=0, max_labels=None):
+        # --- Choropleth Map ---
+        map_fig = px.choropleth_mapbox(
+            plot_df,
+            geojson=plot_df.geometry,
+            locations=plot_df.index,
+            color="Change",
+            hover_name=geo_key,
+            mapbox_style="white-bg", # A good token-free style
+            opacity=0.7,
+            color_continuous_scale=color_scale,
+            # center=map_layout["mapbox_center"],
+            zoom=zoom
+
+            # REMOVED zoom and center to allow mapbox_bounds to take control
+        )
+        labelled = plot_df
+        if max_labels is not None and len(plot_df) > max_labels:
+            # Label the largest regions only; the rest still show their value on hover.
+            labelled = plot_df.iloc[np.argsort(-region_areas(plot_df))[:max_labels]]
+        if not labelled.empty:
+            label_lon, label_lat = label_points(labelled)
+            map_fig.add_trace(go.Scattermapbox(
+                lon=label_lon,
+                lat=label_lat,
+                mode='text',
+                text=labelled.apply(lambda row: f"{row[geo_key]}<br>{row['Change']:.2f}", axis=1),
+                textfont=dict(size=9, color='black'),
+                hoverinfo='none'
+            ))
+        map_fig.update_layout(
+            margin={"r": 0, "t": 40, "l": 0, "b": 0},
+            title_text=map_title,
+            title_x=0.5,
+            paper_bgcolor='white',
+            font_color='black',
+            # ADDED mapbox_bounds to automatically fit the map to the data
+            # mapbox_bounds=map_layout["mapbox_bounds"],
+        )
+        return map_fig
+
+
+class DeckGLRenderer(MapRenderer):
+    """
+    deck.gl PolygonLayer through pydeck, drawn with GPU instancing; for large layers.
+
+    Per-feature attributes are prepared in bulk: colours are interpolated for all
+    features at once and exported as RGBA integer arrays, and ring coordinates are
+    sliced out of one flat coordinate array rounded to
+    config.DECKGL_COORDINATE_DECIMALS places, which keeps the JSON payload compact.
+    """
+
+    name = 'deckgl'
+
+    def render(self, plot_df, geo_key, color_scale, map_title, zoom=0, max_labels=None):
+        polygons = plot_df[[geo_key, "Change", plot_df.geometry.name]].explode(index_parts=False)
+        values = polygons["Change"].to_numpy(dtype=float)
+        colors = _sample_rgba(color_scale, values, alpha=int(0.7 * 255))
+
+        _, coords, (ring_offsets, polygon_offsets) = shapely.to_ragged_array(polygons.geometry.values)
+        coords = np.round(coords, config.DECKGL_COORDINATE_DECIMALS)
+        rings = [coords[start:stop].tolist() for start, stop in zip(ring_offsets[:-1], ring_offsets[1:])]
+        records = [
+            {
+                'name': name,
+                'value': round(value, 2),
+                'polygon': rings[polygon_offsets[i]:polygon_offsets[i + 1]],
+                'color': color,
+            }
+            for i, (name, value, color) in enumerate(zip(polygons[geo_key].tolist(), values.tolist(), colors.tolist()))
+        ]
+
+        minx, miny, maxx, maxy = plot_df.total_bounds
+        layer = pdk.Layer(
+            'PolygonLayer',
+            data=records,
+            get_polygon='polygon',
+            get_fill_color='color',
+            get_line_color=[0, 0, 0, 100],
+            line_width_min_pixels=1,
+            pickable=True,
+            auto_highlight=True,
+        )
+        return pdk.Deck(
+            layers=[layer],
+            initial_view_state=pdk.ViewState(longitude=(minx + maxx) / 2, latitude=(miny + maxy) / 2, zoom=zoom),
+            map_style=None,
+            tooltip={'text': '{name}: {value}'},
+            description=map_title,
+        )
+
+
+def deck_to_spec(deck):
+    """Returns the JSON-serializable spec of a pydeck Deck, suitable for caching."""
+    # Deck.to_json() pretty-prints, which forces the pure-Python JSON encoder;
+    # compact output goes through the C encoder and is several times faster.
+    return json.loads(json.dumps(deck, default=default_serialize))
+
+
+def deck_spec_to_html(spec, center=None, zoom=None):
+    """
+    Renders a cached Deck spec as a standalone HTML page, e.g. for an iframe srcDoc.
+
+    Args:
+        spec (dict): As returned by deck_to_spec().
+        center (dict, optional): {'lon': ..., 'lat': ...} to override the initial view.
+        zoom (float, optional): Zoom to override the initial view.
+    """
+    view_state = dict(spec.get('initialViewState', {}))
+    if center is not None:
+        view_state.update(longitude=center['lon'], latitude=center['lat'])
+    if zoom is not None:
+        view_state['zoom'] = zoom
+    return render_json_to_html(json.dumps(dict(spec, initialViewState=view_state)), tooltip={'text': '{name}: {value}'},
+                               css_background_color='white')
+
+
+def select_renderer(feature_count):
+    """Picks Plotly for small layers and deck.gl above config.DECKGL_FEATURE_THRESHOLD features."""
+    if feature_count > config.DECKGL_FEATURE_THRESHOLD:
+        return DeckGLRenderer()
+    return PlotlyMapboxRenderer()
+
+
+def _sample_rgba(color_scale, values, alpha=255):
+    """Interpolates a named Plotly colour scale for all values at once, as (n, 4) uint8 RGBA."""
+    stops = get_colorscale(color_scale)
+    positions = np.array([position for position, _ in stops], dtype=float)
+    rgb = np.array([unlabel_rgb(color) for _, color in stops], dtype=float)
+
+    value_span = values.max() - values.min() if len(values) else 0
+    normalized = (values - values.min()) / value_span if value_span else np.full(len(values), 0.5)
+    channels = [np.interp(normalized, positions, rgb[:, channel]) for channel in range(3)]
+    return np.column_stack(channels + [np.full(len(values), alpha)]).round().astype(np.uint8)
@@ -0,0 +1,114 @@
+# rollup.py
+import numpy as np
+import pandas as pd
+
+import config
+from data_loader import load_geo
+from geo_buffers import has_buffers, load_geo_from_buffers, write_geo_buffers
+from compact import compact_layer
+from ingest import prepare_layer
+
+# Name column of the regions at each level of the hierarchy, finest first.
+LEVEL_KEYS = {'SUBDISTRICTS': 'sdtname', 'DISTRICTS': 'dtname', 'STATE': 'stname'}
+AGGREGATIONS = ('sum', 'mean', 'weighted_mean', 'min', 'max')
+
+
+def rollup_layer_path(state: str, level: str) -> str:
+    """Returns the geometry buffer path of a dissolved layer of a state."""
+    return f'STATES/{state}/{state}_{level}_DISSOLVED'
+
+
+def subdistrict_layer_path(state: str) -> str:
+    """Returns the path of a state's sub-district layer relative to config.BASE_DIR."""
+    return f'STATES/{state}/{state}_SUBDISTRICTS.geojson'
+
+
+def load_subdistricts(state: str):
+    """
+    Returns the sub-district layer of a state with its 'stname' and 'area' columns set.
+
+    'area' is in square metres, measured in config.AREA_CRS when the layer was
+    ingested (see ingest.py), and is the default weight of weighted-mean rollups.
+
+    Returns:
+        gpd.GeoDataFrame | None: The layer, or None if it could not be loaded or has
+                                 no district/sub-district name columns.
+    """
+    gdf_subs = load_geo(subdistrict_layer_path(state))
+    if gdf_subs is None or not {'dtname', 'sdtname'} <= set(gdf_subs.columns):
+        return None
+    gdf_subs = gdf_subs[['sdtname', 'dtname', 'area', gdf_subs.geometry.name]].copy()
+    gdf_subs['stname'] = state
+    return gdf_subs
+
+
+def load_rollup_layer(state: str, level: str):
+    """
+    Returns the district ('DISTRICTS') or whole-state ('STATE') geometry of a state,
+    dissolved from its sub-districts.
+
+    The result is stored as geometry buffers next to the other layers, so each
+    dissolve runs once per state, and again when the sub-district layer changes.
+
+    Returns:
+        gpd.GeoDataFrame | None: One row per region with the level's name column and
+                                 ingest.DERIVED_COLUMNS, or None if the sub-districts
+                                 could not be loaded.
+    """
+    relative_file_path = rollup_layer_path(state, level)
+    if has_buffers(relative_file_path):
+        return load_geo_from_buffers(relative_file_path)
+
+    gdf_subs = load_subdistricts(state)
+    if gdf_subs is None:
+        return None
+
+    geo_key = LEVEL_KEYS[level]
+    dissolved = gdf_subs[[geo_key, gdf_subs.geometry.name]].dissolve(
+        by=geo_key, as_index=False, method=config.ROLLUP_DISSOLVE_METHOD, observed=True)
+    # The dissolved regions get their own area, bounding box and label point.
+    dissolved = prepare_layer(dissolved)
+    if config.COMPACT_LAYERS:
+        dissolved = compact_layer(dissolved, name_columns=[geo_key])
+    try:
+        write_geo_buffers(dissolved, relative_file_path, sources=[subdistrict_layer_path(state)])
+    except Exception as e:
+        print(f"Could not write dissolved {level.lower()} of {state}: {e}")
+    return dissolved
+
+
+def rollup(metrics_df: pd.DataFrame, by: str, aggregations: dict, weight: str = None) -> pd.DataFrame:
+    """
+    Aggregates region metrics to a coarser level in one vectorized pass per aggregation.
+
+    Args:
+        metrics_df (pd.DataFrame): One row per fine region, with the coarse level's
+                                   name column `by` and the metric columns.
+        by (str): Name column of the coarse level, e.g. 'dtname'.
+        aggregations (dict): Metric column -> one of AGGREGATIONS.
+        weight (str, optional): Weight column for 'weighted_mean'. Rows with a
+                                missing metric do not count towards the weight.
+
+    Returns:
+        pd.DataFrame: One row per coarse region with `by` and the metric columns.
+    """
+    unknown = set(aggregations.values()) - set(AGGREGATIONS)
+    if unknown:
+        raise ValueError(f"Unknown aggregation(s) {sorted(unknown)}; expected one of {AGGREGATIONS}.")
+
+    groups = metrics_df[by]
+    result = {}
+    for how in dict.fromkeys(aggregations.values()):
+        columns = [column for column, column_how in aggregations.items() if column_how == how]
+        values = metrics_df[columns]
+        if how == 'weighted_mean':
+            if weight is None:
+                raise ValueError("A weight column is required for 'weighted_mean'.")
+            weights = values.notna().mul(metrics_df[weight], axis=0)
+            totals = values.mul(weights).groupby(groups, observed=True).sum()
+            aggregated = totals / weights.groupby(groups, observed=True).sum().replace(0, np.nan)
+        else:
+            aggregated = values.groupby(groups, observed=True).agg(how)
+        result.update(aggregated.to_dict('series'))
+
+    return pd.DataFrame(result)[list(aggregations)].rename_axis(by).reset_index()
@@ -0,0 +1,146 @@
+# scheduler.py
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from dash.exceptions import PreventUpdate
+
+import config
+
+
+class Superseded(PreventUpdate):
+    """Raised inside a render that a newer request of the same session has replaced."""
+
+
+class RenderTurn:
+    """One request's place in its session's queue; see LatestWinsScheduler.turn()."""
+
+    def __init__(self, scheduler, session_id, ticket):
+        self._scheduler = scheduler
+        self.session_id = session_id
+        self.ticket = ticket
+
+    def check(self):
+        """Raises Superseded if a newer request of the session has arrived since this one."""
+        if self.session_id is not None and self._scheduler.latest_ticket(self.session_id) != self.ticket:
+            raise Superseded()
+
+
+class LatestWinsScheduler:
+    """
+    Drops renders that a newer request of the same browser session has made obsolete.
+
+    Every request takes a ticket on arrival. Requests from rapid inputs (slider
+    moves, Next buttons) first wait config.RENDER_DEBOUNCE_SECONDS, and any request
+    can call RenderTurn.check() before expensive steps; a request that is no longer
+    the latest of its session stops there with PreventUpdate, so Dash sends nothing
+    and the browser keeps waiting for the newer one. Renders already inside a view
+    builder run to completion (and fill the cache), but are not serialized or sent.
+
+    Tickets are kept per process, so this needs the requests of a session to reach
+    the same process concurrently: run gunicorn with threads (config.WEB_THREADS).
+    """
+
+    def __init__(self, debounce_seconds=None, max_sessions=10000):
+        self.debounce_seconds = config.RENDER_DEBOUNCE_SECONDS if debounce_seconds is None else debounce_seconds
+        self.max_sessions = max_sessions
+        self._tickets = itertools.count(1)
+        self._latest = OrderedDict()
+        self._lock = threading.Lock()
+        self._served = 0
+        self._dropped = 0
+
+    def latest_ticket(self, session_id):
+        with self._lock:
+            return self._latest.get(session_id)
+
+    @contextmanager
+    def turn(self, session_id, debounce=False):
+        """
+        Registers a request of `session_id` as the latest one and yields its RenderTurn.
+
+        Args:
+            session_id (str | None): Browser session; requests without one are never dropped.
+            debounce (bool, optional): Wait for config.RENDER_DEBOUNCE_SECONDS first and
+                                       drop the request if another one came in meanwhile.
+
+        Raises:
+            Superseded: If the request was replaced before it finished.
+        """
+        ticket = next(self._tickets)
+        if session_id is not None:
+            with self._lock:
+                self._latest[session_id] = ticket
+                self._latest.move_to_end(session_id)
+                while len(self._latest) > self.max_sessions:
+                    self._latest.popitem(last=False)
+
+        render_turn = RenderTurn(self, session_id, ticket)
+        try:
+            if debounce and session_id is not None and self.debounce_seconds:
+                time.sleep(self.debounce_seconds)
+                render_turn.check()
+            yield render_turn
+            render_turn.check()
+        except Superseded:
+            with self._lock:
+                self._dropped += 1
+            raise
+        else:
+            with self._lock:
+                self._served += 1
+
+    def stats(self):
+        """Returns the number of renders served and dropped, and the sessions tracked."""
+        with self._lock:
+            return {'served': self._served, 'dropped': self._dropped, 'sessions': len(self._latest)}
+
+
+class JobSlots:
+    """
+    Caps the number of jobs running at once across every process sharing `store`.
+
+    Slots are kept under one key of a diskcache.Cache and updated in a transaction.
+    A slot that is never released (its job was cancelled or killed) lapses after
+    `timeout_seconds`, so lost jobs do not shrink the cap for good.
+    """
+
+    KEY = 'job-slots'
+
+    def __init__(self, store, max_jobs=None, timeout_seconds=None):
+        """
+        Args:
+            store (diskcache.Cache): Cache shared by the processes running the jobs.
+            max_jobs (int, optional): Defaults to config.BACKGROUND_MAX_JOBS.
+            timeout_seconds (float, optional): Defaults to config.BACKGROUND_JOB_TIMEOUT_SECONDS.
+        """
+        self.store = store
+        self.max_jobs = config.BACKGROUND_MAX_JOBS if max_jobs is None else max_jobs
+        self.timeout_seconds = config.BACKGROUND_JOB_TIMEOUT_SECONDS if timeout_seconds is None else timeout_seconds
+        self._ids = itertools.count(1)
+
+    def acquire(self):
+        """Returns the id of a free slot, or None if `max_jobs` are running."""
+        now = time.time()
+        slot_id = f'{os.getpid()}-{next(self._ids)}'
+        with self.store.transact():
+            slots = {slot: deadline for slot, deadline in self.store.get(self.KEY, {}).items() if deadline > now}
+            if len(slots) >= self.max_jobs:
+                return None
+            slots[slot_id] = now + self.timeout_seconds
+            self.store.set(self.KEY, slots)
+        return slot_id
+
+    def release(self, slot_id):
+        with self.store.transact():
+            slots = self.store.get(self.KEY, {})
+            if slots.pop(slot_id, None) is not None:
+                self.store.set(self.KEY, slots)
+
+    def running(self):
+        """Returns the number of slots taken."""
+        now = time.time()
+        return sum(deadline > now for deadline in self.store.get(self.KEY, {}).values())
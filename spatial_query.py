@@ -0,0 +1,258 @@
+# spatial_query.py
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import shapely
+
+import config
+from geo_handles import estimate_gdf_nbytes
+from memory_budget import BudgetedDict
+from national import LAYER_KEYS, concat_state_layers
+from views import district_metrics, subdistrict_metrics
+
+ARROW_MIME_TYPE = 'application/vnd.apache.arrow.stream'
+POINT_COLUMNS = ['lon', 'lat']
+BBOX_COLUMNS = ['minx', 'miny', 'maxx', 'maxy']
+
+
+class SpatialIndex:
+    """
+    An STRtree over the full-resolution regions of one layer of every state.
+
+    Lookups take whole arrays of points or boxes and run as a single bulk tree
+    query, so thousands of coordinates cost one call rather than one per point.
+    """
+
+    def __init__(self, gdf):
+        self.regions = gdf.drop(columns=gdf.geometry.name).reset_index(drop=True)
+        self.tree = shapely.STRtree(gdf.geometry.values)
+        # The tree keeps the geometries alive; its own nodes are small next to them.
+        self.nbytes = estimate_gdf_nbytes(gdf)
+
+    def __len__(self):
+        return len(self.regions)
+
+    def locate_points(self, lon, lat):
+        """
+        Returns, for every point, the position of the region containing it, or -1.
+
+        Points on a shared border belong to the first region the tree reports.
+        """
+        points = shapely.points(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+        point_index, region_index = self.tree.query(points, predicate='intersects')
+        located = np.full(len(points), -1)
+        # Assigning in reverse leaves the first match of each point in place.
+        located[point_index[::-1]] = region_index[::-1]
+        return located
+
+    def intersect_bboxes(self, bboxes):
+        """Returns (box positions, region positions) of every box/region pair that intersects."""
+        bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        return self.tree.query(shapely.box(*bboxes.T), predicate='intersects')
+
+
+# One index per layer, built on first use and kept until the memory budget evicts it.
+# _INDEX_LOCK only guards the dict; builds hold the layer's own lock in _BUILD_LOCKS.
+_INDEX_LOCK = threading.Lock()
+_INDEXES = BudgetedDict('spatial-index', sizeof=lambda index: index.nbytes, lock=_INDEX_LOCK)
+_BUILD_LOCKS = {}
+
+
+def get_index(layer: str, state_names):
+    """
+    Returns the SpatialIndex of a layer ('DISTRICTS' or 'SUBDISTRICTS').
+
+    Returns:
+        SpatialIndex | None: The index, or None if no state could be loaded.
+    """
+    # get() times the miss, so the budget weighs the index by its load and build time.
+    index = _INDEXES.get(layer)
+    if index is not None:
+        return index
+    with _INDEX_LOCK:
+        build_lock = _BUILD_LOCKS.setdefault(layer, threading.Lock())
+    # Only one request builds a layer's index; queries on other layers go on meanwhile.
+    with build_lock:
+        index = _INDEXES.get(layer)
+        if index is None:
+            gdf = concat_state_layers(state_names, layer, columns=('dtname',))
+            if gdf is None:
+                return None
+            started = time.perf_counter()
+            index = SpatialIndex(gdf)
+            _INDEXES[layer] = index
+            print(f"Built the {layer.lower()} spatial index over {len(gdf)} regions in {time.perf_counter() - started:.2f}s.")
+    return index
+
+
+def query_points(layer: str, lon, lat, state_names) -> pd.DataFrame:
+    """
+    Finds the region containing each point and its metric.
+
+    Returns:
+        pd.DataFrame | None: One row per point, in input order: 'point', 'state', the
+                             layer's name columns, 'region' and 'Change', with nulls
+                             for points outside every region. None if the layer
+                             could not be loaded.
+    """
+    index = get_index(layer, state_names)
+    if index is None:
+        return None
+    located = index.locate_points(lon, lat)
+    found = located >= 0
+    matches = index.regions.iloc[located[found]].reset_index(drop=True)
+    matches.insert(0, 'point', np.flatnonzero(found))
+    matches = _with_metrics(layer, matches)
+    return pd.DataFrame({'point': np.arange(len(located))}).merge(matches, on='point', how='left')
+
+
+def query_bboxes(layer: str, bboxes, state_names) -> pd.DataFrame:
+    """
+    Finds every region intersecting each (minx, miny, maxx, maxy) box, with its metric.
+
+    Returns:
+        pd.DataFrame | None: One row per box/region pair: 'box', 'state', the layer's
+                             name columns, 'region' and 'Change'. None if the layer
+                             could not be loaded.
+    """
+    index = get_index(layer, state_names)
+    if index is None:
+        return None
+    box_index, region_index = index.intersect_bboxes(bboxes)
+    matches = index.regions.iloc[region_index].reset_index(drop=True)
+    matches.insert(0, 'box', box_index)
+    return _with_metrics(layer, matches)
+
+
+def _with_metrics(layer: str, matches: pd.DataFrame) -> pd.DataFrame:
+    """Joins the metrics the map views show, loading them only for the states present."""
+    name_columns = ['dtname'] if layer == 'DISTRICTS' else ['dtname', 'sdtname']
+    frames = []
+    for state in matches['state'].unique():
+        metrics = district_metrics(state) if layer == 'DISTRICTS' else subdistrict_metrics(state)
+        if metrics is not None:
+            frames.append(metrics[name_columns + ['Change']].assign(state=state))
+
+    if not frames:
+        return matches.assign(Change=np.nan)
+    metrics = pd.concat(frames, ignore_index=True)
+    # District names are spelled slightly differently across layers; match them loosely.
+    keys = [f'_{column}' for column in name_columns]
+    for column, key in zip(name_columns, keys):
+        metrics[key] = metrics[column].astype(str).str.strip().str.lower()
+        matches[key] = matches[column].astype(str).str.strip().str.lower()
+    metrics = metrics.drop(columns=name_columns).drop_duplicates(['state'] + keys)
+    return matches.merge(metrics, on=['state'] + keys, how='left').drop(columns=keys)
+
+
+def handle_query_request(layer_name: str, request, state_names):
+    """
+    Answers a POST /api/v1/query/<layer> request.
+
+    The body is either JSON, {"points": [[lon, lat], ...]} or
+    {"bboxes": [[minx, miny, maxx, maxy], ...]}, or an Arrow IPC stream with
+    'lon'/'lat' or 'minx'/'miny'/'maxx'/'maxy' columns. The answer is JSON unless
+    the client accepts ARROW_MIME_TYPE, in which case the result table is
+    streamed back as Arrow.
+
+    Returns:
+        A Flask response or (body, status) tuple.
+    """
+    layer = layer_name.upper()
+    if layer not in LAYER_KEYS:
+        return {'error': f"Unknown layer '{layer_name}'; expected one of {[name.lower() for name in LAYER_KEYS]}."}, 404
+
+    started = time.perf_counter()
+    if request.mimetype == ARROW_MIME_TYPE:
+        try:
+            table = pa.ipc.open_stream(request.get_data()).read_all()
+        except pa.ArrowInvalid as e:
+            return {'error': f"Malformed Arrow stream: {e}"}, 400
+        body = {'points' if 'lon' in table.column_names else 'bboxes': table}
+    else:
+        body = request.get_json(silent=True) or {}
+        if not isinstance(body, dict):
+            return {'error': "Expected a JSON object with 'points' or 'bboxes'."}, 400
+
+    if 'points' in body:
+        kind, columns = 'points', POINT_COLUMNS
+    elif 'bboxes' in body:
+        kind, columns = 'bboxes', BBOX_COLUMNS
+    else:
+        return {'error': "Expected 'points' or 'bboxes'."}, 400
+    try:
+        coordinates = _coordinates(body[kind], columns)
+    except (KeyError, ValueError, TypeError) as e:
+        return {'error': f"Malformed {kind}: {e}"}, 400
+
+    if len(coordinates) > config.QUERY_MAX_ITEMS:
+        return {'error': f"At most {config.QUERY_MAX_ITEMS} items per request."}, 413
+
+    if kind == 'points':
+        result = query_points(layer, coordinates[:, 0], coordinates[:, 1], state_names)
+    else:
+        result = query_bboxes(layer, coordinates, state_names)
+    if result is None:
+        return {'error': f"Could not load the {layer.lower()} layer."}, 503
+
+    elapsed = time.perf_counter() - started
+    if request.accept_mimetypes.best == ARROW_MIME_TYPE:
+        sink = pa.BufferOutputStream()
+        table = pa.Table.from_pandas(result, preserve_index=False)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), 200, {'Content-Type': ARROW_MIME_TYPE}
+
+    return {
+        'layer': layer.lower(),
+        'count': len(coordinates),
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'results': result.astype(object).where(result.notna(), None).to_dict('records'),
+    }
+
+
+def _coordinates(items, columns):
+    """Returns JSON rows or the matching columns of an Arrow table as an (n, len(columns)) float array."""
+    if isinstance(items, pa.Table):
+        return np.column_stack([items.column(column).to_numpy() for column in columns]).astype(float)
+    coordinates = np.asarray(items, dtype=float)
+    if coordinates.size == 0:
+        return coordinates.reshape(0, len(columns))
+    if coordinates.ndim != 2 or coordinates.shape[1] != len(columns):
+        raise ValueError(f"expected rows of {len(columns)} numbers")
+    return coordinates
+
+
+if __name__ == "__main__":
+    # Benchmarks bulk point-in-polygon lookups over every loaded state.
+    from flask import Flask
+
+    from cache import cache
+    from data_loader import get_state_names
+
+    benchmark_app = Flask(__name__)
+    cache.init_app(benchmark_app, config=config.CACHE_CONFIG)
+    states = get_state_names()
+    rng = np.random.default_rng(0)
+
+    with benchmark_app.app_context():
+        for benchmark_layer in LAYER_KEYS:
+            layer_index = get_index(benchmark_layer, states)
+            if layer_index is None:
+                print(f"No {benchmark_layer.lower()} could be loaded.")
+                continue
+            minx, miny, maxx, maxy = shapely.total_bounds(layer_index.tree.geometries)
+            for num_points in (1000, 10000, 100000):
+                lons, lats = rng.uniform(minx, maxx, num_points), rng.uniform(miny, maxy, num_points)
+                started = time.perf_counter()
+                located = layer_index.locate_points(lons, lats)
+                lookup_seconds = time.perf_counter() - started
+                started = time.perf_counter()
+                query_points(benchmark_layer, lons, lats, states)
+                total_seconds = time.perf_counter() - started
+                print(f"{benchmark_layer.lower()}: {num_points} points, {(located >= 0).sum()} inside, "
+                      f"lookup {num_points / lookup_seconds:,.0f} points/s, "
+                      f"with metrics {num_points / total_seconds:,.0f} points/s")
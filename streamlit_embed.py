@@ -7,9 +7,15 @@ import plotly.graph_objects as go
 import numpy as np
 import os
 import folium
+import shapely
+from plotly.colors import sample_colorscale
 from streamlit_folium import st_folium
 from shapely.geometry import Point
 
+from geo_handles import GeoHandleRegistry
+from compact import compact_layer
+from ingest import label_points, prepare_layer
+
 # --- Page Configuration ---
 # Use the wide layout to give the top controls more space
 st.set_page_config(layout="wide", page_title="India Geospatial Analysis")
@@ -19,6 +25,19 @@ GITHUB_RAW_BASE_URL = "https://raw.githubusercontent.com/SamNotLazy/KDLProject/m
 GITHUB_API_BASE_URL = "https://api.github.com/repos/SamNotLazy/KDLProject/contents/"
 BASE_DIR = 'Data/INDIAN-SHAPEFILES-master'
 
+# --- Map Rendering Configuration ---
+# 'light' emits a single GeoJson layer that carries fill colours and labels;
+# 'classic' is the original Choropleth + one DivIcon marker per region.
+MAP_RENDER_MODE = 'light'
+# Coordinates are rounded to this grid in the light mode (1e-4 deg is roughly 11 m).
+MAP_COORDINATE_PRECISION = 1e-4
+
+# --- Map Cache Configuration ---
+# Part of the cache key of every rendered view: bump it when the metric data changes.
+METRIC_VERSION = 1
+# Maximum number of rendered views kept in memory; the least recently used is evicted.
+MAP_CACHE_MAX_ENTRIES = 32
+
 # --- Caching with Streamlit ---
 @st.cache_data(ttl=3600)
 def get_state_names():
@@ -41,14 +60,23 @@ def get_state_names():
             return []
     return sorted(all_state_names)
 
-@st.cache_data
+@st.cache_resource
+def geo_registry():
+    """One registry per server process, shared by every session and rerun."""
+    return GeoHandleRegistry(read_geo_file)
+
 def load_geo(relative_file_path: str):
-    """Loads a geospatial file from a local path or downloads it from GitHub."""
+    """Returns a shared, read-only view of a geospatial layer, loading it on first use."""
+    handle = geo_registry().get(relative_file_path)
+    return handle.frame() if handle is not None else None
+
+def read_geo_file(relative_file_path: str):
+    """Loads a geospatial file from a local path or downloads it from GitHub, validated and prepared (see ingest.py)."""
     local_path = os.path.join(BASE_DIR, relative_file_path)
     github_url = GITHUB_RAW_BASE_URL + relative_file_path.replace("\\", "/")
     if os.path.exists(local_path):
         try:
-            return gpd.read_file(local_path)
+            return compact_layer(prepare_layer(gpd.read_file(local_path)))
         except Exception as e:
             st.error(f"Error reading local file {local_path}: {e}")
             return None
@@ -60,7 +88,7 @@ def load_geo(relative_file_path: str):
             with open(local_path, 'wb') as f:
                 for chunk in r.iter_content(chunk_size=8192):
                     f.write(chunk)
-        return gpd.read_file(local_path)
+        return compact_layer(prepare_layer(gpd.read_file(local_path)))
     except requests.exceptions.RequestException as e:
         st.error(f"Error downloading or reading file from GitHub: {e}")
     return None
@@ -74,34 +102,8 @@ def find_polygon_from_click(gdf: gpd.GeoDataFrame, lat: float, lng: float, name_
             return row[name_col]
     return None
 
-def plot_charts(change_df, gdf, geo_key, color_scale, map_title, bar_title):
-    """Creates a Folium choropleth map on a forced white background and a Plotly bar chart."""
-    plot_df = gdf.merge(change_df, left_on=geo_key, right_on=geo_key, how="left")
-    plot_df = plot_df[plot_df["Change"].notnull()]
-
-    m = folium.Map(location=[20.5937, 78.9629], zoom_start=5, tiles=None,
-                   scroll_wheel_zoom=False,
-                   dragging=False,
-                   zoom_control=False)
-
-    white_background_geojson = {
-        "type": "Polygon",
-        "coordinates": [[[-180, -90], [180, -90], [180, 90], [-180, 90], [-180, -90]]]
-    }
-    folium.GeoJson(
-        white_background_geojson,
-        name='white_background',
-        style_function=lambda x: {'fillColor': 'white', 'color': 'white', 'weight': 1, 'fillOpacity': 1}
-    ).add_to(m)
-
-    if plot_df.empty:
-        bar_fig = go.Figure()
-        bar_fig.update_layout(
-            paper_bgcolor='white', plot_bgcolor='white',
-            annotations=[dict(text="No data to display", xref="paper", yref="paper", showarrow=False, font=dict(size=16))]
-        )
-        return m, bar_fig
-
+def add_classic_choropleth(m, plot_df, geo_key):
+    """Adds the regions as a Folium Choropleth plus one DivIcon label marker per region."""
     # --- NEW APPROACH ---
     # 1. Create the Choropleth object, but DON'T add it to the map yet.
     choropleth = folium.Choropleth(
@@ -125,23 +127,92 @@ def plot_charts(change_df, gdf, geo_key, color_scale, map_title, bar_title):
     # --- END OF NEW APPROACH ---
 
 
-    # Add permanent labels to the map
-    for _, r in plot_df.iterrows():
-        if r['geometry'] and r['geometry'].is_valid:
-            lat = r['geometry'].centroid.y
-            lon = r['geometry'].centroid.x
-            label_text = r[geo_key]
-            label_icon = folium.features.DivIcon(
-                icon_size=(150, 36),
-                icon_anchor=(75, 18),
-                html=f'''<div style="font-size: 8pt; font-weight: 500; color: #212121; text-align: center; white-space: nowrap; text-shadow: 1px 1px 2px #FFFFFF, -1px -1px 2px #FFFFFF;">
-                            {label_text}
-                         </div>'''
-            )
-            folium.Marker(
-                location=[lat, lon],
-                icon=label_icon
-            ).add_to(m)
+    # Add permanent labels to the map, at the label points computed when the layer was read
+    for label_text, lon, lat in zip(plot_df[geo_key], *label_points(plot_df)):
+        label_icon = folium.features.DivIcon(
+            icon_size=(150, 36),
+            icon_anchor=(75, 18),
+            html=f'''<div style="font-size: 8pt; font-weight: 500; color: #212121; text-align: center; white-space: nowrap; text-shadow: 1px 1px 2px #FFFFFF, -1px -1px 2px #FFFFFF;">
+                        {label_text}
+                     </div>'''
+        )
+        folium.Marker(
+            location=[lat, lon],
+            icon=label_icon
+        ).add_to(m)
+
+def add_light_choropleth(m, plot_df, geo_key, color_scale):
+    """
+    Adds the regions to a Folium map as one GeoJson layer with styles and labels.
+
+    Fill colours are computed for all regions at once and stored as feature
+    properties, labels are permanent tooltips of that same layer, and coordinates
+    are rounded to MAP_COORDINATE_PRECISION, which keeps the generated HTML and
+    the browser DOM small compared with one marker per region.
+    """
+    values = plot_df["Change"].to_numpy(dtype=float)
+    value_span = values.max() - values.min()
+    normalized = (values - values.min()) / value_span if value_span else np.full(len(values), 0.5)
+
+    features = gpd.GeoDataFrame(
+        {geo_key: plot_df[geo_key].to_numpy(), "fill": sample_colorscale(color_scale, normalized)},
+        geometry=shapely.set_precision(plot_df.geometry.values, MAP_COORDINATE_PRECISION, mode="pointwise"),
+        crs=plot_df.crs,
+    )
+    folium.GeoJson(
+        features,
+        name='Choropleth',
+        style_function=lambda feature: {
+            'fillColor': feature['properties']['fill'], 'fillOpacity': 0.7,
+            'color': 'black', 'weight': 1, 'opacity': 0.4,
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=[geo_key], labels=False, permanent=True, sticky=False,
+            direction='center', class_name='region-label',
+        ),
+    ).add_to(m)
+
+def plot_charts(change_df, gdf, geo_key, color_scale, map_title, bar_title, render_mode=MAP_RENDER_MODE):
+    """Creates a Folium choropleth map on a forced white background and a Plotly bar chart."""
+    plot_df = gdf.merge(change_df, left_on=geo_key, right_on=geo_key, how="left")
+    plot_df = plot_df[plot_df["Change"].notnull()]
+
+    m = folium.Map(location=[20.5937, 78.9629], zoom_start=5, tiles=None,
+                   scroll_wheel_zoom=False,
+                   dragging=False,
+                   zoom_control=False)
+
+    if render_mode == 'light':
+        # A CSS background and plain-text labels instead of a world-sized polygon and DivIcons.
+        m.get_root().header.add_child(folium.Element(
+            '<style>.leaflet-container { background: #ffffff; }'
+            '.region-label { background: transparent; border: none; box-shadow: none; font-size: 8pt;'
+            ' font-weight: 500; color: #212121; text-shadow: 1px 1px 2px #FFFFFF, -1px -1px 2px #FFFFFF; }'
+            '.region-label::before { display: none; }</style>'
+        ))
+    else:
+        white_background_geojson = {
+            "type": "Polygon",
+            "coordinates": [[[-180, -90], [180, -90], [180, 90], [-180, 90], [-180, -90]]]
+        }
+        folium.GeoJson(
+            white_background_geojson,
+            name='white_background',
+            style_function=lambda x: {'fillColor': 'white', 'color': 'white', 'weight': 1, 'fillOpacity': 1}
+        ).add_to(m)
+
+    if plot_df.empty:
+        bar_fig = go.Figure()
+        bar_fig.update_layout(
+            paper_bgcolor='white', plot_bgcolor='white',
+            annotations=[dict(text="No data to display", xref="paper", yref="paper", showarrow=False, font=dict(size=16))]
+        )
+        return m, bar_fig
+
+    if render_mode == 'light':
+        add_light_choropleth(m, plot_df, geo_key, color_scale)
+    else:
+        add_classic_choropleth(m, plot_df, geo_key)
 
     minx, miny, maxx, maxy = plot_df.total_bounds
     m.fit_bounds([[miny, minx], [maxy, maxx]])
@@ -166,6 +237,31 @@ def plot_charts(change_df, gdf, geo_key, color_scale, map_title, bar_title):
         title={'text': bar_title, 'y':0.95, 'x':0.5, 'xanchor': 'center', 'yanchor': 'top'},
     )
     return m, bar_fig
+def filter_subdistricts(gdf_subdistricts, district):
+    """Returns the sub-districts that belong to `district` (case and whitespace insensitive)."""
+    return gdf_subdistricts[gdf_subdistricts["dtname"].str.strip().str.lower() == district.strip().lower()]
+
+@st.cache_resource(max_entries=MAP_CACHE_MAX_ENTRIES)
+def build_view_charts(state, district, metric_version, map_title, bar_title):
+    """
+    Builds and renders the map and bar chart of one view, shared across reruns and sessions.
+
+    `district` is None for the state view. `metric_version` only takes part in the
+    cache key. The map's HTML is rendered here once, so st_folium can be called
+    with render=False on every rerun that hits the cache.
+    """
+    np.random.seed(42)
+    if district is None:
+        gdf_districts = load_geo(f'STATES/{state}/{state}_DISTRICTS.geojson')
+        df_random = pd.DataFrame({"dtname": gdf_districts["dtname"], "Change": np.random.uniform(-50, 100, len(gdf_districts))})
+        folium_map, bar_fig = plot_charts(df_random, gdf_districts, "dtname", "RdYlGn", map_title, bar_title)
+    else:
+        gdf_filtered = filter_subdistricts(load_geo(f'STATES/{state}/{state}_SUBDISTRICTS.geojson'), district)
+        df_random = pd.DataFrame({"sdtname": gdf_filtered["sdtname"], "Change": np.random.uniform(0, 100, len(gdf_filtered))})
+        folium_map, bar_fig = plot_charts(df_random, gdf_filtered, "sdtname", "RdYlGn", map_title, bar_title)
+    folium_map.get_root().render()
+    return folium_map, bar_fig
+
 # --- Main App Logic ---
 # Initialize session state variables
 if 'view_level' not in st.session_state:
@@ -176,6 +272,78 @@ if 'selected_district' not in st.session_state:
 if not os.path.exists(BASE_DIR):
     os.makedirs(BASE_DIR, exist_ok=True)
 
+DISTRICT_PLACEHOLDER = "Select a district to view sub-districts..."
+
+# --- View Navigation ---
+# The state selectbox switches views through its on_change callback, which runs before
+# the next script run. Widgets inside a fragment rerun only that fragment, so the
+# district controls and map clicks call st.rerun(scope="app") after switching views:
+# the new view replaces every panel, which a fragment-scoped rerun would not redraw.
+def drill_into_district(district):
+    st.session_state.view_level = 'district'
+    st.session_state.selected_district = district
+
+def back_to_state_view():
+    st.session_state.update(view_level='state', selected_district=None)
+
+# --- Fragments ---
+# Each panel reruns on its own when a widget inside it changes. Only a change of
+# view (state -> district or back) reruns the whole app.
+@st.fragment
+def district_controls(gdf_districts):
+    """District drill-down selectbox in the state view, 'Back' button in the district view."""
+    if st.session_state.view_level == 'state':
+        districts = [DISTRICT_PLACEHOLDER] + sorted(gdf_districts['dtname'].unique())
+        selected_district_from_dropdown = st.selectbox(
+            'Select a District to Drill Down',
+            options=districts,
+            index=0,
+            key='district_selector',
+            help="Select a district here or click one on the map to see sub-districts."
+        )
+        # If the user selects a valid district, change the view level
+        if selected_district_from_dropdown != DISTRICT_PLACEHOLDER:
+            drill_into_district(selected_district_from_dropdown)
+            st.rerun(scope="app")
+    else:
+        # Provide a clear indicator of the current view and a button to go back
+        st.info(f"Viewing sub-districts for **{st.session_state.selected_district}**.")
+        if st.button("⬅️ Back to State View"):
+            back_to_state_view()
+            st.rerun(scope="app")
+
+@st.fragment
+def map_panel(folium_map, map_key, map_title, gdf, geo_key):
+    """
+    Shows the map and handles clicks on it.
+
+    Only `last_clicked` is returned from st_folium, so panning and zooming do not
+    rerun anything; a click reruns this fragment alone unless it opens a new view.
+    """
+    st.subheader(map_title)
+    map_data = st_folium(folium_map, key=map_key, use_container_width=True, render=False,
+                         returned_objects=["last_clicked"])
+    st.write(map_data)
+    if not (map_data and map_data.get("last_clicked")):
+        return
+
+    lat, lng = map_data["last_clicked"]["lat"], map_data["last_clicked"]["lng"]
+    clicked_name = find_polygon_from_click(gdf, lat, lng, geo_key)
+    if geo_key == "dtname":
+        if clicked_name:
+            drill_into_district(clicked_name)
+            st.rerun(scope="app")
+        else:
+            st.warning("You clicked outside of any district boundary.")
+    elif clicked_name:
+        st.success(f"🗺️ You clicked on: **{clicked_name}**")
+    else:
+        st.warning("You clicked outside of any sub-district boundary.")
+
+@st.fragment
+def bar_panel(bar_fig):
+    st.plotly_chart(bar_fig, use_container_width=True)
+
 # --- NEW: UI Controls at the Top of the Page ---
 
 # Create columns for the selection widgets
@@ -195,100 +363,69 @@ with control_col1:
         index=state_list.index('KARNATAKA') if 'KARNATAKA' in state_list else 0,
         key='state_selector',
         # Reset the view to state level whenever a new state is chosen
-        on_change=lambda: st.session_state.update(view_level='state', selected_district=None)
+        on_change=back_to_state_view
     )
 
+# Each run loads only the one layer its view needs.
+if st.session_state.view_level == 'state':
+    gdf_districts = load_geo(f'STATES/{selected_state}/{selected_state}_DISTRICTS.geojson')
+    has_districts = gdf_districts is not None and 'dtname' in gdf_districts.columns
+else:
+    gdf_subdistricts = load_geo(f'STATES/{selected_state}/{selected_state}_SUBDISTRICTS.geojson')
+
 with control_col2:
     # This column will either show the district drill-down or the 'Back' button
-    if st.session_state.view_level == 'state':
-        gdf_districts = load_geo(f'STATES/{selected_state}/{selected_state}_DISTRICTS.geojson')
-        if gdf_districts is not None and 'dtname' in gdf_districts.columns:
-            districts = sorted(gdf_districts['dtname'].unique())
-            districts.insert(0, "Select a district to view sub-districts...")
-            selected_district_from_dropdown = st.selectbox(
-                'Select a District to Drill Down',
-                options=districts,
-                index=0,
-                key='district_selector',
-                help="Select a district here or click one on the map to see sub-districts."
-            )
-            # If the user selects a valid district, change the view level
-            if selected_district_from_dropdown != "Select a district to view sub-districts...":
-                st.session_state.view_level = 'district'
-                st.session_state.selected_district = selected_district_from_dropdown
-                st.rerun() # Rerun the script to update the view
-        else:
-            st.warning(f"No district data available for {selected_state}.")
-
-    elif st.session_state.view_level == 'district':
-        # Provide a clear indicator of the current view and a button to go back
-        st.info(f"Viewing sub-districts for **{st.session_state.selected_district}**.")
-        if st.button("⬅️ Back to State View"):
-            st.session_state.view_level = 'state'
-            st.session_state.selected_district = None
-            st.rerun() # Rerun the script to go back to the state view
+    if st.session_state.view_level == 'state' and not has_districts:
+        st.warning(f"No district data available for {selected_state}.")
+    else:
+        district_controls(gdf_districts if st.session_state.view_level == 'state' else None)
 
 # Add a divider to visually separate controls from the content
 st.divider()
 
 # --- Main Panel: Displaying Titles and Charts ---
 if st.session_state.view_level == 'state':
-    gdf_districts = load_geo(f'STATES/{selected_state}/{selected_state}_DISTRICTS.geojson')
-    if gdf_districts is not None and 'dtname' in gdf_districts.columns:
-        # Generate random data for demonstration
-        np.random.seed(42)
-        df_random = pd.DataFrame({"dtname": gdf_districts["dtname"], "Change": np.random.uniform(-50, 100, len(gdf_districts))})
+    if has_districts:
         map_title = f"District-wise Map of {selected_state.replace('_', ' ').title()}"
         bar_title = "District Data Comparison"
-        folium_map, bar_fig = plot_charts(df_random, gdf_districts, "dtname", "RdYlGn", map_title, bar_title)
+        # Random demonstration data is generated inside the cached view builder.
+        folium_map, bar_fig = build_view_charts(selected_state, None, METRIC_VERSION, map_title, bar_title)
 
         col1, col2 = st.columns([0.6, 0.4])
         with col1:
-            st.subheader(map_title)
-            map_data = st_folium(folium_map, use_container_width=True)
-            st.write(map_data)
-            if map_data and map_data.get("last_clicked"):
-                lat, lng = map_data["last_clicked"]["lat"], map_data["last_clicked"]["lng"]
-                clicked_district = find_polygon_from_click(gdf_districts, lat, lng, "dtname")
-                if clicked_district:
-                    st.session_state.view_level = 'district'
-                    st.session_state.selected_district = clicked_district
-                    st.rerun()
-                else:
-                    st.warning("You clicked outside of any district boundary.")
+            map_panel(folium_map, f"map-{selected_state}", map_title, gdf_districts, "dtname")
         with col2:
-            st.plotly_chart(bar_fig, use_container_width=True)
+            bar_panel(bar_fig)
     else:
         st.error(f"Could not load district data for {selected_state}.")
 
 elif st.session_state.view_level == 'district':
     district = st.session_state.selected_district
-    gdf_subdistricts = load_geo(f'STATES/{selected_state}/{selected_state}_SUBDISTRICTS.geojson')
     if gdf_subdistricts is not None:
-        gdf_filtered = gdf_subdistricts[gdf_subdistricts["dtname"].str.strip().str.lower() == district.strip().lower()]
+        gdf_filtered = filter_subdistricts(gdf_subdistricts, district)
         if not gdf_filtered.empty:
-            np.random.seed(42)
-            df_random = pd.DataFrame({"sdtname": gdf_filtered["sdtname"], "Change": np.random.uniform(0, 100, len(gdf_filtered))})
             map_title = f"Sub-District Map of {district.title()}"
             bar_title = f"Sub-District Data for {district.title()}"
-            folium_map, bar_fig = plot_charts(df_random, gdf_filtered, "sdtname", "RdYlGn", map_title, bar_title)
+            folium_map, bar_fig = build_view_charts(selected_state, district, METRIC_VERSION, map_title, bar_title)
 
             col1, col2 = st.columns([0.6, 0.4])
             with col1:
-                st.subheader(map_title)
-                map_data = st_folium(folium_map, use_container_width=True)
-                st.write(map_data)
-
-            if map_data and map_data.get("last_clicked"):
-                    lat, lng = map_data["last_clicked"]["lat"], map_data["last_clicked"]["lng"]
-                    clicked_sdt = find_polygon_from_click(gdf_filtered, lat, lng, "sdtname")
-                    if clicked_sdt:
-                        st.success(f"🗺️ You clicked on: **{clicked_sdt}**")
-                    else:
-                        st.warning("You clicked outside of any sub-district boundary.")
+                map_panel(folium_map, f"map-{selected_state}-{district}", map_title, gdf_filtered, "sdtname")
             with col2:
-                st.plotly_chart(bar_fig, use_container_width=True)
+                bar_panel(bar_fig)
         else:
             st.warning(f"No sub-district data found for {district} in {selected_state}.")
     else:
-        st.error(f"Could not load sub-district geo-data for {selected_state}.")
\ No newline at end of file
+        st.error(f"Could not load sub-district geo-data for {selected_state}.")
+
+# --- Geometry Cache Status ---
+with st.expander("Geometry cache"):
+    layer_sizes = geo_registry().memory_usage()
+    for path, nbytes in sorted(layer_sizes.items()):
+        st.caption(f"{path}: {nbytes / 1e6:.1f} MB")
+    st.caption(f"Total: {sum(layer_sizes.values()) / 1e6:.1f} MB across {len(layer_sizes)} layers")
+    if st.button("Reload geometry", help="Drop the shared geometry layers and load them again."):
+        geo_registry().invalidate()
+        # The cached charts were drawn from the old layers.
+        build_view_charts.clear()
+        st.rerun()
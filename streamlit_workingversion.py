@@ -7,6 +7,8 @@ import plotly.graph_objects as go
 import numpy as np
 import os
 
+from geo_handles import GeoHandleRegistry
+
 # --- Page Configuration ---
 st.set_page_config(layout="wide", page_title="India Geospatial Analysis")
 
@@ -52,8 +54,17 @@ def get_state_names():
 
     return sorted(all_state_names)
 
-@st.cache_data
+@st.cache_resource
+def geo_registry():
+    """One registry per server process, shared by every session and rerun."""
+    return GeoHandleRegistry(read_geo_file)
+
 def load_geo(relative_file_path: str):
+    """Returns a shared, read-only view of a geospatial layer, loading it on first use."""
+    handle = geo_registry().get(relative_file_path)
+    return handle.frame() if handle is not None else None
+
+def read_geo_file(relative_file_path: str):
     """
     Loads a geospatial file from a local path or downloads it from GitHub.
     """
@@ -268,4 +279,14 @@ elif st.session_state.view_level == 'district':
         else:
             st.warning(f"No sub-district data found for {district} in {selected_state}.")
     else:
-        st.error(f"Could not load sub-district geo-data for {selected_state}.")
\ No newline at end of file
+        st.error(f"Could not load sub-district geo-data for {selected_state}.")
+
+# --- Geometry Cache Status ---
+with st.sidebar.expander("Geometry cache"):
+    layer_sizes = geo_registry().memory_usage()
+    for path, nbytes in sorted(layer_sizes.items()):
+        st.caption(f"{path}: {nbytes / 1e6:.1f} MB")
+    st.caption(f"Total: {sum(layer_sizes.values()) / 1e6:.1f} MB across {len(layer_sizes)} layers")
+    if st.button("Reload geometry", help="Drop the shared geometry layers and load them again."):
+        geo_registry().invalidate()
+        st.rerun()
@@ -0,0 +1,346 @@
+# views.py
+import base64
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+import config
+from cache import cache
+from data_loader import load_geo, load_geo_subset
+from national import load_national_layer
+from plotting import plot_charts, get_plotly_map_layout, build_bar_figure
+from renderers import deck_to_spec, deck_spec_to_html
+from rollup import load_subdistricts, load_rollup_layer, rollup
+
+# Colour scale of every map and bar chart.
+COLOR_SCALE = "RdYlGn"
+
+
+@cache.memoize(timeout=3600)  # Cache for 1 hour
+def render_state_view(state: str, device: str = config.DEFAULT_DEVICE):
+    """
+    Builds the district-level figures of a state.
+
+    With config.ROLLUP_VIEWS the districts are dissolved from the sub-district layer
+    and their metrics are the area-weighted means of subdistrict_metrics(), so the
+    state and district views show one consistent dataset. States without a usable
+    sub-district layer fall back to the district layer.
+
+    The figures are returned as plain dicts so the memoized result is cheap to
+    serialize and can be sent to Dash as-is. Zoom and center are applied per
+    request with with_map_view().
+
+    Args:
+        state (str): The state directory name.
+        device (str, optional): Device class the figures are sized for (see device_class).
+
+    Returns:
+        dict | None: 'map_fig' or 'map_deck' (see map_entries), 'bar_fig' (in the
+                     default 'auto' bar mode), 'bar_data' (see bar_figure),
+                     'districts' (sorted names), 'map_layout' (see
+                     get_plotly_map_layout) and 'summary' (state-level metrics, or
+                     None without rollups), or None if the state's districts could
+                     not be loaded.
+    """
+    gdf_districts, summary = None, None
+    df_subs = subdistrict_metrics(state) if config.ROLLUP_VIEWS else None
+    if df_subs is not None:
+        gdf_districts = load_rollup_layer(state, 'DISTRICTS')
+        df_random = rollup(df_subs, 'dtname', {'Change': 'weighted_mean'}, weight='area')
+        summary = rollup(df_subs, 'stname', {'Change': 'weighted_mean'}, weight='area').iloc[0].drop('stname').to_dict()
+
+    if gdf_districts is None:
+        gdf_districts = load_geo(f'STATES/{state}/{state}_DISTRICTS.geojson')
+        if gdf_districts is None or 'dtname' not in gdf_districts.columns:
+            return None
+        df_random = _district_layer_metrics(gdf_districts)
+
+    map_fig, bar_fig = plot_charts(df_random, gdf_districts, "dtname", COLOR_SCALE, f"District Map of {state.replace('_', ' ').title()}", "District Data Comparison",
+                                   **device_plot_options(device))
+
+    return {
+        **map_entries(map_fig),
+        'bar_fig': bar_fig.to_dict(),
+        'bar_data': {'geo_key': 'dtname', 'title': "District Data Comparison", 'records': df_random.to_dict('list')},
+        'districts': sorted(gdf_districts['dtname'].unique()),
+        'map_layout': get_plotly_map_layout(gdf_districts),
+        'summary': summary,
+    }
+
+
+@cache.memoize(timeout=3600)  # Cache for 1 hour
+def render_district_view(state: str, district: str, device: str = config.DEFAULT_DEVICE):
+    """
+    Builds the sub-district-level figures of one district.
+
+    Args:
+        state (str): The state directory name.
+        district (str): The district name (matched case-insensitively).
+        device (str, optional): Device class the figures are sized for (see device_class).
+
+    Returns:
+        dict | None: 'map_fig' or 'map_deck', 'bar_fig', 'bar_data' and 'map_layout',
+                     None if the state's sub-districts could not be loaded, or a dict with only
+                     'empty': True if the district has no sub-districts.
+    """
+    gdf_filtered = load_geo_subset(f'STATES/{state}/{state}_SUBDISTRICTS.geojson', match={'dtname': district})
+    if gdf_filtered is None:
+        return None
+    if gdf_filtered.empty:
+        return {'empty': True}
+
+    df_subs = subdistrict_metrics(state) if config.ROLLUP_VIEWS else None
+    if df_subs is not None:
+        df_random = df_subs.loc[df_subs["dtname"].str.strip().str.lower() == district.strip().lower(), ["sdtname", "Change"]]
+    else:
+        np.random.seed(42)
+        df_random = pd.DataFrame({"sdtname": gdf_filtered["sdtname"], "Change": np.random.uniform(0, 100, len(gdf_filtered))})
+    map_fig, bar_fig = plot_charts(df_random, gdf_filtered, "sdtname", COLOR_SCALE, f"Sub-District Map of {district.title()}", f"Sub-District Data for {district.title()}",
+                                   **device_plot_options(device))
+    if not isinstance(map_fig, pdk.Deck):
+        map_fig.update_layout(uirevision=f"{state}-{district}", autosize=True)
+
+    return {
+        **map_entries(map_fig),
+        'bar_fig': bar_fig.to_dict(),
+        'bar_data': {'geo_key': 'sdtname', 'title': f"Sub-District Data for {district.title()}", 'records': df_random.to_dict('list')},
+        'map_layout': get_plotly_map_layout(gdf_filtered),
+    }
+
+
+@cache.memoize(timeout=3600)  # Cache for 1 hour
+def render_national_view(layer: str, device: str = config.DEFAULT_DEVICE):
+    """
+    Builds the all-India figures of a layer from the precomputed simplified geometry.
+
+    The metrics of every region are generated in one frame and joined to the layer
+    in a single merge on the state-qualified 'region' name. Large layers are drawn
+    with deck.gl (see renderers.select_renderer).
+
+    Args:
+        layer (str): 'DISTRICTS' or 'SUBDISTRICTS'.
+        device (str, optional): Device class the figures are sized for (see device_class).
+
+    Returns:
+        dict | None: The same keys as render_state_view() except 'districts', or None
+                     if the national layer could not be built.
+    """
+    gdf_national = load_national_layer(layer)
+    if gdf_national is None:
+        return None
+
+    level = 'District' if layer == 'DISTRICTS' else 'Sub-District'
+    np.random.seed(42)
+    df_random = pd.DataFrame({"region": gdf_national["region"], "Change": np.random.uniform(-50, 100, len(gdf_national))})
+    map_fig, bar_fig = plot_charts(df_random, gdf_national[["region", gdf_national.geometry.name]], "region", COLOR_SCALE,
+                                   f"{level} Map of India", f"{level} Data Comparison", **device_plot_options(device))
+
+    return {
+        **map_entries(map_fig),
+        'bar_fig': bar_fig.to_dict(),
+        'bar_data': {'geo_key': 'region', 'title': f"{level} Data Comparison", 'records': df_random.to_dict('list')},
+        'map_layout': get_plotly_map_layout(gdf_national),
+    }
+
+
+def device_class(viewport) -> str:
+    """
+    Returns the device class of a client from the viewport it reported.
+
+    Args:
+        viewport (dict | None): {'width': ..., 'height': ...} in CSS pixels.
+
+    Returns:
+        str: 'phone', 'tablet' or 'desktop' (see config.DEVICE_BREAKPOINTS), or
+             config.DEFAULT_DEVICE if the viewport is unknown.
+    """
+    width = (viewport or {}).get('width')
+    if not width:
+        return config.DEFAULT_DEVICE
+    for device, max_width in config.DEVICE_BREAKPOINTS.items():
+        if width < max_width:
+            return device
+    return 'desktop'
+
+
+def device_plot_options(device: str) -> dict:
+    """Returns the plot_charts() sizing options of a device class (see config.DEVICE_PROFILES)."""
+    return dict(config.DEVICE_PROFILES.get(device, config.DEVICE_PROFILES[config.DEFAULT_DEVICE]))
+
+
+def subdistrict_metrics(state: str):
+    """
+    Returns the sub-district metrics of a state: 'sdtname', 'dtname', 'stname',
+    'area' and 'Change'. Both the district view and the state rollup read them, so
+    the two always agree.
+
+    Returns:
+        pd.DataFrame | None: The metrics, or None if the sub-districts could not be loaded.
+    """
+    gdf_subs = load_subdistricts(state)
+    if gdf_subs is None:
+        return None
+    np.random.seed(42)
+    return pd.DataFrame({
+        "sdtname": gdf_subs["sdtname"],
+        "dtname": gdf_subs["dtname"],
+        "stname": gdf_subs["stname"],
+        "area": gdf_subs["area"],
+        "Change": np.random.uniform(0, 100, len(gdf_subs)),
+    })
+
+
+def district_metrics(state: str):
+    """
+    Returns the district metrics of a state as render_state_view() shows them:
+    'dtname' and 'Change', without building any figures.
+
+    Returns:
+        pd.DataFrame | None: The metrics, or None if the state's districts could not be loaded.
+    """
+    df_subs = subdistrict_metrics(state) if config.ROLLUP_VIEWS else None
+    if df_subs is not None:
+        return rollup(df_subs, 'dtname', {'Change': 'weighted_mean'}, weight='area')
+    gdf_districts = load_geo(f'STATES/{state}/{state}_DISTRICTS.geojson')
+    if gdf_districts is None or 'dtname' not in gdf_districts.columns:
+        return None
+    return _district_layer_metrics(gdf_districts)
+
+
+def _district_layer_metrics(gdf_districts):
+    # Metrics of states shown from their district layer, without rollups.
+    np.random.seed(42)
+    return pd.DataFrame({"dtname": gdf_districts["dtname"], "Change": np.random.uniform(-50, 100, len(gdf_districts))})
+
+
+def is_view_cached(view_builder, *args) -> bool:
+    """Tells whether a memoized view builder (e.g. render_district_view) already holds a result for `args`."""
+    return cache.has(view_builder.make_cache_key(view_builder.uncached, *args))
+
+
+def map_entries(map_fig) -> dict:
+    """
+    Returns the cacheable form of a rendered map: {'map_fig': figure dict} for the
+    Plotly renderer, or {'map_fig': None, 'map_deck': Deck spec} for deck.gl.
+    """
+    if not isinstance(map_fig, pdk.Deck):
+        map_dict = map_fig.to_dict()
+        return {'map_fig': map_dict, 'feature_bounds': feature_bounds(map_dict)}
+    return {'map_fig': None, 'map_deck': deck_to_spec(map_fig)}
+
+
+def feature_bounds(map_fig: dict):
+    """
+    Returns the (n, 4) bounding boxes of the choropleth features of a map figure dict,
+    in feature order, or None if the figure has no choropleth or a feature has no
+    'bbox' (geopandas writes one per feature).
+    """
+    for trace in map_fig.get('data', []):
+        features = trace.get('geojson', {}).get('features') if isinstance(trace.get('geojson'), dict) else None
+        if features:
+            if not all('bbox' in feature for feature in features):
+                return None
+            return np.array([feature['bbox'] for feature in features], dtype=float)
+    return None
+
+
+def cull_map_figure(map_fig: dict, bounds, bbox):
+    """
+    Returns a copy of a cached map figure dict holding only the features that meet a box.
+
+    Only the GeoJSON features are dropped: the trace keeps every location and value,
+    so the colour scale stays the same while panning, and locations without a
+    feature are simply not drawn. Region labels outside the box are dropped too.
+
+    Args:
+        map_fig (dict): A cached map figure, see map_entries().
+        bounds (np.ndarray): Its feature_bounds().
+        bbox (tuple): (min_lon, min_lat, max_lon, max_lat) to keep.
+
+    Returns:
+        dict: The culled figure, or `map_fig` itself if every feature meets the box.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    visible = ((bounds[:, 2] >= min_lon) & (bounds[:, 0] <= max_lon) &
+               (bounds[:, 3] >= min_lat) & (bounds[:, 1] <= max_lat))
+    if visible.all():
+        return map_fig
+
+    data = list(map_fig['data'])
+    for i, trace in enumerate(data):
+        if isinstance(trace.get('geojson'), dict) and trace['geojson'].get('features'):
+            features = trace['geojson']['features']
+            geojson = dict(trace['geojson'], features=[features[j] for j in np.flatnonzero(visible)])
+            geojson.pop('bbox', None)
+            data[i] = dict(trace, geojson=geojson)
+        elif trace.get('mode') == 'text' and trace.get('lon') is not None:
+            lon, lat = _trace_array(trace['lon']), _trace_array(trace['lat'])
+            inside = (lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)
+            data[i] = dict(trace, lon=lon[inside].tolist(), lat=lat[inside].tolist())
+            if trace.get('text') is not None:
+                data[i]['text'] = np.asarray(trace['text'], dtype=object)[inside].tolist()
+    return dict(map_fig, data=data)
+
+
+def _trace_array(values) -> np.ndarray:
+    # Figure.to_dict() encodes numeric arrays as base64 typed arrays ({'dtype': 'f4', 'bdata': ...}).
+    if isinstance(values, dict) and 'bdata' in values:
+        return np.frombuffer(base64.b64decode(values['bdata']), dtype=values['dtype']).astype(float)
+    return np.asarray(values, dtype=float)
+
+
+def map_panel_size(viewport) -> tuple:
+    """Returns the (width, height) in pixels of the Plotly map panel for a reported viewport."""
+    width = (viewport or {}).get('width') or config.DEFAULT_VIEWPORT['width']
+    if width >= config.MAP_PANEL_SPLIT_BREAKPOINT:
+        width *= config.MAP_PANEL_WIDTH_FRACTION
+    return width, config.MAP_PANEL_HEIGHT
+
+
+def map_view_from_relayout(relayout_data):
+    """
+    Returns the (center, zoom) a user panned or zoomed the Plotly map to, or None if
+    the relayout event did not move the map.
+    """
+    relayout_data = relayout_data or {}
+    center, zoom = relayout_data.get('mapbox.center'), relayout_data.get('mapbox.zoom')
+    if not center or zoom is None:
+        return None
+    return {'lon': center['lon'], 'lat': center['lat']}, zoom
+
+
+def bounds_within(inner, outer) -> bool:
+    """Tells whether the (min_lon, min_lat, max_lon, max_lat) box `inner` lies inside `outer`."""
+    return (inner[0] >= outer[0] and inner[1] >= outer[1] and inner[2] <= outer[2] and inner[3] <= outer[3])
+
+
+def deck_view_html(view: dict, center: dict, zoom: float) -> str:
+    """Returns the standalone deck.gl page of a cached view, centered and zoomed like with_map_view()."""
+    return deck_spec_to_html(view['map_deck'], center=center, zoom=zoom)
+
+
+def with_map_view(map_fig: dict, center: dict, zoom: float) -> dict:
+    """
+    Returns a copy of a cached map figure dict with the given mapbox center and zoom.
+
+    Only the containers on the path to `layout.mapbox` are copied, so the (large)
+    trace data stays shared with the cached figure.
+    """
+    layout = dict(map_fig.get('layout', {}))
+    layout['mapbox'] = dict(layout.get('mapbox', {}), center=center, zoom=zoom)
+    return dict(map_fig, layout=layout)
+
+
+def bar_figure(view: dict, mode: str, page: int = 0) -> dict:
+    """
+    Returns the bar chart of a cached view in the given bar mode (see plotting.build_bar_figure).
+
+    The 'auto' chart is prebuilt in the view; other modes are rebuilt from the
+    view's metric records, which is cheap compared with the map.
+    """
+    if mode == 'auto':
+        return view['bar_fig']
+    bar_data = view['bar_data']
+    bar_df = pd.DataFrame(bar_data['records'])
+    return build_bar_figure(bar_df, bar_data['geo_key'], COLOR_SCALE, bar_data['title'], mode=mode, page=page).to_dict()
@@ -0,0 +1,132 @@
+# warmer.py
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; every process warms on its own there.
+    fcntl = None
+
+import config
+from views import render_state_view, render_district_view, render_national_view
+
+
+class CacheWarmer:
+    """
+    Pre-renders views in the background so no user hits a cold state.
+
+    Walks the state catalog in priority order on a small thread pool and calls the
+    memoized view builders, which populates the geometry (load_geo), layout and
+    rendered-figure caches as a side effect. A pause between jobs keeps the
+    warmer from starving live requests.
+    """
+
+    def __init__(self, flask_app, max_workers=None, throttle_seconds=None, include_districts=None):
+        """
+        Args:
+            flask_app (flask.Flask): The server whose cache should be warmed; jobs
+                                     run inside its app context.
+            max_workers (int, optional): Pool size. Defaults to config.WARMER_MAX_WORKERS.
+            throttle_seconds (float, optional): Pause after each job, per worker.
+                                                Defaults to config.WARMER_THROTTLE_SECONDS.
+            include_districts (bool, optional): Also warm every district's sub-district
+                                                view, after all state views.
+                                                Defaults to config.WARMER_INCLUDE_DISTRICTS.
+        """
+        self.flask_app = flask_app
+        self.max_workers = max_workers or config.WARMER_MAX_WORKERS
+        self.throttle_seconds = config.WARMER_THROTTLE_SECONDS if throttle_seconds is None else throttle_seconds
+        self.include_districts = config.WARMER_INCLUDE_DISTRICTS if include_districts is None else include_districts
+        self._lock = threading.Lock()
+        self._progress = {'total': 0, 'done': 0, 'failed': 0, 'started_at': None, 'finished_at': None}
+        self._thread = None
+        self._lock_file = None
+
+    def start(self, state_names):
+        """
+        Starts warming in a daemon thread and returns immediately.
+
+        Only the first process on a machine to take config.WARMER_LOCK_FILE warms;
+        the other gunicorn workers read the results from the shared cache.
+        """
+        if self._thread is not None or not self._acquire_lock():
+            return
+        self._thread = threading.Thread(target=self._run, args=(list(state_names),), name='cache-warmer', daemon=True)
+        self._thread.start()
+
+    def _acquire_lock(self):
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(config.WARMER_LOCK_FILE), exist_ok=True)
+        lock_file = open(config.WARMER_LOCK_FILE, 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held (and the lock kept) for the lifetime of the process.
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    def progress(self):
+        """Returns a snapshot of the warming progress."""
+        with self._lock:
+            return dict(self._progress)
+
+    def _run(self, state_names):
+        national_layers = list(dict.fromkeys(config.NATIONAL_VIEWS.values()))
+        with self._lock:
+            self._progress.update(total=len(state_names) + len(national_layers), started_at=time.time())
+        print(f"Cache warmer: warming {len(state_names)} states with {self.max_workers} worker(s).")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='cache-warmer') as pool:
+            state_views = list(pool.map(self._warm_state, prioritized(state_names)))
+            # The national views reuse the state layers loaded above.
+            list(pool.map(self._warm_national, national_layers))
+            if self.include_districts:
+                district_jobs = [(state, district) for state, view in state_views if view for district in view['districts']]
+                with self._lock:
+                    self._progress['total'] += len(district_jobs)
+                list(pool.map(lambda job: self._warm_district(*job), district_jobs))
+
+        with self._lock:
+            self._progress['finished_at'] = time.time()
+            progress = dict(self._progress)
+        print(f"Cache warmer: finished {progress['done']}/{progress['total']} views "
+              f"({progress['failed']} failed) in {progress['finished_at'] - progress['started_at']:.1f}s.")
+
+    def _warm_state(self, state):
+        view = self._run_job(f"state {state}", render_state_view, state)
+        return state, view
+
+    def _warm_national(self, layer):
+        self._run_job(f"national {layer.lower()}", render_national_view, layer)
+
+    def _warm_district(self, state, district):
+        self._run_job(f"district {state}/{district}", render_district_view, state, district)
+
+    def _run_job(self, label, render, *args):
+        view = None
+        try:
+            with self.flask_app.app_context():
+                view = render(*args)
+        except Exception as e:
+            print(f"Cache warmer: failed to warm {label}: {e}")
+
+        with self._lock:
+            self._progress['done' if view is not None else 'failed'] += 1
+            done, total = self._progress['done'] + self._progress['failed'], self._progress['total']
+        print(f"Cache warmer: [{done}/{total}] {label}")
+
+        time.sleep(self.throttle_seconds)
+        return view
+
+
+def prioritized(state_names):
+    """Orders states with config.WARMER_PRIORITY_STATES first, the rest in catalog order."""
+    priority = {state: rank for rank, state in enumerate(config.WARMER_PRIORITY_STATES)}
+    return sorted(state_names, key=lambda state: priority.get(state, len(priority)))